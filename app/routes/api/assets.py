@@ -3,40 +3,15 @@ import logging
 import re
 import mimetypes
 from flask import Blueprint, request, abort, jsonify
+from werkzeug.exceptions import HTTPException
 from app.utils.auth import require_auth
 from app.config.config_manager import config
+from app.services.compression_service import compression_service
+from app.services.file_manifest import file_manifest
+from app.services.asset_store import asset_store
 
 assets_bp = Blueprint('assets', __name__)
 
-def validate_file_access(file_path):
-    """验证文件访问的安全性"""
-    # 先检查路径遍历，再进行normpath
-    if '..' in file_path:
-        logging.warning(f"检测到路径遍历尝试: {file_path}")
-        return False
-
-    file_path = os.path.normpath(file_path)
-
-    if not os.path.exists(file_path):
-        logging.debug(f"文件不存在: {file_path}")
-        return False
-
-    if os.path.isdir(file_path):
-        return False
-
-    _, ext = os.path.splitext(file_path)
-    ext = ext.lstrip('.').lower()
-
-    allowed_ext = config.get('files.allowed_filetypes', [])
-    if ext == 'html':
-        return True
-
-    if ext not in allowed_ext:
-        logging.warning(f"不允许的文件类型: {ext}")
-        return False
-
-    return True
-
 def process_css_content(css_content):
     """处理 CSS 内容，移除引用缺失字体文件的 @font-face 规则"""
     try:
@@ -53,6 +28,12 @@ def process_css_content(css_content):
         logging.warning(f"处理 CSS 内容时出错: {e}")
         return css_content
 
+def publish_file(file_path):
+    """上传的文件写入后加入文件清单，并在后台生成预压缩版本"""
+    file_manifest.refresh(file_path, broadcast=True)
+    compression_service.precompress_async(
+        file_path, lambda: file_manifest.refresh(file_path, broadcast=True))
+
 def init_routes(limiter=None):
     """初始化资源文件相关路由"""
 
@@ -71,10 +52,16 @@ def init_routes(limiter=None):
             filetype = request.headers['x-sharenote-filetype']
             note_id = request.headers.get('x-sharenote-note-id') or request.args.get('note_id')
 
-            if re.search(r'[^a-f0-9]', name):
+            # 非主题文件以哈希作为资源存储中的对象名，需满足存储的哈希格式
+            if re.search(r'[^a-f0-9]', name) or (filetype != 'css' and not asset_store.is_hash(name)):
                 logging.error(f'Invalid hash format for file name: {name}')
                 abort(400, description="Invalid file hash")
 
+            # note_id 用于拼接资源目录并记入资源清单，格式与笔记资源路由的 doc_id 相同
+            if note_id and re.search('[^a-z0-9_-]', note_id):
+                logging.error(f'Invalid note id: {note_id}')
+                abort(400, description="Invalid note id")
+
             allowed_filetypes = config.get('files.allowed_filetypes', [])
             if filetype.lower() not in allowed_filetypes:
                 logging.error(f'Invalid file type: {filetype}')
@@ -88,6 +75,7 @@ def init_routes(limiter=None):
                 css_content = process_css_content(request.data.decode('utf-8', errors='replace'))
                 with open(file_path, 'w', encoding='utf-8') as f:
                     f.write(css_content)
+                publish_file(file_path)
                 logging.info(f'File uploaded: {file_path}')
                 return jsonify({'success': True, 'url': url})
             else:
@@ -101,11 +89,18 @@ def init_routes(limiter=None):
                     file_path = os.path.join('static', f'{name}.{filetype}')
                     url = f'{config.SERVER_URL}/static/{name}.{filetype}'
 
-                with open(file_path, 'wb') as f:
-                    f.write(request.data)
+                # 内容只在资源存储中保存一份，访问路径为指向它的硬链接
+                asset_store.put(name, request.data)
+                asset_store.link(name, file_path)
+                if note_id:
+                    # 记入笔记的资源清单，之后重新发布或删除笔记时按清单释放
+                    asset_store.acquire(note_id, [f'{name}.{filetype}'])
+                publish_file(file_path)
 
                 logging.info(f'File uploaded: {file_path}')
                 return jsonify({'success': True, 'url': url})
+        except HTTPException:
+            raise
         except Exception as e:
             logging.error(f"Error uploading file: {e}")
             abort(500)
@@ -2,11 +2,9 @@ import os
 import logging
 import json
 import glob
-import re
-from flask import Blueprint, request, abort, jsonify
+from flask import Blueprint, Response, request, abort, jsonify
 from app.utils.auth import require_auth
-from app.services.note_service import cook_note, handle_note_assets, delete_note_assets, organize_notes_by_folder
-from app.services.cache_service import cache_service
+from app.services.note_service import cook_note, handle_note_assets, delete_note_assets, doc_tree_json, doc_tree_delta, doc_tree_folder, invalidate_note
 from app.config.config_manager import config
 
 notes_bp = Blueprint('notes', __name__)
@@ -57,10 +55,8 @@ def init_routes(limiter=None):
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(html)
 
-            cache_service.delete(f"get_note:{filename}")
-            cache_service.delete("get_doc_tree")
+            invalidate_note(file_path)
             if is_index:
-                cache_service.delete("index")
                 logging.info("首页缓存已清除")
 
             return jsonify({
@@ -98,11 +94,8 @@ def init_routes(limiter=None):
 
             os.remove(note_path)
             delete_note_assets(base_filename)
-
-            cache_service.delete(f"get_note:{base_filename}")
-            cache_service.delete("get_doc_tree")
+            invalidate_note(note_path)
             if is_index:
-                cache_service.delete("index")
                 logging.info("首页已删除，缓存已清除")
 
             return jsonify({'success': True})
@@ -150,33 +143,53 @@ def init_routes(limiter=None):
 
     @notes_bp.route('/api/doc-tree', methods=['GET'])
     def get_doc_tree():
-        """获取文档树结构"""
+        """获取文档树结构
+
+        响应带有与清单版本对应的强 ETag；?since=<版本> 时只返回该版本之后
+        新增（含标题变化）与删除的笔记。
+        """
         try:
-            notes = []
-            for file in glob.glob('static/*.html'):
-                filename = os.path.splitext(os.path.basename(file))[0]
-                title = filename
-
-                try:
-                    with open(file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        title_match = re.search(r'<title>(.*?)</title>', content)
-                        if title_match:
-                            title = title_match.group(1)
-                except Exception as e:
-                    logging.warning(f"Error reading title from {file}: {e}")
-
-                notes.append({
-                    'title': title,
-                    'url': f'/{filename}',
-                    'isFolder': False
-                })
-
-            return jsonify(organize_notes_by_folder(notes))
+            since = request.args.get('since')
+            if since is not None:
+                delta = doc_tree_delta(since)
+                if delta.get('reset') and len(delta['notes']) > config.get('doc_tree.lazy_threshold', 2000):
+                    # 笔记过多时不下发全量列表，客户端改为逐层加载
+                    delta = {'version': delta['version'], 'reset': True, 'lazy': True}
+                response = jsonify(delta)
+            else:
+                version, body = doc_tree_json()
+                response = Response(body, mimetype='application/json')
+                response.set_etag(version)
+                response = response.make_conditional(request)
+            # 每次都向服务器确认，未变化时只返回 304 或空的增量
+            response.cache_control.no_cache = True
+            return response
         except Exception as e:
             logging.error(f"Error getting doc tree: {e}")
             abort(500)
 
+    @notes_bp.route('/api/doc-tree/folder', methods=['GET'])
+    def get_doc_tree_folder():
+        """逐层获取文档树：返回一个文件夹的一页直接子项，子文件夹带有子项数
+
+        参数 path 为文件夹路径（根目录为空），cursor 为上一页返回的 next_cursor。
+        """
+        max_limit = config.get('doc_tree.max_page_size', 1000)
+        try:
+            limit = int(request.args.get('limit', config.get('doc_tree.page_size', 200)))
+        except ValueError:
+            abort(400, description="Invalid limit")
+        limit = max(1, min(limit, max_limit))
+        try:
+            page = doc_tree_folder(request.args.get('path', ''), request.args.get('cursor') or None, limit)
+        except ValueError as e:
+            abort(400, description=str(e))
+        if page is None:
+            abort(404)
+        response = jsonify(page)
+        response.cache_control.no_cache = True
+        return response
+
     @notes_bp.route('/api/index/check', methods=['GET'])
     def check_index():
         """检查索引页面是否存在"""
@@ -220,8 +233,7 @@ def init_routes(limiter=None):
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(html)
 
-            cache_service.delete("index")
-            cache_service.delete("get_doc_tree")
+            invalidate_note(file_path)
 
             return jsonify({
                 'success': True,
@@ -1,20 +1,31 @@
 import logging
 from flask import Blueprint, request, jsonify
-from app.services import search_service
+from app.services.search_service import search_service
 
 search_bp = Blueprint('search', __name__)
 
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
 def init_routes(limiter=None):
     """初始化搜索相关路由"""
 
     @search_bp.route('/api/search', methods=['GET'])
     def search_notes():
-        """搜索笔记内容"""
+        """搜索笔记内容，支持 limit/offset 分页
+
+        每条结果的 highlight 为预览文本中查询词的 {start, length} 字符区间。
+        """
         query = request.args.get('q', '')
         if not query or len(query.strip()) < 2:
             return jsonify([])
 
-        results = search_service.search_notes(query.strip())
+        limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        limit = max(1, min(limit, MAX_LIMIT))
+        offset = max(0, offset)
+
+        results = search_service.search_notes(query.strip(), limit=limit, offset=offset)
         return jsonify(results)
 
     return search_bp
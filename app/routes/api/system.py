@@ -2,7 +2,7 @@ import time
 import logging
 from flask import Blueprint, jsonify, abort
 from app.utils.auth import require_auth
-from app.services import monitor_service
+from app.services.monitor_service import monitor_service
 
 system_bp = Blueprint('system', __name__)
 
@@ -1,50 +1,75 @@
 import os
 import re
 import logging
-from flask import Blueprint, send_file, abort
-from app.services.cache_service import cache
+from flask import Blueprint, Response, request, send_file, abort
+from werkzeug.exceptions import HTTPException
+from app.services.page_cache import page_cache
+from app.services.file_manifest import file_manifest
 from app.config.config_manager import config
 
 views_bp = Blueprint('views', __name__)
 
-def validate_file_access(file_path):
-    """验证文件访问的安全性"""
-    # 先检查路径遍历，再进行normpath
-    if '..' in file_path:
-        logging.warning(f"检测到路径遍历尝试: {file_path}")
-        return False
+def serve_page(slug):
+    """从页面缓存返回笔记页面，带强 ETag；未缓存时读取文件并放入缓存
 
-    file_path = os.path.normpath(file_path)
-
-    if not os.path.exists(file_path):
-        logging.debug(f"文件不存在: {file_path}")
-        return False
-
-    if os.path.isdir(file_path):
-        return False
-
-    _, ext = os.path.splitext(file_path)
-    ext = ext.lstrip('.').lower()
-
-    allowed_ext = config.get('files.allowed_filetypes', [])
-    if ext == 'html':
-        return True
-
-    if ext not in allowed_ext:
-        logging.warning(f"不允许的文件类型: {ext}")
-        return False
-
-    return True
+    页面不存在或不可访问时返回 None。
+    """
+    page = page_cache.get(slug)
+    if page is None:
+        entry = file_manifest.lookup(os.path.join('static', slug + '.html'))
+        if entry is None:
+            return None
+        try:
+            page = page_cache.load(slug, entry['path'])
+        except FileNotFoundError:
+            file_manifest.refresh(entry['path'])
+            return None
+    body, etag, variants = page
+    encoding = next((e for e in variants if request.accept_encodings.quality(e) > 0), None)
+    if encoding is not None:
+        # 不同编码的内容不同，强 ETag 也需区分
+        body, etag = variants[encoding], f'{etag}-{encoding}'
+    response = Response(body, mimetype='text/html')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    # If-None-Match 匹配时转为 304，不需要访问磁盘
+    return response.make_conditional(request)
+
+def send_manifest_file(file_path, **kwargs):
+    """按文件清单发送文件：清单中没有的文件返回 404，使用预先计算的 MIME 类型与 ETag，
+    客户端接受时发送预压缩的 .br/.gz 文件并设置 Content-Encoding
+    """
+    entry = file_manifest.lookup(file_path)
+    if entry is None:
+        abort(404)
+    path, etag = entry['path'], entry['etag']
+    encoding = next((e for e in entry['variants'] if request.accept_encodings.quality(e) > 0), None)
+    if encoding is not None:
+        path, etag = entry['variants'][encoding], f'{etag}-{encoding}'
+    try:
+        response = send_file(path, mimetype=entry['mimetype'], etag=etag,
+                             last_modified=entry['mtime'], **kwargs)
+    except FileNotFoundError:
+        # 清单已过期（文件在发布流程之外被删除）
+        file_manifest.refresh(entry['path'])
+        raise
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if entry['vary']:
+        response.vary.add('Accept-Encoding')
+    return response
 
 def init_routes(limiter=None):
     """初始化视图和静态文件路由"""
 
     @views_bp.route('/', methods=['GET'])
-    @cache(ttl=300)
     def index():
         try:
-            if os.path.exists('static/index.html') and validate_file_access('static/index.html'):
-                return send_file('static/index.html')
+            response = serve_page('index')
+            if response is not None:
+                return response
 
             server_name = config.get('server.server_name', 'Share Note')
             return f'''
@@ -124,13 +149,12 @@ def init_routes(limiter=None):
     def serve_assets(filename):
         """服务assets目录下的静态文件"""
         try:
-            file_path = os.path.join('assets', filename)
-            if not validate_file_access(file_path):
-                abort(403)
             # 设置长期缓存（1年）用于不变的资源文件
-            return send_file(file_path, max_age=31536000, conditional=True)
+            return send_manifest_file(os.path.join('assets', filename), max_age=31536000, conditional=True)
         except FileNotFoundError:
             abort(404)
+        except HTTPException:
+            raise
         except Exception as e:
             logging.error(f"Error serving asset {filename}: {e}")
             abort(500)
@@ -143,13 +167,12 @@ def init_routes(limiter=None):
     def serve_static(filename):
         """服务static目录下的静态文件"""
         try:
-            file_path = os.path.join('static', filename)
-            if not validate_file_access(file_path):
-                abort(403)
             # 设置中等缓存（1天）用于可能更新的文件
-            return send_file(file_path, max_age=86400, conditional=True)
+            return send_manifest_file(os.path.join('static', filename), max_age=86400, conditional=True)
         except FileNotFoundError:
             abort(404)
+        except HTTPException:
+            raise
         except Exception as e:
             logging.error(f"Error serving static file {filename}: {e}")
             abort(500)
@@ -167,33 +190,29 @@ def init_routes(limiter=None):
                 abort(404)
 
             file_path = os.path.join('static', 'notes', doc_id, 'assets', filename)
-            if not validate_file_access(file_path):
-                abort(403)
             # 设置长期缓存（1年）用于笔记资源
-            return send_file(file_path, max_age=31536000, conditional=True)
+            return send_manifest_file(file_path, max_age=31536000, conditional=True)
         except FileNotFoundError:
             abort(404)
+        except HTTPException:
+            raise
         except Exception as e:
             logging.error(f"Error serving note asset {doc_id}/{filename}: {e}")
             abort(500)
 
     @views_bp.route('/<nid>', methods=['GET'])
-    @cache(ttl=300)
     def get_note(nid):
         """获取笔记页面"""
         if re.search('[^a-z0-9_-]', nid):
             abort(404)
 
-        note = 'static/' + nid + '.html'
-        if not validate_file_access(note):
-            abort(403)
-
         try:
-            return send_file(note)
-        except FileNotFoundError:
-            abort(404)
+            response = serve_page(nid)
         except Exception as e:
             logging.error(f"Error serving note {nid}: {e}")
             abort(500)
+        if response is None:
+            abort(403)
+        return response
 
     return views_bp
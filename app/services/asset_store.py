@@ -0,0 +1,385 @@
+"""
+内容寻址的全局资源存储
+
+上传的资源按 x-sharenote-hash 只保存一份，位于 <store>/<哈希前两位>/<哈希>。
+笔记目录下的资源（static/notes/<slug>/assets/<哈希>.<扩展名>）是指向存储对象的硬链接，
+访问路径与文件清单不变；多篇笔记引用同一资源时不再互相移动文件，也不重复占用空间。
+
+哈希 -> 路径的索引在内存中，磁盘上的存储目录本身就是索引（路径由哈希直接确定），
+其他工作进程写入的对象在内存未命中时按路径确认，无需扫描笔记目录。
+每次发布记录笔记的资源清单（资源文件名集合），与上次发布的清单求差集即得到新增与
+不再使用的资源，无需解析新旧 HTML。清单持久化到数据目录下的 assets.json，
+多个工作进程在文件锁内先重新读取再修改。
+
+不再使用的资源进入延迟删除队列：页面缓存、浏览器与其他工作进程在失效前仍可能引用旧资源，
+storage.asset_delete_delay 秒后才删除笔记目录中的链接；资源重新被引用时取消删除，
+对象在不再被任何笔记引用后随之删除。到期的队列项在发布、删除笔记与启动时处理，
+后台清理线程另按 storage.asset_purge_interval 定期处理，空闲时也能按时删除。
+
+存储目录需与 static 位于同一文件系统；无法建立硬链接时退回复制。
+"""
+import os
+import re
+import json
+import fcntl
+import shutil
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from app.config.config_manager import config
+from app.services.compression_service import compression_service
+from app.services.file_manifest import file_manifest
+
+_HASH = re.compile(r'^[a-f0-9]{8,}$')
+
+
+class AssetStore:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AssetStore, cls).__new__(cls)
+            cls._instance.root = config.get('storage.asset_store', 'static/objects')
+            cls._instance._file_path = os.path.join(config.get('storage.data_dir', 'data'), 'assets.json')
+            cls._instance.delete_delay = config.get('storage.asset_delete_delay', 3600)
+            cls._instance._notes_dir = os.path.join('static', 'notes')
+            cls._instance._objects = {}     # 哈希 -> 对象路径
+            cls._instance._notes = {}       # slug -> 资源清单（资源文件名集合）
+            cls._instance._pending = []     # 延迟删除队列 [到期时间, slug, 资源文件名]
+            cls._instance._loaded = False
+            cls._instance._lock = threading.Lock()
+            cls._instance.purge_interval = config.get('storage.asset_purge_interval', 300)
+            cls._instance._purger = None           # 延迟删除清理线程
+            cls._instance._purger_stop = threading.Event()
+            # fork 时清理线程可能正持有锁；清理线程只留在父进程（gunicorn 主进程）中运行，子进程不再启动
+            os.register_at_fork(after_in_child=cls._instance._after_fork)
+        return cls._instance
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._purger = None
+
+    @staticmethod
+    def is_hash(value: str) -> bool:
+        """是否为合法的资源哈希（小写十六进制）"""
+        return bool(value) and bool(_HASH.match(value))
+
+    @staticmethod
+    def asset_hash(name: str) -> str:
+        """笔记资源文件名（<哈希>.<扩展名>）对应的资源哈希"""
+        return os.path.splitext(name)[0]
+
+    def object_path(self, file_hash: str) -> str:
+        """资源对象在存储中的路径"""
+        if not self.is_hash(file_hash):
+            raise ValueError(f"Invalid asset hash: {file_hash}")
+        return os.path.join(self.root, file_hash[:2], file_hash)
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程互斥：每次单独打开锁文件，避免 fork 后父子进程共享同一个 flock"""
+        os.makedirs(os.path.dirname(self._file_path) or '.', exist_ok=True)
+        with open(self._file_path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_file(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {
+                'notes': {slug: set(names) for slug, names in data['notes'].items()},
+                'pending': data.get('pending', []),
+            }
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"资源引用索引损坏，将重新生成 {self._file_path}: {e}")
+            return None
+
+    def _write_file(self, data: Dict[str, Any]) -> None:
+        tmp_path = f'{self._file_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'notes': {slug: sorted(names) for slug, names in data['notes'].items()},
+                'pending': data['pending'],
+            }, f)
+        os.replace(tmp_path, self._file_path)
+
+    def _current_data(self) -> Dict[str, Any]:
+        """磁盘上的最新状态（调用方需持有文件锁），索引文件缺失时以内存中的状态为准"""
+        data = self._read_file()
+        if data is None:
+            data = {'notes': {slug: set(names) for slug, names in self._notes.items()},
+                    'pending': list(self._pending)}
+        return data
+
+    def _apply(self, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._notes = data['notes']
+            self._pending = data['pending']
+
+    def load(self, notes_dir: str = os.path.join('static', 'notes')) -> None:
+        """加载存储目录与引用索引；索引不存在时把笔记目录中已有的资源迁移进存储
+
+        在 gunicorn 主进程中调用（preload_app），工作进程 fork 后直接继承。
+        """
+        objects = {}
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                if self.is_hash(name):
+                    objects[name] = os.path.join(root, name)
+        with self._lock:
+            self._objects = objects
+        self._notes_dir = notes_dir
+        with self._file_lock():
+            data = self._read_file()
+            if data is None:
+                data = {'notes': self._migrate(notes_dir), 'pending': []}
+                self._write_file(data)
+            else:
+                pending = len(data['pending'])
+                self._purge(data)
+                if len(data['pending']) != pending:
+                    self._write_file(data)
+        self._apply(data)
+        self._loaded = True
+        logging.info(f"资源存储已加载: {len(self._objects)} 个对象")
+
+    def _migrate(self, notes_dir: str) -> Dict[str, Set[str]]:
+        """把各笔记目录中以哈希命名的资源并入存储，重复内容替换为指向同一对象的硬链接
+
+        返回由现有资源生成的各笔记资源清单。
+        """
+        notes = {}
+        try:
+            slugs = os.listdir(notes_dir)
+        except FileNotFoundError:
+            return notes
+        for slug in slugs:
+            assets_path = os.path.join(notes_dir, slug, 'assets')
+            if not os.path.isdir(assets_path):
+                continue
+            for name in os.listdir(assets_path):
+                file_hash = self.asset_hash(name)
+                file_path = os.path.join(assets_path, name)
+                if not self.is_hash(file_hash) or not os.path.isfile(file_path):
+                    continue
+                try:
+                    if self.lookup(file_hash) is None:
+                        self._link_or_copy(file_path, self.object_path(file_hash))
+                        self._add_object(file_hash)
+                    else:
+                        self.link(file_hash, file_path)
+                    notes.setdefault(slug, set()).add(name)
+                except OSError as e:
+                    logging.error(f"迁移资源失败 {file_path}: {e}")
+        if notes:
+            logging.info(f"已将 {sum(len(names) for names in notes.values())} 个笔记资源迁移到资源存储")
+        return notes
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def _add_object(self, file_hash: str) -> str:
+        path = self.object_path(file_hash)
+        with self._lock:
+            self._objects[file_hash] = path
+        return path
+
+    def lookup(self, file_hash: str) -> Optional[str]:
+        """返回资源对象路径，不存在时返回 None"""
+        if not self.is_hash(file_hash):
+            return None
+        path = self._objects.get(file_hash)
+        if path is not None and os.path.isfile(path):
+            return path
+        # 其他工作进程新写入的对象
+        path = self.object_path(file_hash)
+        if os.path.isfile(path):
+            return self._add_object(file_hash)
+        with self._lock:
+            self._objects.pop(file_hash, None)
+        return None
+
+    def put(self, file_hash: str, data: bytes) -> str:
+        """写入资源内容，已存在相同哈希的对象时直接复用，返回对象路径"""
+        path = self.lookup(file_hash)
+        if path is not None:
+            return path
+        path = self.object_path(file_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return self._add_object(file_hash)
+
+    def ingest(self, file_hash: str, src_path: str) -> str:
+        """把已有文件并入存储（已存在相同对象时删除该文件），返回对象路径"""
+        path = self.lookup(file_hash)
+        if path is not None:
+            os.remove(src_path)
+            return path
+        path = self.object_path(file_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src_path, path)
+        return self._add_object(file_hash)
+
+    @staticmethod
+    def _link_or_copy(src_path: str, target_path: str) -> None:
+        """原子地在 target_path 建立 src_path 的硬链接，不支持硬链接时复制"""
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        tmp_path = f'{target_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            shutil.copy2(src_path, tmp_path)
+        os.replace(tmp_path, target_path)
+
+    def link(self, file_hash: str, target_path: str) -> bool:
+        """让 target_path 指向资源对象（硬链接），对象不存在时返回 False"""
+        path = self.lookup(file_hash)
+        if path is None:
+            return False
+        try:
+            if os.path.samefile(path, target_path):
+                return True
+        except OSError:
+            pass
+        self._link_or_copy(path, target_path)
+        return True
+
+    def _update(self, slug: str, names: Set[str], replace: bool) -> Tuple[Set[str], Set[str]]:
+        """在文件锁内更新一篇笔记的资源清单（replace 为 False 时只增加），返回 (新增, 移除) 的资源"""
+        self._ensure_loaded()
+        with self._file_lock():
+            data = self._current_data()
+            before = data['notes'].get(slug, set())
+            after = set(names) if replace else before | set(names)
+            added, removed = after - before, before - after
+            if after:
+                data['notes'][slug] = after
+            else:
+                data['notes'].pop(slug, None)
+            due = time.time() + self.delete_delay
+            data['pending'].extend([due, slug, name] for name in sorted(removed))
+            pending = len(data['pending'])
+            self._purge(data)
+            if added or removed or len(data['pending']) != pending:
+                self._write_file(data)
+        self._apply(data)
+        return added, removed
+
+    def _purge(self, data: Dict[str, Any], now: Optional[float] = None) -> Set[str]:
+        """处理延迟删除队列中到期的项（调用方需持有文件锁），返回已删除的对象哈希
+
+        资源到期前重新被该笔记引用时保留链接；对象只在不再被任何笔记引用时删除。
+        """
+        now = time.time() if now is None else now
+        due = [entry for entry in data['pending'] if entry[0] <= now]
+        if not due:
+            return set()
+        data['pending'] = [entry for entry in data['pending'] if entry[0] > now]
+        in_use = {self.asset_hash(name) for names in data['notes'].values() for name in names}
+        removed_objects = set()
+        for _, slug, name in due:
+            if name in data['notes'].get(slug, ()):
+                continue
+            link_path = os.path.join(self._notes_dir, slug, 'assets', name)
+            if os.path.exists(link_path):
+                self._remove_file(link_path)
+                compression_service.remove_variants(link_path)
+                file_manifest.refresh(link_path, broadcast=True)
+            file_hash = self.asset_hash(name)
+            if file_hash not in in_use and file_hash not in removed_objects and self.is_hash(file_hash):
+                self._remove_file(self.object_path(file_hash))
+                with self._lock:
+                    self._objects.pop(file_hash, None)
+                removed_objects.add(file_hash)
+        return removed_objects
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+            logging.info(f"Removed unused asset: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"Error removing asset {path}: {e}")
+
+    def acquire(self, slug: str, names: Iterable[str]) -> None:
+        """把资源加入笔记的资源清单（资源文件名为 <哈希>.<扩展名>）"""
+        self._update(slug, set(names), replace=False)
+
+    def set_note_assets(self, slug: str, names: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+        """以本次发布的资源替换笔记的资源清单，返回 (新增, 移除) 的资源文件名
+
+        移除的资源进入延迟删除队列。
+        """
+        return self._update(slug, set(names), replace=True)
+
+    def release(self, slug: str) -> Set[str]:
+        """清空笔记的资源清单（删除笔记时），返回移除的资源文件名"""
+        return self._update(slug, set(), replace=True)[1]
+
+    def purge(self, now: Optional[float] = None) -> Set[str]:
+        """立即处理延迟删除队列中到期的项，返回已删除的对象哈希"""
+        self._ensure_loaded()
+        with self._file_lock():
+            data = self._current_data()
+            pending = len(data['pending'])
+            removed = self._purge(data, now)
+            if len(data['pending']) != pending:
+                self._write_file(data)
+        self._apply(data)
+        return removed
+
+    def start_purger(self) -> None:
+        """启动后台延迟删除清理线程（purge_interval 不大于 0 时不启动）"""
+        if self._purger is not None or self.purge_interval <= 0:
+            return
+        self._purger_stop = threading.Event()
+        self._purger = threading.Thread(target=self._purge_loop, args=(self._purger_stop,),
+                                        name='asset-purger', daemon=True)
+        self._purger.start()
+
+    def stop_purger(self) -> None:
+        """停止后台延迟删除清理线程"""
+        if self._purger is not None:
+            self._purger_stop.set()
+            self._purger.join()
+            self._purger = None
+
+    def _purge_loop(self, stop: threading.Event) -> None:
+        while not stop.wait(self.purge_interval):
+            try:
+                removed = self.purge()
+                if removed:
+                    logging.info(f"Asset purger removed {len(removed)} unused objects")
+            except Exception as e:
+                logging.error(f"Asset purge failed: {e}")
+
+    def note_assets(self, slug: str) -> Set[str]:
+        """笔记的资源清单（资源文件名集合）"""
+        self._ensure_loaded()
+        return set(self._notes.get(slug, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        """资源存储统计"""
+        return {
+            'objects': len(self._objects),
+            'notes': len(self._notes),
+            'references': sum(len(names) for names in self._notes.values()),
+            'pending_deletes': len(self._pending),
+        }
+
+
+asset_store = AssetStore()
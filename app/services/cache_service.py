@@ -1,132 +1,406 @@
 import functools
+import os
+import sys
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
 import logging
-from threading import Lock
-from flask import Response, make_response, send_file
+from threading import Event, Lock, Thread
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response, make_response, send_file, has_request_context, copy_current_request_context
+from app.config.config_manager import config
+from app.services.invalidation_bus import invalidation_bus
+
+def cache_key(name: str, *args, **kwargs) -> str:
+    """构造缓存键，装饰器与手动失效共用；关键字参数按名称排序"""
+    return f"{name}:{args}:{dict(sorted(kwargs.items()))}"
 
 class CacheService:
+    """进程内 LRU 缓存：按字节预算与条目数淘汰最久未使用的条目，过期在读取时惰性检查
+
+    键的第一个 ':' 之前为命名空间（装饰器缓存为函数名），可为命名空间单独限制条目数。
+    设置了 stale_ttl 的条目过期后仍保留 stale_ttl 秒，供装饰器先返回旧值再后台刷新。
+    未被读取的过期条目由后台清理线程按 cache.sweep_interval 定期删除。
+    """
     _instance = None
-    _cache: Dict[str, Dict[str, Any]] = {}
+    _cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
     _lock = Lock()
-    
+
+    # 每个条目的固定开销估算（字典、键、过期时间等）
+    ENTRY_OVERHEAD = 200
+
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super(CacheService, cls).__new__(cls)
-                    cls._instance._cache = {}
+                    cls._instance._cache = OrderedDict()    # key -> {value, expires_at, size, namespace}，按最近使用排序
+                    cls._instance._namespace_counts = {}    # namespace -> 条目数
+                    cls._instance._namespace_keys = {}      # 有条目数上限的 namespace -> OrderedDict(key -> None)，按最近使用排序
+                    cls._instance._tags = {}                # tag -> {key}
+                    cls._instance._flights = {}             # key -> Event，正在计算中的缓存键（single-flight）
+                    cls._instance._bytes = 0
+                    cls._instance._refresh_pool = None      # 后台刷新线程池，首次使用时创建
+                    cls._instance._sweeper = None           # 过期清理线程
+                    cls._instance._sweeper_stop = Event()
+                    cls._instance.sweep_interval = config.get('cache.sweep_interval', 60)
+                    cls._instance._counters = dict.fromkeys(
+                        ('hits', 'stale_hits', 'misses', 'evictions', 'expirations'), 0)
+                    cls._instance.refresh_workers = config.get('cache.refresh_workers', 2)
+                    cls._instance.max_bytes = config.get('cache.max_bytes_mb', 64) * 1024 * 1024
+                    cls._instance.max_entries = config.get('cache.max_entries', 10000)
+                    cls._instance.namespace_limits = dict(config.get('cache.namespace_limits', {}) or {})
+                    # 线程不会被 fork 到子进程，子进程中重新创建；fork 时清理线程等可能正持有锁，锁也重新创建
+                    os.register_at_fork(after_in_child=cls._instance._after_fork)
         return cls._instance
-    
+
+    def _after_fork(self) -> None:
+        type(self)._lock = Lock()
+        # 父进程中正在计算的键不会在子进程中完成
+        self._flights = {}
+        self._refresh_pool = None
+        if self._sweeper is not None:
+            self._sweeper = None
+            self.start_sweeper()
+
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(':', 1)[0]
+
+    @classmethod
+    def _sizeof(cls, value: Any) -> int:
+        """估算缓存值的字节数：字符串与响应体按长度计，容器递归累加"""
+        if type(value) is tuple and len(value) == 3 and isinstance(value[0], (bytes, str)):
+            # 装饰器缓存的响应 (content, status_code, headers)
+            headers = value[2] or {}
+            return len(value[0]) + sum(len(k) + len(str(v)) for k, v in headers.items())
+        if isinstance(value, (bytes, bytearray, str)):
+            return len(value)
+        if isinstance(value, (tuple, list, set)):
+            return 64 + sum(cls._sizeof(v) for v in value)
+        if isinstance(value, dict):
+            return 64 + sum(cls._sizeof(k) + cls._sizeof(v) for k, v in value.items())
+        return sys.getsizeof(value)
+
     def get(self, key: str) -> Optional[Any]:
-        """获取缓存值"""
+        """获取缓存值；已过期的条目（即使仍在 stale_ttl 内）视为未命中"""
+        return self.get_with_staleness(key, allow_stale=False)[0]
+
+    def get_with_staleness(self, key: str, allow_stale: bool = True) -> Tuple[Optional[Any], bool]:
+        """获取缓存值，返回 (值, 是否已过期)；过期但仍在 stale_ttl 内的条目返回旧值
+
+        只有实际返回旧值时才计为 stale_hits，allow_stale 为 False 时过期条目计为未命中。
+        """
         with self._lock:
-            if key in self._cache:
-                item = self._cache[key]
-                if item['expires_at'] > time.time():
-                    return item['value']
-                else:
-                    del self._cache[key]
+            item = self._cache.get(key)
+            if item is None:
+                self._counters['misses'] += 1
+                return None, False
+            now = time.time()
+            if item['expires_at'] <= now:
+                if item['stale_until'] <= now:
+                    self._remove(key)
+                    self._counters['expirations'] += 1
+                    self._counters['misses'] += 1
                     logging.debug(f"Cache expired for key: {key}")
-            return None
-        
-    MAX_ENTRIES = 100
-
-    def _evict_if_needed(self) -> None:
-        """若条目超过上限，删除最早过期的 10 个"""
-        if len(self._cache) >= self.MAX_ENTRIES:
-            oldest = sorted(self._cache.items(), key=lambda kv: kv[1]['expires_at'])[:10]
-            for k, _ in oldest:
-                del self._cache[k]
-
-    def set(self, key: str, value: Any, ttl: int = 300) -> None:
-        """设置缓存值"""
-        with self._lock:
-            self._evict_if_needed()
-            if isinstance(value, tuple):
-                content, status_code, headers = value + (None,) * (3 - len(value))
-                self._cache[key] = {
-                    'value': (content, status_code, headers),
-                    'expires_at': time.time() + ttl
-                }
+                    return None, False
+                if not allow_stale:
+                    self._counters['misses'] += 1
+                    return None, False
+                stale = True
+                self._counters['stale_hits'] += 1
             else:
-                self._cache[key] = {
-                    'value': value,
-                    'expires_at': time.time() + ttl
-                }
-            
+                stale = False
+                self._counters['hits'] += 1
+            self._cache.move_to_end(key)
+            keys = self._namespace_keys.get(item['namespace'])
+            if keys is not None:
+                keys.move_to_end(key)
+            return item['value'], stale
+
+    def _remove(self, key: str) -> Optional[Dict[str, Any]]:
+        """删除条目并更新统计（调用方需持有锁）"""
+        item = self._cache.pop(key, None)
+        if item is not None:
+            namespace = item['namespace']
+            self._bytes -= item['size']
+            count = self._namespace_counts[namespace] - 1
+            if count:
+                self._namespace_counts[namespace] = count
+            else:
+                del self._namespace_counts[namespace]
+            keys = self._namespace_keys.get(namespace)
+            if keys is not None:
+                del keys[key]
+            for tag in item['tags']:
+                tagged = self._tags[tag]
+                tagged.discard(key)
+                if not tagged:
+                    del self._tags[tag]
+        return item
+
+    def _evict_if_needed(self, namespace: str) -> None:
+        """淘汰最久未使用的条目，直到满足命名空间、条目数与字节预算限制（调用方需持有锁）"""
+        keys = self._namespace_keys.get(namespace)
+        limit = self.namespace_limits.get(namespace)
+        if keys is not None and limit is not None:
+            while len(keys) > limit:
+                self._remove(next(iter(keys)))
+                self._counters['evictions'] += 1
+        while self._cache and (len(self._cache) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._cache)))
+            self._counters['evictions'] += 1
+
+    def set(self, key: str, value: Any, ttl: int = 300, tags: Iterable[str] = (), stale_ttl: int = 0) -> None:
+        """设置缓存值，tags 为可用于批量失效的标签，stale_ttl 为过期后仍可返回旧值的秒数"""
+        if isinstance(value, tuple):
+            content, status_code, headers = value + (None,) * (3 - len(value))
+            value = (content, status_code, headers)
+        size = self.ENTRY_OVERHEAD + len(key) + self._sizeof(value)
+        namespace = self._namespace(key)
+        with self._lock:
+            if key in self._cache:
+                self._remove(key)
+            if size > self.max_bytes:
+                logging.debug(f"Cache value too large for key: {key} ({size} bytes)")
+                return
+            expires_at = time.time() + ttl
+            self._cache[key] = {
+                'value': value,
+                'expires_at': expires_at,
+                'stale_until': expires_at + stale_ttl,
+                'size': size,
+                'namespace': namespace,
+                'tags': tuple(tags),
+            }
+            for tag in self._cache[key]['tags']:
+                self._tags.setdefault(tag, set()).add(key)
+            self._namespace_counts[namespace] = self._namespace_counts.get(namespace, 0) + 1
+            if namespace in self.namespace_limits:
+                self._namespace_keys.setdefault(namespace, OrderedDict())[key] = None
+            self._bytes += size
+            self._evict_if_needed(namespace)
+
     def delete(self, key: str) -> None:
         """删除缓存值"""
         with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-            
+            self._remove(key)
+
     def clear(self) -> None:
         """清空缓存"""
         with self._lock:
             self._cache.clear()
-        
-    def cleanup(self) -> None:
-        """清理过期缓存"""
+            self._namespace_counts.clear()
+            self._namespace_keys.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def begin_flight(self, key: str) -> Tuple[bool, Event]:
+        """登记对 key 的计算，返回 (是否由本线程计算, 完成事件)"""
+        with self._lock:
+            event = self._flights.get(key)
+            if event is not None:
+                return False, event
+            event = self._flights[key] = Event()
+            return True, event
+
+    def end_flight(self, key: str) -> None:
+        """计算结束（无论成功与否），唤醒等待的线程"""
+        with self._lock:
+            event = self._flights.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def refresh_in_background(self, key: str, refresh: Callable[[], Any]) -> bool:
+        """在后台线程池中执行 refresh；同一 key 同时只运行一个刷新，返回是否已提交"""
+        leader, _ = self.begin_flight(key)
+        if not leader:
+            return False
+
+        def run():
+            try:
+                refresh()
+            except Exception as e:
+                logging.error(f"Background cache refresh failed for {key}: {e}")
+            finally:
+                self.end_flight(key)
+
+        try:
+            with self._lock:
+                if self._refresh_pool is None:
+                    self._refresh_pool = ThreadPoolExecutor(
+                        max_workers=self.refresh_workers, thread_name_prefix='cache-refresh')
+                pool = self._refresh_pool
+            pool.submit(run)
+        except RuntimeError as e:
+            # 解释器退出时线程池已关闭
+            logging.debug(f"Cannot schedule cache refresh for {key}: {e}")
+            self.end_flight(key)
+            return False
+        return True
+
+    def invalidate_tag(self, tag: str, broadcast: bool = False) -> int:
+        """删除带有该标签的全部条目，返回删除数；broadcast 为 True 时同时通知其他工作进程"""
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+        if broadcast:
+            invalidation_bus.publish('cache_tag', tag)
+        if keys:
+            logging.debug(f"Cache invalidated {len(keys)} entries for tag: {tag}")
+        return len(keys)
+
+    def cleanup(self) -> int:
+        """清理过期缓存，返回删除的条目数"""
         with self._lock:
             current_time = time.time()
             expired_keys = [
                 key for key, item in self._cache.items()
-                if item['expires_at'] <= current_time
+                if item['stale_until'] <= current_time
             ]
             for key in expired_keys:
-                del self._cache[key]
+                self._remove(key)
+            self._counters['expirations'] += len(expired_keys)
+        return len(expired_keys)
+
+    def start_sweeper(self) -> None:
+        """启动后台过期清理线程（sweep_interval 不大于 0 时不启动）"""
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        self._sweeper_stop = Event()
+        self._sweeper = Thread(target=self._sweep, args=(self._sweeper_stop,),
+                               name='cache-sweeper', daemon=True)
+        self._sweeper.start()
 
-def cache(ttl: int = 300):
-    """缓存装饰器"""
+    def stop_sweeper(self) -> None:
+        """停止后台过期清理线程"""
+        if self._sweeper is not None:
+            self._sweeper_stop.set()
+            self._sweeper.join()
+            self._sweeper = None
+
+    def _sweep(self, stop: Event) -> None:
+        while not stop.wait(self.sweep_interval):
+            try:
+                removed = self.cleanup()
+                if removed:
+                    logging.debug(f"Cache sweeper removed {removed} expired entries")
+            except Exception as e:
+                logging.error(f"Cache sweep failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计：命中/未命中/淘汰/过期计数、常驻字节数与各命名空间条目数"""
+        with self._lock:
+            counters = dict(self._counters)
+            lookups = counters['hits'] + counters['stale_hits'] + counters['misses']
+            return {
+                'entries': len(self._cache),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                **counters,
+                'hit_rate': round((counters['hits'] + counters['stale_hits']) / lookups, 4) if lookups else 0.0,
+                'namespaces': dict(self._namespace_counts),
+            }
+
+def _restore_cached(cached_value: Any) -> Any:
+    """将缓存值还原为返回值：缓存的响应重新构造为 Response"""
+    if isinstance(cached_value, tuple):
+        content, status_code, headers = cached_value
+        response = make_response(content)
+        if headers:
+            response.headers.update(headers)
+        if status_code:
+            response.status_code = status_code
+        return response
+    return cached_value
+
+def cache(ttl: int = 300, tags: Union[Iterable[str], Callable[..., Iterable[str]], None] = None,
+          single_flight: bool = False, wait_timeout: float = 10, stale_ttl: int = 0):
+    """缓存装饰器
+
+    Args:
+        ttl: 过期时间（秒）
+        tags: 缓存条目的标签，或以被装饰函数的参数计算标签的函数
+        single_flight: 缓存未命中时只由第一个请求计算，其余并发请求等待其结果
+        wait_timeout: single_flight 模式下等待的最长时间（秒），超时后自行计算
+        stale_ttl: 过期后 stale_ttl 秒内直接返回旧值，并在后台线程中刷新
+    """
     def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            # 生成缓存键
-            cache_key = f"{func.__name__}:{args}:{kwargs}"
-            
-            # 获取缓存服务实例
-            cache_service = CacheService()
-            
-            # 尝试从缓存获取
-            cached_value = cache_service.get(cache_key)
-            if cached_value is not None:
-                logging.debug(f"Cache hit for {cache_key}")
-                # 如果是Response对象，创建新的响应
-                if isinstance(cached_value, tuple):
-                    content, status_code, headers = cached_value
-                    response = make_response(content)
-                    if headers:
-                        response.headers.update(headers)
-                    if status_code:
-                        response.status_code = status_code
-                    return response
-                return cached_value
-                
+        def compute(cache_service, key, args, kwargs):
             # 执行原函数
             result = func(*args, **kwargs)
-            
+            entry_tags = (tags(*args, **kwargs) if callable(tags) else tags) or ()
+
             # 针对 send_file 等直接传递模式的响应对象特殊处理
             if isinstance(result, Response) and not hasattr(result, 'direct_passthrough'):
                 try:
                     cache_value = (result.get_data(), result.status_code, dict(result.headers))
                     # 存入缓存
-                    cache_service.set(cache_key, cache_value, ttl)
-                    logging.debug(f"Cache miss for {cache_key}, cached new value")
+                    cache_service.set(key, cache_value, ttl, entry_tags, stale_ttl)
+                    logging.debug(f"Cache miss for {key}, cached new value")
                 except RuntimeError:
                     # 如果是直接传递模式无法缓存，则跳过缓存
-                    logging.debug(f"Cannot cache direct passthrough response for {cache_key}")
+                    logging.debug(f"Cannot cache direct passthrough response for {key}")
             elif not isinstance(result, Response):
                 # 普通对象可以直接缓存
-                cache_service.set(cache_key, result, ttl)
-                logging.debug(f"Cache miss for {cache_key}, cached new value")
+                cache_service.set(key, result, ttl, entry_tags, stale_ttl)
+                logging.debug(f"Cache miss for {key}, cached new value")
             else:
                 # 其他无法缓存的响应对象，跳过缓存
-                logging.debug(f"Skipping cache for uncacheable response: {cache_key}")
-            
+                logging.debug(f"Skipping cache for uncacheable response: {key}")
+
             return result
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # 生成缓存键
+            key = cache_key(func.__name__, *args, **kwargs)
+
+            # 获取缓存服务实例
+            cache_service = CacheService()
+
+            # 尝试从缓存获取
+            cached_value, stale = cache_service.get_with_staleness(key)
+            if cached_value is not None:
+                if stale:
+                    refresh = functools.partial(compute, cache_service, key, args, kwargs)
+                    if has_request_context():
+                        refresh = copy_current_request_context(refresh)
+                    cache_service.refresh_in_background(key, refresh)
+                    logging.debug(f"Cache stale for {key}, refreshing in background")
+                else:
+                    logging.debug(f"Cache hit for {key}")
+                return _restore_cached(cached_value)
+
+            if not single_flight:
+                return compute(cache_service, key, args, kwargs)
+
+            leader, event = cache_service.begin_flight(key)
+            if leader:
+                try:
+                    return compute(cache_service, key, args, kwargs)
+                finally:
+                    cache_service.end_flight(key)
+
+            # 等待第一个请求算完后从缓存读取；超时或结果不可缓存时自行计算
+            if event.wait(wait_timeout):
+                cached_value = cache_service.get(key)
+                if cached_value is not None:
+                    logging.debug(f"Cache hit for {key} after waiting")
+                    return _restore_cached(cached_value)
+            else:
+                logging.warning(f"Timed out waiting for in-flight computation of {key}")
+            return compute(cache_service, key, args, kwargs)
         return wrapper
     return decorator
 
 # 创建单例实例
-cache_service = CacheService()
\ No newline at end of file
+cache_service = CacheService()
+
+# 应用其他工作进程发布的缓存失效事件
+invalidation_bus.subscribe('cache_delete', cache_service.delete)
+invalidation_bus.subscribe('cache_clear', cache_service.clear)
+invalidation_bus.subscribe('cache_tag', cache_service.invalidate_tag)
+invalidation_bus.on_resync(cache_service.clear)
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+发布时预压缩
+
+笔记页面、主题样式和上传的文本类资源在写入时生成 .gz（以及安装了 brotli 时的 .br）
+同名文件，压缩在后台线程中以最高压缩级别执行一次；文件清单记录有效的压缩版本，
+请求时按 Accept-Encoding 直接发送，不再每次传输未压缩内容或实时压缩。
+
+压缩文件的修改时间被设为与源文件相同，只有两者一致时才视为有效，
+源文件被覆盖而压缩尚未完成时会退回发送源文件。
+"""
+import os
+import gzip
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from app.config.config_manager import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 按优先顺序排列的 (Content-Encoding, 文件后缀)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')] if brotli is not None else [('gzip', '.gz')]
+_SUFFIXES = ('.br', '.gz')
+
+
+def _compress(encoding: str, data: bytes) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0 保证相同内容得到相同的压缩结果
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class CompressionService:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CompressionService, cls).__new__(cls)
+            cls._instance.enabled = config.get('files.precompress', True)
+            cls._instance.min_bytes = config.get('files.precompress_min_bytes', 1024)
+            cls._instance.types = {
+                ext.lower() for ext in config.get('files.precompress_types', ['html', 'css', 'js', 'svg'])
+            }
+            cls._instance._pool = None
+            cls._instance._lock = threading.Lock()
+            # 线程池的工作线程不会被 fork 到子进程，子进程中重新创建
+            os.register_at_fork(after_in_child=cls._instance._reset_pool)
+        return cls._instance
+
+    def _reset_pool(self) -> None:
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def should_compress(self, file_path: str) -> bool:
+        """是否为需要预压缩的文件类型"""
+        if not self.enabled:
+            return False
+        ext = os.path.splitext(file_path)[1].lstrip('.').lower()
+        return ext in self.types
+
+    @staticmethod
+    def _is_fresh(variant_path: str, source_mtime_ns: int) -> bool:
+        try:
+            return os.stat(variant_path).st_mtime_ns == source_mtime_ns
+        except OSError:
+            return False
+
+    def precompress(self, file_path: str) -> List[str]:
+        """为文件生成预压缩版本，返回新写入的编码列表；已是最新的版本跳过"""
+        if not self.should_compress(file_path):
+            return []
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return []
+        if st.st_size < self.min_bytes:
+            self.remove_variants(file_path)
+            return []
+
+        pending = [(encoding, suffix) for encoding, suffix in ENCODINGS
+                   if not self._is_fresh(file_path + suffix, st.st_mtime_ns)]
+        if not pending:
+            return []
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        written = []
+        for encoding, suffix in pending:
+            variant_path = file_path + suffix
+            tmp_path = f'{variant_path}.{os.getpid()}.tmp'
+            try:
+                compressed = _compress(encoding, data)
+                if len(compressed) >= len(data):
+                    # 压缩无收益时不保留压缩版本
+                    self._remove(variant_path)
+                    continue
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                os.replace(tmp_path, variant_path)
+                written.append(encoding)
+            except Exception as e:
+                logging.error(f"预压缩失败 {variant_path}: {e}")
+                self._remove(tmp_path)
+        if written:
+            logging.debug(f"已预压缩 {file_path}: {', '.join(written)}")
+        return written
+
+    def precompress_async(self, file_path: str, on_done: Optional[Callable[[], None]] = None) -> None:
+        """在后台线程中预压缩文件；生成了新的压缩版本时调用 on_done"""
+        if not self.should_compress(file_path):
+            return
+
+        def run():
+            try:
+                if self.precompress(file_path) and on_done is not None:
+                    on_done()
+            except Exception as e:
+                logging.error(f"预压缩失败 {file_path}: {e}")
+
+        self._submit(run)
+
+    def precompress_tree(self, directory: str, on_file_done: Optional[Callable[[str], None]] = None) -> None:
+        """在后台线程中预压缩目录下所有需要压缩的文件（启动时补齐缺失或过期的版本）
+
+        每个生成了新压缩版本的文件以其路径调用 on_file_done。
+        """
+        def run():
+            count = 0
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if name.endswith(_SUFFIXES):
+                        continue
+                    file_path = os.path.join(root, name)
+                    try:
+                        if self.precompress(file_path):
+                            count += 1
+                            if on_file_done is not None:
+                                on_file_done(file_path)
+                    except Exception as e:
+                        logging.error(f"预压缩失败 {file_path}: {e}")
+            if count:
+                logging.info(f"已预压缩 {directory} 下 {count} 个文件")
+
+        if self.enabled:
+            self._submit(run)
+
+    def _submit(self, fn: Callable[[], None]) -> None:
+        try:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='precompress')
+                pool = self._pool
+            pool.submit(fn)
+        except RuntimeError as e:
+            # 解释器退出时线程池已关闭
+            logging.debug(f"无法提交预压缩任务: {e}")
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"删除文件失败 {path}: {e}")
+
+    def remove_variants(self, file_path: str) -> None:
+        """删除文件的所有预压缩版本（源文件删除或不再需要压缩时）"""
+        for suffix in _SUFFIXES:
+            self._remove(file_path + suffix)
+
+    def fresh_variants(self, file_path: str, mtime_ns: int) -> Dict[str, str]:
+        """返回与源文件版本一致的预压缩文件，{Content-Encoding: 路径}，按优先顺序排列"""
+        if not self.should_compress(file_path):
+            return {}
+        return {encoding: file_path + suffix for encoding, suffix in ENCODINGS
+                if self._is_fresh(file_path + suffix, mtime_ns)}
+
+    def read_variants(self, file_path: str, mtime_ns: int) -> Dict[str, bytes]:
+        """读取与源文件版本一致的预压缩内容，返回 {Content-Encoding: 内容}"""
+        variants = {}
+        if not self.should_compress(file_path):
+            return variants
+        for encoding, suffix in ENCODINGS:
+            try:
+                with open(file_path + suffix, 'rb') as f:
+                    if os.fstat(f.fileno()).st_mtime_ns == mtime_ns:
+                        variants[encoding] = f.read()
+            except OSError:
+                continue
+        return variants
+
+
+compression_service = CompressionService()
@@ -0,0 +1,130 @@
+"""
+可访问文件清单
+
+启动时扫描 assets/ 与 static/，记录所有允许访问的文件（路径 -> 大小、修改时间、
+MIME 类型、ETag 与有效的预压缩版本）。请求时只需一次字典查找即可完成访问校验，
+并直接使用预先计算的响应头，不再逐个请求检查文件是否存在、是否为目录、类型是否允许。
+
+发布、删除笔记与上传资源时刷新对应路径，并通过失效通知总线同步到其他工作进程；
+文件监控检测到的笔记变更同样经由 invalidate_note 刷新。
+"""
+import os
+import logging
+import mimetypes
+import threading
+from typing import Any, Dict, Iterable, Optional
+from app.config.config_manager import config
+from app.services.compression_service import compression_service
+from app.services.invalidation_bus import invalidation_bus
+
+SERVABLE_ROOTS = ('assets', 'static')
+
+
+def _normalize(file_path: str) -> str:
+    return os.path.normpath(file_path).replace(os.sep, '/')
+
+
+class FileManifest:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FileManifest, cls).__new__(cls)
+            cls._instance._entries = {}     # 规范化路径 -> 文件信息
+            cls._instance._built = False
+            cls._instance._lock = threading.Lock()
+            cls._instance.allowed_types = {'html'} | {
+                ext.lower() for ext in config.get('files.allowed_filetypes', [])
+            }
+            # fork 时其他线程（如文件监控）可能正持有锁，子进程中重新创建
+            os.register_at_fork(after_in_child=cls._instance._reset_lock)
+        return cls._instance
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def _is_allowed(self, file_path: str) -> bool:
+        ext = os.path.splitext(file_path)[1].lstrip('.').lower()
+        return ext in self.allowed_types
+
+    def _make_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取文件信息；不存在、不是普通文件或类型不允许时返回 None"""
+        if not self._is_allowed(key):
+            return None
+        try:
+            st = os.stat(key)
+        except OSError:
+            return None
+        if not os.path.isfile(key):
+            return None
+        return {
+            'path': key,
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+            'mimetype': mimetypes.guess_type(key)[0] or 'application/octet-stream',
+            'etag': f'{st.st_mtime_ns:x}-{st.st_size:x}',
+            'variants': compression_service.fresh_variants(key, st.st_mtime_ns),
+            'vary': compression_service.should_compress(key),
+        }
+
+    def _scan(self, directory: str) -> Dict[str, Dict[str, Any]]:
+        entries = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                key = _normalize(os.path.join(root, name))
+                entry = self._make_entry(key)
+                if entry is not None:
+                    entries[key] = entry
+        return entries
+
+    def build(self, roots: Iterable[str] = SERVABLE_ROOTS) -> int:
+        """重新扫描全部可访问目录，返回文件数"""
+        entries = {}
+        for root in roots:
+            entries.update(self._scan(root))
+        with self._lock:
+            self._entries = entries
+            self._built = True
+        logging.info(f"文件清单已建立: {len(entries)} 个文件")
+        return len(entries)
+
+    def lookup(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """返回允许访问的文件信息，不允许访问或不存在时返回 None"""
+        # 先检查路径遍历，再进行normpath
+        if '..' in file_path:
+            logging.warning(f"检测到路径遍历尝试: {file_path}")
+            return None
+        if not self._built:
+            self.build()
+        return self._entries.get(_normalize(file_path))
+
+    def refresh(self, path: str, broadcast: bool = False) -> None:
+        """按磁盘当前状态刷新文件或目录（整棵子树）的清单条目
+
+        broadcast 为 True 时同时通知其他工作进程。
+        """
+        key = _normalize(path)
+        entry = self._make_entry(key)
+        if entry is not None:
+            with self._lock:
+                self._entries[key] = entry
+        else:
+            subtree = self._scan(key) if os.path.isdir(key) else {}
+            prefix = key + '/'
+            with self._lock:
+                self._entries.pop(key, None)
+                for stale in [k for k in self._entries if k.startswith(prefix) and k not in subtree]:
+                    del self._entries[stale]
+                self._entries.update(subtree)
+        if broadcast:
+            invalidation_bus.publish('file', key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+file_manifest = FileManifest()
+
+# 应用其他工作进程发布的文件变更；事件丢失时重新扫描
+invalidation_bus.subscribe('file', file_manifest.refresh)
+invalidation_bus.on_resync(file_manifest.build)
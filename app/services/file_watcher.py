@@ -2,11 +2,28 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import logging
 import os
+import threading
+import time
+from app.config.config_manager import config
 
 class NoteChangeHandler(FileSystemEventHandler):
-    def __init__(self, watch_path: str = 'static'):
+    """笔记变更处理：静默窗口内的事件按路径去重合并，窗口结束后作为一个变更集统一处理"""
+
+    # 事件持续不断时，变更集最长推迟 quiet_window 的倍数后强制处理
+    MAX_DELAY_FACTOR = 10
+
+    def __init__(self, watch_path: str = 'static', quiet_window: float = None):
         super().__init__()
         self.watch_path = watch_path
+        if quiet_window is None:
+            quiet_window = config.get('files.watch_quiet_ms', 500) / 1000
+        self.quiet_window = quiet_window
+        self._pending = set()
+        self._first_event = None
+        self._timer = None
+        self._lock = threading.Lock()
+        # 保证变更集按顺序逐个处理
+        self._process_lock = threading.Lock()
 
     def on_modified(self, event):
         if not event.is_directory and event.src_path.endswith('.html'):
@@ -23,20 +40,69 @@ class NoteChangeHandler(FileSystemEventHandler):
             logging.info(f"检测到文件删除: {event.src_path}")
             self._handle_note_change(event.src_path)
 
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+        # 原子写入（临时文件重命名）时只有目标路径是笔记
+        paths = [p for p in (event.src_path, event.dest_path) if p.endswith('.html')]
+        if paths:
+            logging.info(f"检测到文件移动: {event.src_path} -> {event.dest_path}")
+        for path in paths:
+            self._handle_note_change(path)
+
     def _handle_note_change(self, file_path):
-        """处理笔记文件变更：重建搜索索引并清理缓存"""
+        """记录变更路径，并把变更集的处理推迟到静默窗口结束"""
+        with self._lock:
+            now = time.monotonic()
+            self._pending.add(file_path)
+            if self._first_event is None:
+                self._first_event = now
+            if self._timer is not None:
+                if now - self._first_event >= self.quiet_window * self.MAX_DELAY_FACTOR:
+                    return
+                self._timer.cancel()
+            self._timer = threading.Timer(self.quiet_window, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """立即处理已合并的变更集"""
+        with self._process_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                pending, self._pending = self._pending, set()
+                self._timer = self._first_event = None
+            if pending:
+                self._process_changes(pending)
+
+    def _process_changes(self, file_paths):
+        """处理变更集：按文件当前状态逐个更新搜索索引并失效相关缓存
+
+        监控只运行在主进程中，变更同时发布到失效通知总线，由各工作进程自行同步。
+        经由接口发布或删除的笔记已在工作进程中处理并写入笔记清单，
+        文件状态与清单一致的变更直接跳过，每次变更只处理一次。
+        """
+        from app.services.note_service import invalidate_note
+        from app.services.note_manifest import note_manifest
         try:
-            from app.services.search_service import search_service
-            search_service.rebuild_index(self.watch_path)
-            from app.services.cache_service import cache_service
-            cache_service.clear()
-            logging.info(f"文件变更处理完成: {file_path}")
+            note_manifest.reload()
         except Exception as e:
-            logging.error(f"处理文件变更时出错: {e}")
+            logging.warning(f"重新读取笔记清单失败: {e}")
+        processed = 0
+        for file_path in sorted(file_paths):
+            try:
+                if note_manifest.is_current(file_path, self.watch_path):
+                    continue
+                invalidate_note(file_path, self.watch_path)
+                processed += 1
+            except Exception as e:
+                logging.error(f"处理文件变更时出错 {file_path}: {e}")
+        logging.info(f"文件变更处理完成: {processed}/{len(file_paths)} 个文件需要更新")
 
 class FileWatcher:
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(FileWatcher, cls).__new__(cls)
@@ -47,40 +113,52 @@ class FileWatcher:
             self.observer = None
         if not hasattr(self, 'watch_paths'):
             self.watch_paths = set()
-    
+        if not hasattr(self, 'handlers'):
+            self.handlers = []
+
     def start(self, path='static'):
-        """启动文件监控"""
+        """启动文件监控
+
+        笔记都位于监控目录的第一层，子目录（notes/*/assets 等）只有资源文件，
+        因此不递归监控，避免为资源子树注册大量 inotify watch。
+        """
         if self.observer is not None:
             return
-            
+
         if not os.path.exists(path):
             os.makedirs(path)
-            
+
         self.observer = Observer()
         event_handler = NoteChangeHandler(watch_path=path)
-        self.observer.schedule(event_handler, path, recursive=True)
+        self.observer.schedule(event_handler, path, recursive=False)
         self.observer.start()
+        self.handlers.append(event_handler)
         self.watch_paths.add(path)
-        
+
         logging.info(f"文件监控已启动: {path}")
-        
+
     def stop(self):
-        """停止文件监控"""
+        """停止文件监控，并处理尚在静默窗口内的变更"""
         if self.observer is not None:
             self.observer.stop()
             self.observer.join()
             self.observer = None
+            for handler in self.handlers:
+                handler.flush()
+            self.handlers = []
+            self.watch_paths = set()
             logging.info("文件监控已停止")
-            
-    def add_watch_path(self, path):
+
+    def add_watch_path(self, path, recursive=False):
         """添加监控路径"""
         if not os.path.exists(path):
             os.makedirs(path)
-            
+
         if path not in self.watch_paths and self.observer is not None:
             event_handler = NoteChangeHandler(watch_path=path)
-            self.observer.schedule(event_handler, path, recursive=True)
+            self.observer.schedule(event_handler, path, recursive=recursive)
+            self.handlers.append(event_handler)
             self.watch_paths.add(path)
             logging.info(f"添加监控路径: {path}")
 
-file_watcher = FileWatcher()
\ No newline at end of file
+file_watcher = FileWatcher()
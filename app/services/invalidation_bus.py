@@ -0,0 +1,196 @@
+"""
+跨工作进程的失效通知总线
+
+gunicorn 以 preload_app 启动时，文件监控只运行在主进程中，而每个工作进程各自持有
+缓存与搜索索引。某个进程修改笔记后向总线发布失效事件，其余进程在每个请求开始时
+检查总线并只丢弃受影响的缓存键和索引条目。
+
+总线是数据目录下一个以 mmap 共享映射的定长文件::
+
+    header  魔数、版本、槽位数、槽位大小、当前代数（已发布的事件总数）
+    slots   环形事件槽，第 n 个事件写入 n % capacity 号槽位
+
+发布方在文件锁内写入事件后再递增代数；读取方先比较代数（一次内存读取），
+有新事件时才逐个读取槽位。落后超过一整圈时事件已被覆盖，退化为全量失效。
+"""
+import os
+import mmap
+import fcntl
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+from app.config.config_manager import config
+
+MAGIC = b'SNSBUS\x00\x00'
+VERSION = 1
+
+# magic, version, capacity, slot_size, (保留), generation
+_HEADER = struct.Struct('<8sIIIIQ')
+_HEADER_SIZE = 64
+_GENERATION_OFFSET = 24
+# seq, 发布进程 pid, 负载字节数, 事件类型（定长 ASCII）
+_SLOT = struct.Struct('<QIH16s')
+SLOT_SIZE = 512
+MAX_PAYLOAD = SLOT_SIZE - _SLOT.size
+
+
+class InvalidationBus:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(InvalidationBus, cls).__new__(cls)
+            cls._instance._enabled = config.get('invalidation.enabled', True)
+            cls._instance._capacity = config.get('invalidation.capacity', 1024)
+            cls._instance._file_path = os.path.join(config.get('storage.data_dir', 'data'), 'invalidation.bus')
+            cls._instance._mm = None
+            cls._instance._seen = 0
+            cls._instance._lock = threading.Lock()
+            cls._instance._handlers = {}          # 事件类型 -> 处理函数
+            cls._instance._resync_handlers = []   # 事件丢失时的全量失效处理函数
+            # fork 时其他线程可能正持有锁，子进程中重新创建
+            os.register_at_fork(after_in_child=cls._instance._reset_lock)
+        return cls._instance
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def subscribe(self, kind: str, handler: Callable[..., None]) -> None:
+        """注册事件处理函数，参数为发布时的各个字符串字段"""
+        self._handlers[kind] = handler
+
+    def on_resync(self, handler: Callable[[], None]) -> None:
+        """注册全量失效处理函数（事件丢失时调用）"""
+        self._resync_handlers.append(handler)
+
+    def open(self) -> Optional[mmap.mmap]:
+        """映射总线文件，不存在或格式不符时重新初始化
+
+        应在 preload 的主进程中调用：fork 出的工作进程共享同一映射并继承读取位置，
+        不会漏掉 fork 之后、首个请求之前发布的事件。
+        """
+        with self._lock:
+            if self._mm is None and self._enabled:
+                self._map_file()
+        return self._mm
+
+    def _map_file(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self._file_path) or '.', exist_ok=True)
+            size = _HEADER_SIZE + self._capacity * SLOT_SIZE
+            with self._file_lock():
+                with open(self._file_path, 'a+b') as f:
+                    f.seek(0)
+                    header = f.read(_HEADER.size)
+                    if (len(header) < _HEADER.size
+                            or _HEADER.unpack(header)[:4] != (MAGIC, VERSION, self._capacity, SLOT_SIZE)):
+                        f.truncate(0)
+                        f.write(_HEADER.pack(MAGIC, VERSION, self._capacity, SLOT_SIZE, 0, 0))
+                    f.truncate(size)
+                    f.flush()
+                    mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_WRITE)
+            # 只关心打开之后发布的事件
+            self._seen = self._generation(mm)
+            self._mm = mm
+        except Exception as e:
+            logging.warning(f"失效通知总线不可用 {self._file_path}: {e}")
+            self._enabled = False
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程互斥：每次单独打开锁文件，避免 fork 后父子进程共享同一个 flock"""
+        with open(self._file_path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _generation(mm: mmap.mmap) -> int:
+        return struct.unpack_from('<Q', mm, _GENERATION_OFFSET)[0]
+
+    def publish(self, kind: str, *fields: str) -> None:
+        """发布一条失效事件；本进程应已自行完成对应的失效操作"""
+        mm = self.open()
+        if mm is None:
+            return
+        payload = '\0'.join(fields).encode('utf-8')
+        if len(payload) > MAX_PAYLOAD:
+            # 负载过长时以全量失效代替
+            kind, payload = 'resync', b''
+        try:
+            with self._lock, self._file_lock():
+                seq = self._generation(mm) + 1
+                offset = _HEADER_SIZE + (seq % self._capacity) * SLOT_SIZE
+                _SLOT.pack_into(mm, offset, seq, os.getpid(), len(payload), kind.encode('ascii'))
+                mm[offset + _SLOT.size:offset + _SLOT.size + len(payload)] = payload
+                struct.pack_into('<Q', mm, _GENERATION_OFFSET, seq)
+        except Exception as e:
+            logging.error(f"发布失效事件失败 {kind}: {e}")
+
+    def poll(self) -> int:
+        """处理其他进程发布的新事件，返回处理的事件数
+
+        每个请求调用一次：没有新事件时只读取一次共享内存中的代数。
+        """
+        mm = self._mm if self._mm is not None else self.open()
+        if mm is None or self._generation(mm) == self._seen:
+            return 0
+        with self._lock:
+            generation = self._generation(mm)
+            events, complete = self._read_events(mm, self._seen, generation)
+            self._seen = generation
+        if not complete:
+            logging.warning("失效事件已被覆盖，执行全量失效")
+            self._resync()
+            return 0
+        pid = os.getpid()
+        for sender, kind, fields in events:
+            if sender != pid:
+                self._dispatch(kind, fields)
+        return len(events)
+
+    def _read_events(self, mm: mmap.mmap, seen: int, generation: int) -> Tuple[List[Tuple[int, str, List[str]]], bool]:
+        """读取 (seen, generation] 区间内的事件，返回 (事件列表, 是否完整)"""
+        if generation < seen or generation - seen > self._capacity:
+            return [], False
+        events = []
+        for seq in range(seen + 1, generation + 1):
+            offset = _HEADER_SIZE + (seq % self._capacity) * SLOT_SIZE
+            slot_seq, sender, length, kind = _SLOT.unpack_from(mm, offset)
+            payload = mm[offset + _SLOT.size:offset + _SLOT.size + min(length, MAX_PAYLOAD)]
+            # 读取前后序号一致才说明槽位没有被更新的事件覆盖
+            if slot_seq != seq or _SLOT.unpack_from(mm, offset)[0] != seq:
+                return [], False
+            try:
+                payload = payload.decode('utf-8')
+            except UnicodeDecodeError:
+                return [], False
+            events.append((sender, kind.rstrip(b'\0').decode('ascii'), payload.split('\0') if payload else []))
+        return events, True
+
+    def _dispatch(self, kind: str, fields: List[str]) -> None:
+        if kind == 'resync':
+            self._resync()
+            return
+        handler = self._handlers.get(kind)
+        if handler is None:
+            logging.warning(f"未知的失效事件类型: {kind}")
+            return
+        try:
+            handler(*fields)
+        except Exception as e:
+            logging.error(f"处理失效事件出错 {kind}{fields}: {e}")
+
+    def _resync(self) -> None:
+        for handler in self._resync_handlers:
+            try:
+                handler()
+            except Exception as e:
+                logging.error(f"全量失效出错: {e}")
+
+
+invalidation_bus = InvalidationBus()
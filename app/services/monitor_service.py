@@ -1,7 +1,10 @@
 import os
 import time
 from typing import Dict, Any
-from app.services.cache_service import cache
+from app.services.cache_service import cache, cache_service
+from app.services.search_service import search_service
+from app.services.page_cache import page_cache
+from app.services.asset_store import asset_store
 
 
 class MonitorService:
@@ -57,9 +60,22 @@ class MonitorService:
             pass
         return 0.0
 
-    @cache(ttl=60)
     def get_system_stats(self) -> Dict[str, Any]:
-        """获取系统状态信息"""
+        """获取系统状态信息；主机指标缓存一分钟，缓存、搜索与资源存储统计每次实时读取
+
+        主机指标过期后五分钟内先返回旧值并在后台刷新，请求不等待 CPU 采样。
+        """
+        return {
+            **self._get_host_stats(),
+            'search_cache': search_service.cache_stats(),
+            'cache': cache_service.stats(),
+            'page_cache': page_cache.stats(),
+            'asset_store': asset_store.stats(),
+        }
+
+    @cache(ttl=60, single_flight=True, stale_ttl=300)
+    def _get_host_stats(self) -> Dict[str, Any]:
+        """主机与进程资源使用情况"""
         mem = self._read_meminfo()
         root = os.path.splitdrive(os.path.abspath(os.getcwd()))[1] or '/'
         vfs = os.statvfs(root)
@@ -85,9 +101,12 @@ class MonitorService:
             },
         }
 
-    @cache(ttl=300)
+    @cache(ttl=300, single_flight=True, stale_ttl=3600)
     def get_storage_stats(self, directory: str = 'static') -> Dict[str, Any]:
-        """获取存储统计信息"""
+        """获取存储统计信息
+
+        需要遍历整个目录，过期后一小时内先返回旧值并在后台重新统计。
+        """
         stats = {'total_notes': 0, 'total_size': 0, 'by_type': {}}
         for root, _, files in os.walk(directory):
             for file in files:
@@ -0,0 +1,354 @@
+"""
+笔记元数据清单
+
+记录每篇笔记的 slug、标题、文件夹路径、修改时间、大小与内容哈希，持久化到
+数据目录下的 notes.json。发布、删除笔记（以及文件监控检测到变更）时只读取变更的
+那一个文件并更新清单；文档树直接由清单生成，不再逐个打开笔记查找 <title>。
+
+清单每次变化版本号加一，序列化后的文档树 JSON 缓存到版本变化为止。清单同时保留最近
+的变更记录，客户端可以只获取某个版本之后新增（含标题变化）与删除的笔记。
+版本标识为 "<epoch>-<version>"，epoch 在清单文件重新生成时改变，旧标识随之失效。
+
+笔记很多时客户端逐层加载文档树：文件夹索引（文件夹 -> 排好序的直接子项）同样
+按版本缓存，每次只返回一个文件夹的一页子项。
+多个工作进程共享同一个清单文件：写入在文件锁内先重新读取再修改，
+完成后通过失效通知总线通知其他进程重新加载。
+"""
+import os
+import re
+import json
+import uuid
+import base64
+import bisect
+import fcntl
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from app.config.config_manager import config
+from app.services.invalidation_bus import invalidation_bus
+
+_TITLE = re.compile(r'<title>(.*?)</title>')
+
+
+class NoteManifest:
+    _instance = None
+
+    # 保留的变更记录条数，更早的版本只能全量获取
+    MAX_CHANGES = 1000
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(NoteManifest, cls).__new__(cls)
+            cls._instance._file_path = os.path.join(config.get('storage.data_dir', 'data'), 'notes.json')
+            cls._instance._notes = {}          # slug -> 元数据
+            cls._instance._version = 0
+            cls._instance._epoch = ''
+            cls._instance._changes = []        # [版本, slug, 变更前标题, 变更后标题]，标题为 None 表示不存在
+            cls._instance._path = None         # 已加载的笔记目录
+            cls._instance._tree_json = None    # (版本, 文档树 JSON)
+            cls._instance._folder_index = None # (版本, {文件夹: (排序键列表, 子项列表)})
+            cls._instance._lock = threading.Lock()
+            # fork 时其他线程（如文件监控）可能正持有锁，子进程中重新创建
+            os.register_at_fork(after_in_child=cls._instance._reset_lock)
+        return cls._instance
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def token(self) -> str:
+        """当前版本标识，用作文档树的 ETag 与增量查询的起点"""
+        return f'{self._epoch}-{self._version}'
+
+    @staticmethod
+    def _read_entry(slug: str, file_path: str) -> Optional[Dict[str, Any]]:
+        """读取单篇笔记的元数据，文件不存在时返回 None"""
+        try:
+            with open(file_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        text = content.decode('utf-8', errors='replace')
+        title_match = _TITLE.search(text)
+        title = title_match.group(1) if title_match else slug
+        parts = title.split('/')
+        return {
+            'slug': slug,
+            'title': title,
+            'folder': '/'.join(parts[:-1]),
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'hash': hashlib.sha256(content).hexdigest()[:16],
+        }
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程互斥：每次单独打开锁文件，避免 fork 后父子进程共享同一个 flock"""
+        os.makedirs(os.path.dirname(self._file_path) or '.', exist_ok=True)
+        with open(self._file_path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_file(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('path') != self._path or 'epoch' not in data:
+                return None
+            return data
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"笔记清单损坏，将重新生成 {self._file_path}: {e}")
+            return None
+
+    def _write_file(self, data: Dict[str, Any]) -> None:
+        tmp_path = f'{self._file_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self._file_path)
+
+    def _new_data(self) -> Dict[str, Any]:
+        return {'path': self._path, 'epoch': uuid.uuid4().hex[:8], 'version': 0, 'notes': {}, 'changes': []}
+
+    def _record(self, data: Dict[str, Any], slug: str, entry: Optional[Dict[str, Any]]) -> bool:
+        """把单篇笔记的新状态写入 data 并记录变更，没有变化时返回 False"""
+        old = data['notes'].get(slug)
+        if old == entry:
+            return False
+        if entry is None:
+            del data['notes'][slug]
+        else:
+            data['notes'][slug] = entry
+        data['version'] += 1
+        data['changes'].append([data['version'], slug,
+                                old['title'] if old else None, entry['title'] if entry else None])
+        del data['changes'][:-self.MAX_CHANGES]
+        return True
+
+    def _apply(self, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._notes = data['notes']
+            self._version = data['version']
+            self._epoch = data['epoch']
+            self._changes = data['changes']
+
+    def load(self, path: str = 'static') -> None:
+        """加载清单并与笔记目录对账：只重新读取新增或修改时间、大小变化的笔记
+
+        在 gunicorn 主进程中调用（preload_app），工作进程 fork 后直接继承。
+        """
+        self._path = path
+        with self._file_lock():
+            data = self._read_file()
+            created = data is None
+            if created:
+                data = self._new_data()
+            seen = set()
+            changed = False
+            try:
+                dir_entries = list(os.scandir(path))
+            except FileNotFoundError:
+                dir_entries = []
+            for dir_entry in dir_entries:
+                if not dir_entry.name.endswith('.html') or not dir_entry.is_file():
+                    continue
+                slug = dir_entry.name[:-len('.html')]
+                seen.add(slug)
+                st = dir_entry.stat()
+                old = data['notes'].get(slug)
+                if old is not None and old['mtime_ns'] == st.st_mtime_ns and old['size'] == st.st_size:
+                    continue
+                changed |= self._record(data, slug, self._read_entry(slug, dir_entry.path))
+            for slug in [slug for slug in data['notes'] if slug not in seen]:
+                changed |= self._record(data, slug, None)
+            if changed or created:
+                self._write_file(data)
+        self._apply(data)
+        logging.info(f"笔记清单已加载: {len(data['notes'])} 篇笔记")
+
+    def reload(self) -> None:
+        """重新读取其他进程写入的清单文件"""
+        if self._path is None:
+            return
+        data = self._read_file()
+        if data is None:
+            self.load(self._path)
+        elif (data['epoch'], data['version']) != (self._epoch, self._version):
+            self._apply(data)
+
+    def _ensure_loaded(self, path: str) -> None:
+        if self._path != path:
+            self.load(path)
+
+    def update(self, file_path: str, path: str = 'static') -> None:
+        """按文件当前状态更新单篇笔记（文件不存在时删除），持久化并通知其他工作进程"""
+        self._ensure_loaded(path)
+        slug = os.path.splitext(os.path.relpath(file_path, path))[0].replace('\\', '/')
+        entry = self._read_entry(slug, file_path)
+        with self._file_lock():
+            # 以磁盘上的最新清单为准，避免覆盖其他进程的更新
+            data = self._read_file()
+            if data is None:
+                data = self._new_data()
+                data['notes'] = dict(self._notes)
+            if not self._record(data, slug, entry):
+                return
+            self._write_file(data)
+        self._apply(data)
+        invalidation_bus.publish('note_manifest')
+
+    def is_current(self, file_path: str, path: str = 'static') -> bool:
+        """清单中的记录是否已与文件当前状态一致（修改时间与大小相同，或文件与记录都不存在）"""
+        self._ensure_loaded(path)
+        slug = os.path.splitext(os.path.relpath(file_path, path))[0].replace('\\', '/')
+        entry = self._notes.get(slug)
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            return entry is None
+        return entry is not None and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size
+
+    def notes(self, path: str = 'static') -> List[Dict[str, Any]]:
+        """全部笔记元数据，按标题排序"""
+        self._ensure_loaded(path)
+        return sorted(self._notes.values(), key=lambda note: note['title'])
+
+    def tree_json(self, path: str = 'static') -> Tuple[str, bytes]:
+        """返回 (版本标识, 序列化后的文档树)，缓存到清单版本变化为止"""
+        self._ensure_loaded(path)
+        with self._lock:
+            token, notes = self.token, list(self._notes.values())
+        cached = self._tree_json
+        if cached is not None and cached[0] == token:
+            return cached
+        from app.services.note_service import organize_notes_by_folder
+        tree = organize_notes_by_folder([
+            {'title': note['title'], 'url': f"/{note['slug']}", 'isFolder': False}
+            for note in sorted(notes, key=lambda note: note['title'])
+        ])
+        self._tree_json = (token, json.dumps(tree, ensure_ascii=False).encode('utf-8'))
+        return self._tree_json
+
+    def delta(self, since: str, path: str = 'static') -> Dict[str, Any]:
+        """返回版本 since 之后的变更：新增与删除的笔记
+
+        slug 由标题生成，重命名即删除旧 slug、新增新 slug；slug 不变而标题变化的笔记
+        （如 index）同样列在 added 中，客户端按 slug 覆盖。
+
+        since 无效、来自重新生成前的清单或早于保留的变更记录时，返回 reset 与全部笔记。
+        """
+        self._ensure_loaded(path)
+        with self._lock:
+            epoch, version, changes = self._epoch, self._version, list(self._changes)
+            notes = {slug: note['title'] for slug, note in self._notes.items()}
+        token = f'{epoch}-{version}'
+        since_epoch, _, since_version = (since or '').partition('-')
+        oldest = changes[0][0] - 1 if changes else version
+        if since_epoch != epoch or not since_version.isdigit() or not oldest <= int(since_version) <= version:
+            return {
+                'version': token,
+                'reset': True,
+                'notes': [{'slug': slug, 'title': title} for slug, title in notes.items()],
+            }
+
+        # 同一篇笔记的多次变更合并为首次变更前与当前的状态
+        net = {}
+        for change_version, slug, before, after in changes:
+            if change_version > int(since_version):
+                net[slug] = (net[slug][0] if slug in net else before, after)
+        added, removed = [], []
+        for slug, (before, after) in net.items():
+            if after is None:
+                if before is not None:
+                    removed.append(slug)
+            elif before != after:
+                added.append({'slug': slug, 'title': after})
+        return {'version': token, 'added': added, 'removed': removed}
+
+
+    def _get_folder_index(self, path: str) -> Tuple[str, Dict[str, Tuple[List[tuple], List[Dict[str, Any]]]]]:
+        """返回 (版本标识, 文件夹索引)，子项按先文件夹后笔记、再按标题排序"""
+        self._ensure_loaded(path)
+        with self._lock:
+            token, notes = self.token, list(self._notes.values())
+        cached = self._folder_index
+        if cached is not None and cached[0] == token:
+            return cached
+
+        children = {'': {}}
+        for note in notes:
+            parts = note['title'].split('/')
+            parent = ''
+            for i, part in enumerate(parts[:-1]):
+                folder = '/'.join(parts[:i + 1])
+                if folder not in children:
+                    children[folder] = {}
+                    children[parent][(0, part, folder)] = {'title': part, 'isFolder': True, 'path': folder}
+                parent = folder
+            children[parent][(1, parts[-1], note['slug'])] = {
+                'title': parts[-1], 'url': f"/{note['slug']}", 'isFolder': False
+            }
+
+        index = {}
+        for folder, items in children.items():
+            keys = sorted(items)
+            index[folder] = (keys, [items[key] for key in keys])
+        for keys, items in index.values():
+            for item in items:
+                if item['isFolder']:
+                    item['count'] = len(index[item['path']][0])
+        self._folder_index = (token, index)
+        return self._folder_index
+
+    @staticmethod
+    def _encode_cursor(key: tuple) -> str:
+        return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        """解析分页游标，格式错误时抛出 ValueError"""
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, UnicodeError) as e:
+            raise ValueError(f'Invalid cursor: {cursor}') from e
+        if (not isinstance(key, list) or len(key) != 3 or not isinstance(key[0], int)
+                or not isinstance(key[1], str) or not isinstance(key[2], str)):
+            raise ValueError(f'Invalid cursor: {cursor}')
+        return tuple(key)
+
+    def folder_page(self, folder: str = '', cursor: Optional[str] = None, limit: int = 200,
+                    path: str = 'static') -> Optional[Dict[str, Any]]:
+        """返回文件夹的一页直接子项，文件夹不存在时返回 None
+
+        游标为上一页最后一项的排序键，笔记增删后继续翻页也不会重复或遗漏未变化的子项。
+        """
+        token, index = self._get_folder_index(path)
+        if folder not in index:
+            return None
+        keys, items = index[folder]
+        start = bisect.bisect_right(keys, self._decode_cursor(cursor)) if cursor else 0
+        end = start + limit
+        return {
+            'version': token,
+            'path': folder,
+            'total': len(keys),
+            'items': items[start:end],
+            'next_cursor': self._encode_cursor(keys[end - 1]) if end < len(keys) else None,
+        }
+
+note_manifest = NoteManifest()
+
+# 其他工作进程更新清单后重新加载；事件丢失时同样重新加载
+invalidation_bus.subscribe('note_manifest', note_manifest.reload)
+invalidation_bus.on_resync(note_manifest.reload)
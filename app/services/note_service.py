@@ -4,9 +4,17 @@ import hashlib
 import os
 import shutil
 import logging
+from typing import Any, Dict, List, Optional, Tuple
 from pypinyin import lazy_pinyin, Style
 from app.config.config_manager import config
-from app.services.cache_service import cache, cache_service
+from app.services.cache_service import cache
+from app.services.search_service import search_service
+from app.services.invalidation_bus import invalidation_bus
+from app.services.page_cache import page_cache
+from app.services.compression_service import compression_service
+from app.services.file_manifest import file_manifest
+from app.services.note_manifest import note_manifest
+from app.services.asset_store import asset_store
 
 @cache(ttl=3600)
 def slugify(value: str) -> str:
@@ -39,66 +47,75 @@ def gen_short_code(title):
     digest = hash_object.hexdigest()
     return digest[:6]
 
-@cache(ttl=300)  # 缓存5分钟
+# 模板占位符：TEMPLATE_ 后接大写单词
+_PLACEHOLDER_RE = re.compile(r'(TEMPLATE_[A-Z]+(?:_[A-Z]+)*)')
+
+# (模板路径, 修改时间, 站点名称, 片段列表)，模板文件或站点名称变化时重新解析
+_compiled_template = None
+
+NOTE_BODY_CLASS = 'class="mod-linux is-frameless is-hidden-frameless obsidian-app theme-light show-inline-title show-ribbon show-view-header is-focused share-note-plugin" style="--zoom-factor: 1; --font-text-size: 16px;"'
+NOTE_PREVIEW_CLASS = 'class="markdown-preview-view markdown-rendered node-insert-event allow-fold-headings show-indentation-guide allow-fold-lists show-properties" style="tab-size: 4;"'
+NOTE_PUSHER_CLASS = 'class="markdown-preview-pusher" style="width: 1px; height: 0.1px;"'
+# 保持宽度设置与原版一致
+NOTE_WIDTH_STYLE = '.markdown-preview-sizer.markdown-preview-section { max-width: 1080px !important; margin: 0 auto; }'
+
+def compile_template(template_path: str, server_name: str) -> List[str]:
+    """解析笔记模板，返回交替排列的片段列表：偶数位为原文，奇数位为占位符名称
+
+    模板按修改时间缓存，只在模板文件或站点名称变化时重新读取解析；
+    站点名称只替换模板原文中的 "Share Note"，不会改动笔记正文。
+    """
+    global _compiled_template
+    mtime_ns = os.stat(template_path).st_mtime_ns
+    compiled = _compiled_template
+    if compiled is not None and compiled[:3] == (template_path, mtime_ns, server_name):
+        return compiled[3]
+
+    with open(template_path, 'r', encoding='utf-8') as f:
+        parts = _PLACEHOLDER_RE.split(f.read())
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace('Share Note', server_name)
+    _compiled_template = (template_path, mtime_ns, server_name, parts)
+    return parts
+
 def cook_note(data):
-    """处理笔记模板,保持与原版一致性"""
+    """处理笔记模板,保持与原版一致性
+
+    模板预先解析为片段，各占位符的值一次性拼接，正文只复制一次，
+    正文中出现的 TEMPLATE_* 或 "Share Note" 文本保持原样。
+    """
     template = data['template']
     
-    # 读取模板文件
     template_path = config.get('templates.note_template', 'template/note-template.html')
-    with open(template_path, 'r', encoding='utf-8') as f:
-        html = f.read()
-    
     # 获取站点名称，默认为 "Share Note"
     server_name = config.get('server.server_name', 'Share Note')
+    parts = compile_template(template_path, server_name)
     
     # 设置页面标题，不再添加站点名称
     page_title = template['title'] if template['title'] else "Untitled"
-    # 替换模板变量
-    html = html.replace('TEMPLATE_TITLE', page_title)
-    html = html.replace(
-        'TEMPLATE_OG_TITLE',
-        f'<meta property="og:title" content="{page_title}">'
-    )
-    
-    # 替换其他模板变量
-    html = html.replace(
-        'TEMPLATE_META_DESCRIPTION',
-        f'<meta name="description" content="{template.get("description", "")}" property="og:description">'
-    )
-    
-    html = html.replace(   # 保持宽度设置与原版一致
-        'TEMPLATE_WIDTH',
-        '.markdown-preview-sizer.markdown-preview-section { max-width: 1080px !important; margin: 0 auto; }'
-    )
-    
-    # 添加CSS路径
     theme_css_path = '/static/theme.css' if os.path.isfile('static/theme.css') else '/assets/css/theme.css'
-    html = html.replace('TEMPLATE_CSS', theme_css_path)
-    
-    # 添加服务器URL
-    html = html.replace('TEMPLATE_ASSETS_WEBROOT', config.get('server.server_url'))
-    
-    # 替换服务器名称
-    html = html.replace('TEMPLATE_SERVER_NAME', server_name)
+    values = {
+        'TEMPLATE_TITLE': page_title,
+        'TEMPLATE_OG_TITLE': f'<meta property="og:title" content="{page_title}">',
+        'TEMPLATE_META_DESCRIPTION': f'<meta name="description" content="{template.get("description", "")}" property="og:description">',
+        'TEMPLATE_WIDTH': NOTE_WIDTH_STYLE,
+        'TEMPLATE_CSS': theme_css_path,
+        'TEMPLATE_ASSETS_WEBROOT': config.get('server.server_url'),
+        'TEMPLATE_SERVER_NAME': server_name,
+        'TEMPLATE_NOTE_CONTENT': template['content'],
+        'TEMPLATE_BODY': NOTE_BODY_CLASS,
+        'TEMPLATE_PREVIEW': NOTE_PREVIEW_CLASS,
+        'TEMPLATE_PUSHER': NOTE_PUSHER_CLASS,
+        # 清空其他未使用的模板变量
+        'TEMPLATE_SCRIPTS': '',
+        'TEMPLATE_ENCRYPTED_DATA': '',
+    }
     
-    # 替换正文内容
-    html = html.replace('TEMPLATE_NOTE_CONTENT', template['content'])
-    
-    # 替换默认类名
-    html = html.replace('TEMPLATE_BODY', 'class="mod-linux is-frameless is-hidden-frameless obsidian-app theme-light show-inline-title show-ribbon show-view-header is-focused share-note-plugin" style="--zoom-factor: 1; --font-text-size: 16px;"')
-    html = html.replace('TEMPLATE_PREVIEW', 'class="markdown-preview-view markdown-rendered node-insert-event allow-fold-headings show-indentation-guide allow-fold-lists show-properties" style="tab-size: 4;"')
-    html = html.replace('TEMPLATE_PUSHER', 'class="markdown-preview-pusher" style="width: 1px; height: 0.1px;"')
-    
-    # 替换网站标题
-    html = html.replace('Share Note', server_name)
-    
-    # 将标题也放在面包屑导航中
-    html = html.replace('TEMPLATE_TITLE</span>', page_title + '</span>')
-    
-    # 清空其他未使用的模板变量
-    html = html.replace('TEMPLATE_SCRIPTS', '')
-    html = html.replace('TEMPLATE_ENCRYPTED_DATA', '')
+    # 未知的占位符保持原样
+    pieces = parts[:]
+    for i in range(1, len(pieces), 2):
+        pieces[i] = values.get(pieces[i], pieces[i])
+    html = ''.join(pieces)
     
     # 生成文件名
     filename = slugify(template['title']) if template['title'] else 'untitled-' + gen_short_code('untitled')
@@ -129,10 +146,9 @@ def handle_note_assets(data, filename: str):
     assets_path = os.path.join('static', 'notes', filename, 'assets')
     os.makedirs(assets_path, exist_ok=True)
     
-    # 如果是更新文档，先检查是否存在原有内容
-    note_file = os.path.join('static', f'{filename}.html')
-    update_mode = os.path.exists(note_file)
-    
+    # 本次发布引用的资源文件名
+    note_assets = set()
+
     # 处理文件上传的资源
     if 'files' in data:
         for file in data['files']:
@@ -145,27 +161,22 @@ def handle_note_assets(data, filename: str):
             # 目标路径：笔记专属资源目录
             target_path = os.path.join(assets_path, safe_name)
 
-            if not os.path.exists(target_path):
-                # 1. 优先检查根 static 目录（无 note_id 的上传落在此处）
-                moved_from = None
+            linked = os.path.exists(target_path)
+            if not linked:
+                # 根 static 目录中的上传（无 note_id）并入资源存储，再链接到笔记目录
                 temp_path = os.path.join('static', f"{file_hash}.{file_type}")
-                if os.path.exists(temp_path):
-                    moved_from = temp_path
-                else:
-                    # 2. 搜索其他笔记目录（有 note_id 头的上传可能落在不同子目录）
-                    import glob as _glob
-                    found = _glob.glob(f'static/notes/*/assets/{file_hash}.*')
-                    if found:
-                        moved_from = found[0]
-
-                if moved_from:
-                    try:
-                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                        shutil.move(moved_from, target_path)
-                        logging.info(f"Moved asset from {moved_from} to {target_path}")
-                    except Exception as e:
-                        logging.error(f"Error moving asset {moved_from}: {e}")
-                        continue
+                try:
+                    if asset_store.lookup(file_hash) is None and os.path.exists(temp_path):
+                        asset_store.ingest(file_hash, temp_path)
+                    linked = asset_store.link(file_hash, target_path)
+                    if linked:
+                        logging.info(f"Linked asset {file_hash} to {target_path}")
+                except (OSError, ValueError) as e:
+                    logging.error(f"Error linking asset {file_hash}: {e}")
+                    continue
+            # 只记录实际存在于笔记目录中的资源（存储中没有该对象时不会建立链接）
+            if linked and asset_store.is_hash(file_hash):
+                note_assets.add(safe_name)
 
             # 更新文件 URL（使用绝对路径）
             file['url'] = f"/notes/{filename}/assets/{safe_name}"
@@ -188,53 +199,6 @@ def handle_note_assets(data, filename: str):
                     if old_path and old_path != new_path:
                         data['template']['content'] = data['template']['content'].replace(old_path, new_path)
 
-    # 清理旧资源
-    if update_mode and os.path.exists(note_file):
-        try:
-            with open(note_file, 'r', encoding='utf-8') as f:
-                old_content = f.read()
-                # 从旧文档中提取图片资源路径（支持相对路径和绝对路径）
-                old_assets = set()
-                for line in old_content.split('\n'):
-                    # 匹配绝对路径 src="/notes/{filename}/assets/
-                    if f'src="/notes/{filename}/assets/' in line:
-                        start = line.find('src="') + 5
-                        end = line.find('"', start)
-                        if start > 4 and end > start:
-                            old_assets.add(line[start:end])
-                    # 匹配旧的相对路径 src="notes/{filename}/assets/
-                    elif f'src="notes/{filename}/assets/' in line:
-                        start = line.find('src="') + 5
-                        end = line.find('"', start)
-                        if start > 4 and end > start:
-                            old_assets.add(line[start:end])
-                    # 兼容更旧的绝对路径格式 src="/static/notes/
-                    elif 'src="/static/notes/' in line:
-                        start = line.find('src="') + 5
-                        end = line.find('"', start)
-                        if start > 4 and end > start:
-                            old_assets.add(line[start:end])
-                
-                # 如果旧资源在新内容中不存在，则进行清理
-                new_content = data['template']['content']
-                for old_asset in old_assets:
-                    if old_asset not in new_content:
-                        # 处理相对路径和绝对路径
-                        if old_asset.startswith('/'):
-                            asset_path = os.path.join('static', old_asset.lstrip('/'))
-                        else:
-                            # 相对路径，相对于 static/ 目录
-                            asset_path = os.path.join('static', old_asset)
-
-                        if os.path.exists(asset_path):
-                            try:
-                                os.remove(asset_path)
-                                logging.info(f"Removed unused asset: {asset_path}")
-                            except Exception as e:
-                                logging.error(f"Error removing old asset {asset_path}: {e}")
-        except Exception as e:
-            logging.error(f"处理旧文档资源时出错: {e}")
-
     # 迁移散落在根目录的资源文件
     try:
         for f in os.listdir('static'):
@@ -247,13 +211,13 @@ def handle_note_assets(data, filename: str):
                 
                 # 尝试从文件名中提取哈希值（兼容 SHA-1/SHA-256/MD5 等各种长度）
                 name_without_ext = os.path.splitext(f)[0]
-                if re.match(r'^[a-f0-9]{8,}$', name_without_ext):
+                if asset_store.is_hash(name_without_ext):
                     target_path = os.path.join(assets_path, f)
                     try:
-                        # 确保目标目录存在
-                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                        # 移动文件到笔记目录
-                        shutil.move(file_path, target_path)
+                        # 并入资源存储并链接到笔记目录
+                        asset_store.ingest(name_without_ext, file_path)
+                        if asset_store.link(name_without_ext, target_path):
+                            note_assets.add(f)
                         logging.info(f"Migrated file from {file_path} to {target_path}")
                         # 更新文档中的引用（使用绝对路径）
                         if 'content' in data['template']:
@@ -264,9 +228,20 @@ def handle_note_assets(data, filename: str):
                         logging.error(f"Error migrating file {file_path}: {e}")
     except Exception as e:
         logging.error(f"迁移资源文件时出错: {e}")
-    
-    # 清除相关缓存
-    cache_service.delete(f"note_assets:{filename}")
+
+    # 本次发布的资源清单与上次发布的差集即为不再使用的资源，进入延迟删除队列；
+    # 只有待移除的资源才检查新内容中是否仍有引用（请求未列出但正文仍在使用的资源）
+    try:
+        content = data['template'].get('content', '')
+        note_assets |= {
+            name for name in asset_store.note_assets(filename) - note_assets
+            if f'/notes/{filename}/assets/{name}' in content
+        }
+        added, removed = asset_store.set_note_assets(filename, note_assets)
+        if added or removed:
+            logging.info(f"笔记 {filename} 资源变更: 新增 {len(added)} 个，待删除 {len(removed)} 个")
+    except Exception as e:
+        logging.error(f"更新笔记资源清单时出错: {e}")
     return data
 
 def delete_note_assets(filename: str):
@@ -278,10 +253,45 @@ def delete_note_assets(filename: str):
     assets_path = os.path.join('static', 'notes', filename)
     if os.path.exists(assets_path):
         shutil.rmtree(assets_path)
-    # 清除相关缓存
-    cache_service.delete(f"note_assets:{filename}")
+    # 清空资源清单，不再被其他笔记使用的资源对象进入延迟删除队列
+    asset_store.release(filename)
+
+def invalidate_note(file_path: str, path: str = 'static') -> None:
+    """笔记发布、修改或删除后：按文件当前状态更新搜索索引、笔记清单与文件清单（含笔记资源目录），
+    失效该笔记的页面缓存，并通知其他工作进程
+    """
+    slug = os.path.splitext(os.path.relpath(file_path, path))[0].replace('\\', '/')
+    search_service.update_document(file_path, path)
+    invalidation_bus.publish('note', file_path, path)
+    note_manifest.update(file_path, path)
+
+    page_cache.invalidate(slug, broadcast=True)
+    file_manifest.refresh(file_path, broadcast=True)
+    file_manifest.refresh(os.path.join(path, 'notes', slug), broadcast=True)
+
+    # 后台生成预压缩版本，完成后再次刷新以带上压缩内容
+    def on_compressed():
+        file_manifest.refresh(file_path, broadcast=True)
+        page_cache.invalidate(slug, broadcast=True)
+
+    if os.path.exists(file_path):
+        compression_service.precompress_async(file_path, on_compressed)
+    else:
+        compression_service.remove_variants(file_path)
+
+def doc_tree_json(path: str = 'static') -> Tuple[str, bytes]:
+    """返回 (版本标识, 文档树 JSON)：由笔记清单生成，不读取笔记文件，清单变化前复用序列化结果"""
+    return note_manifest.tree_json(path)
+
+def doc_tree_delta(since: str, path: str = 'static') -> Dict[str, Any]:
+    """文档树在版本 since 之后的增量变更，见 NoteManifest.delta"""
+    return note_manifest.delta(since, path)
+
+def doc_tree_folder(folder: str = '', cursor: Optional[str] = None, limit: int = 200,
+                    path: str = 'static') -> Optional[Dict[str, Any]]:
+    """文档树中一个文件夹的一页直接子项（含子文件夹的子项数），见 NoteManifest.folder_page"""
+    return note_manifest.folder_page(folder, cursor, limit, path)
 
-@cache(ttl=300)
 def organize_notes_by_folder(notes):
     """将笔记按文件夹结构组织"""
     tree = []
@@ -0,0 +1,129 @@
+"""
+热门页面字节缓存
+
+笔记页面（static/<slug>.html）在发布之间不会变化，将页面内容以 bytes 常驻内存，
+并以内容哈希作为强 ETag：命中时不再检查、打开文件，If-None-Match 匹配时直接 304。
+发布时生成的预压缩版本（.br/.gz）一并缓存，按 Accept-Encoding 直接返回。
+
+缓存在内存预算内按访问频率保留页面：超出预算时淘汰访问次数最少的页面，
+同时把所有计数减半，使过去的热门页面逐渐让位给当前的热门页面。
+笔记重新发布或删除时由 invalidate_note 失效，并通过失效通知总线同步到其他工作进程。
+"""
+import os
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+from app.config.config_manager import config
+from app.services.compression_service import compression_service
+from app.services.invalidation_bus import invalidation_bus
+
+
+class PageCache:
+    _instance = None
+
+    # 每个页面的固定开销估算（字典、键、ETag 等）
+    ENTRY_OVERHEAD = 200
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PageCache, cls).__new__(cls)
+            cls._instance._pages = {}          # slug -> {body, etag, variants, size, hits}
+            cls._instance._bytes = 0
+            cls._instance._generation = 0      # 每次失效递增，丢弃失效前开始读取的页面
+            cls._instance._lock = threading.Lock()
+            cls._instance._hits = 0
+            cls._instance._misses = 0
+            cls._instance.max_bytes = config.get('cache.page_cache_mb', 32) * 1024 * 1024
+            # fork 时其他线程（如文件监控）可能正持有锁，子进程中重新创建
+            os.register_at_fork(after_in_child=cls._instance._reset_lock)
+        return cls._instance
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        """由页面内容计算强 ETag（不含引号）"""
+        return hashlib.sha256(body).hexdigest()[:32]
+
+    def get(self, slug: str) -> Optional[Tuple[bytes, str, Dict[str, bytes]]]:
+        """返回缓存的 (内容, ETag, {编码: 预压缩内容})，未缓存时返回 None"""
+        with self._lock:
+            page = self._pages.get(slug)
+            if page is None:
+                self._misses += 1
+                return None
+            page['hits'] += 1
+            self._hits += 1
+            return page['body'], page['etag'], page['variants']
+
+    def load(self, slug: str, file_path: str) -> Tuple[bytes, str, Dict[str, bytes]]:
+        """读取页面文件及其预压缩版本并放入缓存，返回值同 get；文件不存在时抛出 FileNotFoundError"""
+        with self._lock:
+            generation = self._generation
+        with open(file_path, 'rb') as f:
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            body = f.read()
+        etag = self.make_etag(body)
+        variants = compression_service.read_variants(file_path, mtime_ns)
+        size = self.ENTRY_OVERHEAD + len(slug) + len(body) + sum(len(v) for v in variants.values())
+        with self._lock:
+            # 读取期间页面被重新发布时不缓存旧内容
+            if generation == self._generation and size <= self.max_bytes:
+                old = self._pages.pop(slug, None)
+                if old is not None:
+                    self._bytes -= old['size']
+                self._pages[slug] = {'body': body, 'etag': etag, 'variants': variants, 'size': size, 'hits': 1}
+                self._bytes += size
+                self._evict_if_needed(slug)
+        return body, etag, variants
+
+    def _evict_if_needed(self, keep: str) -> None:
+        """超出预算时按访问次数从少到多淘汰（新加入的页面除外），并将计数减半（调用方需持有锁）"""
+        if self._bytes <= self.max_bytes:
+            return
+        candidates = sorted((page['hits'], slug) for slug, page in self._pages.items() if slug != keep)
+        for _, slug in candidates:
+            if self._bytes <= self.max_bytes:
+                break
+            self._bytes -= self._pages.pop(slug)['size']
+        for page in self._pages.values():
+            page['hits'] = (page['hits'] + 1) // 2
+
+    def invalidate(self, slug: str, broadcast: bool = False) -> None:
+        """失效单个页面；broadcast 为 True 时同时通知其他工作进程"""
+        with self._lock:
+            self._generation += 1
+            page = self._pages.pop(slug, None)
+            if page is not None:
+                self._bytes -= page['size']
+        if broadcast:
+            invalidation_bus.publish('page', slug)
+
+    def clear(self) -> None:
+        """清空页面缓存"""
+        with self._lock:
+            self._generation += 1
+            self._pages.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """页面缓存统计"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'pages': len(self._pages),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+page_cache = PageCache()
+
+# 应用其他工作进程发布的页面失效事件
+invalidation_bus.subscribe('page', page_cache.invalidate)
+invalidation_bus.on_resync(page_cache.clear)
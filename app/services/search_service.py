@@ -1,130 +1,833 @@
 import re
 import os
-from typing import List, Dict
-from bs4 import BeautifulSoup
+import math
+import fcntl
+import heapq
+import bisect
+import hashlib
+import threading
+import multiprocessing
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
 import logging
+from app.config.config_manager import config
+from app.utils.html_text import extract_note_file
+from app.services.search_snapshot import IndexSnapshot, IN_SNAPSHOT, write_snapshot
+from app.services.invalidation_bus import invalidation_bus
+
+_WORD = re.compile(r'\w+')
 
 
 class SearchService:
     _instance = None
 
+    # BM25 参数
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    # 标题字段权重：标题中出现一次相当于正文出现 TITLE_BOOST 次
+    TITLE_BOOST = 3
+
+    # 倒排表项打包为一个 32 位无符号整数：高 24 位为文档 ID，低 8 位为词频。
+    # 按打包值排序即按文档 ID 排序；BM25 对词频饱和，截断到 255 不影响排序。
+    TF_BITS = 8
+    TF_MASK = (1 << TF_BITS) - 1
+    KEY_MASK = 0xFFFFFFFF ^ TF_MASK
+    # 与倒排表逐项对齐的位置表记录词条在正文中首次出现的字符偏移；仅出现在标题中时为 NO_OFFSET
+    NO_OFFSET = 0xFFFFFFFF
+    # 文档 ID 占 24 位；文档表接近上限时无论已删除比例都压缩
+    MAX_DOCS = 1 << (32 - TF_BITS)
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(SearchService, cls).__new__(cls)
-            cls._instance._index = {}       # word -> [{title, url, text}]
+            cls._instance._index = {}       # word -> array('I')，按文档 ID 有序的打包倒排表
+            cls._instance._positions = {}   # word -> array('I')，与倒排表对齐的首次出现偏移
+            cls._instance._terms = []       # 有序词典，用于前缀二分查找
+            cls._instance._doc_table = []   # 文档 ID -> {title, url, text, length}，快照中为 IN_SNAPSHOT，已删除为 None
+            cls._instance._doc_ids = {}     # url -> 文档 ID
+            cls._instance._doc_lengths = array('I')
+            cls._instance._total_length = 0
             cls._instance._indexed = False
+            cls._instance._indexed_path = None
+            cls._instance._lock = threading.RLock()
+            # 索引每次变更时递增，查询缓存以此判断是否失效
+            cls._instance._generation = 0
+            cls._instance._query_cache = OrderedDict()  # (查询, path, limit, offset) -> (generation, 结果)
+            cls._instance._query_cache_size = config.get('search.query_cache_size', 256)
+            cls._instance._cache_hits = 0
+            cls._instance._cache_misses = 0
+            # 索引快照：多个工作进程通过 mmap 共享同一份索引文件
+            cls._instance._snapshot = None
+            cls._instance._snapshot_enabled = config.get('search.snapshot', True)
+            cls._instance._snapshot_dir = os.path.join(config.get('storage.data_dir', 'data'), 'search')
+            cls._instance._flock_mutex = threading.RLock()
+            cls._instance._flock_file = None
+            cls._instance._flock_depth = 0
+            # 并行建索引：文件数达到阈值时按块分发给进程池解析
+            cls._instance._build_workers = config.get('search.build_workers', 0) or os.cpu_count() or 1
+            cls._instance._build_chunk_size = config.get('search.build_chunk_size', 64)
+            cls._instance._parallel_threshold = config.get('search.parallel_threshold', 500)
+            # 已删除文档（墓碑）占文档表的比例超过该值时压缩并重新编号
+            cls._instance._compact_ratio = config.get('search.compact_ratio', 0.2)
+            # fork 时其他线程可能正持有锁（如主进程的文件监控线程正在写快照），子进程中重新创建
+            os.register_at_fork(after_in_child=cls._instance._after_fork)
         return cls._instance
 
+    def _after_fork(self) -> None:
+        self._lock = threading.RLock()
+        self._flock_mutex = threading.RLock()
+        # 文件锁由父进程的持有线程释放，子进程不再引用
+        self._flock_file = None
+        self._flock_depth = 0
+
+    @staticmethod
+    def url_for(file_path: str, path: str = 'static') -> str:
+        """根据文件路径计算笔记 URL（作为文档的唯一标识）"""
+        return '/' + os.path.splitext(os.path.relpath(file_path, path))[0].replace('\\', '/')
+
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        """小写分词，忽略单字符词"""
+        return [w for w in map(str.lower, _WORD.findall(text)) if len(w) >= 2]
+
+    @staticmethod
+    def _tokenize_with_offsets(text: str) -> List[Tuple[str, int]]:
+        """分词并保留每个词在原文中的字符偏移（与 _tokenize 结果一致）"""
+        tokens = [(m.group().lower(), m.start()) for m in _WORD.finditer(text)]
+        return [token for token in tokens if len(token[0]) >= 2]
+
+    @classmethod
+    def _parse_document(cls, file_path: str, path: str) -> Tuple[Dict, Counter, Dict[str, int]]:
+        """解析单个 HTML 文件，返回文档、加权词频及各词在正文中首次出现的偏移"""
+        title, text = extract_note_file(file_path)
+
+        # 标题与正文分别分词，标题词频按 TITLE_BOOST 加权（BM25F 风格）
+        title_words = cls._tokenize(title)
+        body_tokens = cls._tokenize_with_offsets(text)
+        body_words = [word for word, _ in body_tokens]
+        freqs = Counter(body_words)
+        # 逆序构建字典，同一个词保留最靠前的偏移
+        offsets = dict(reversed(body_tokens))
+        for word in title_words:
+            freqs[word] += cls.TITLE_BOOST
+
+        doc = {
+            'title': title,
+            'url': cls.url_for(file_path, path),
+            'text': text,
+            'length': len(body_words) + cls.TITLE_BOOST * len(title_words),
+        }
+        return doc, freqs, offsets
+
+    def _doc_words(self, doc: Dict) -> set:
+        """文档包含的全部词条（与建索引时的词频键一致）"""
+        return set(self._tokenize(doc['title'])) | set(self._tokenize(doc['text']))
+
+    def _get_doc(self, doc_id: int) -> Optional[Dict]:
+        """按文档 ID 取文档，快照中的文档按需从映射区解码"""
+        doc = self._doc_table[doc_id]
+        if doc is IN_SNAPSHOT:
+            return self._snapshot.read_doc(doc_id)
+        return doc
+
+    @staticmethod
+    def _list_documents(path: str) -> List[str]:
+        """列出目录下的全部 HTML 文件"""
+        return [os.path.join(root, file)
+                for root, _, files in os.walk(path)
+                for file in files if file.endswith('.html')]
+
+    @classmethod
+    def _iter_documents(cls, file_paths: Iterable[str], path: str) -> Iterator[Optional[Tuple[Dict, Counter, Dict]]]:
+        """逐个解析 HTML 文件，解析失败的文件产出 None"""
+        for file_path in file_paths:
+            try:
+                yield cls._parse_document(file_path, path)
+            except Exception as e:
+                logging.warning(f"搜索索引构建时跳过 {file_path}: {e}")
+                yield None
+
     def rebuild_index(self, path: str = 'static') -> None:
         """构建/重建倒排索引"""
-        index: Dict[str, List[Dict]] = {}
+        file_paths = self._list_documents(path) if os.path.exists(path) else []
+        if self._use_parallel_build(len(file_paths)):
+            built = self._build_parallel(file_paths, path)
+        else:
+            built = self._build_index(self._iter_documents(file_paths, path))
+        index, positions, doc_table, doc_ids, doc_lengths, total_length = built
+        terms = sorted(index)
 
-        if not os.path.exists(path):
+        with self._lock:
             self._index = index
+            self._positions = positions
+            self._terms = terms
+            self._doc_table = doc_table
+            self._doc_ids = doc_ids
+            self._doc_lengths = doc_lengths
+            self._total_length = total_length
+            self._snapshot = None
             self._indexed = True
-            return
+            self._indexed_path = path
+            self._generation += 1
+        logging.info(f"搜索索引构建完成，共 {len(doc_ids)} 篇文档、{len(index)} 个词条")
+
+        if self._snapshot_enabled:
+            with self._snapshot_lock(path):
+                self._persist_snapshot(path)
+
+    @classmethod
+    def _pack(cls, doc_id: int, tf: int) -> int:
+        """打包倒排表项"""
+        return (doc_id << cls.TF_BITS) | min(tf, cls.TF_MASK)
+
+    @classmethod
+    def _build_index(cls, parsed: Iterable[Optional[Tuple[Dict, Counter, Dict]]], base: int = 0):
+        """由解析结果构建倒排表与文档表
+
+        文档 ID 从 base 开始按顺序分配；解析失败的项（None）占用一个 ID 并记为已删除，
+        使并行构建时每个分块的 ID 区间可以预先确定。
+        """
+        index: Dict[str, array] = {}
+        positions: Dict[str, array] = {}
+        doc_table: List[Optional[Dict]] = []
+        doc_ids: Dict[str, int] = {}
+        doc_lengths = array('I')
+        total_length = 0
+        no_offset = cls.NO_OFFSET
+
+        for item in parsed:
+            if item is None:
+                doc_table.append(None)
+                doc_lengths.append(0)
+                continue
+            doc, freqs, offsets = item
+            # 文档 ID 按加入顺序递增，倒排表天然有序
+            doc_id = base + len(doc_table)
+            doc_table.append(doc)
+            doc_ids[doc['url']] = doc_id
+            doc_lengths.append(doc['length'])
+            total_length += doc['length']
+            for word, tf in freqs.items():
+                postings = index.get(word)
+                if postings is None:
+                    postings = index[word] = array('I')
+                    positions[word] = array('I')
+                postings.append(cls._pack(doc_id, tf))
+                positions[word].append(offsets.get(word, no_offset))
+
+        # 去掉 append 过程中的预留容量
+        for word, postings in index.items():
+            index[word] = array('I', postings)
+            positions[word] = array('I', positions[word])
+
+        return index, positions, doc_table, doc_ids, doc_lengths, total_length
+
+    def _use_parallel_build(self, n_files: int) -> bool:
+        """小型笔记库进程池的启动开销大于收益，使用串行构建"""
+        return self._build_workers > 1 and n_files >= self._parallel_threshold
+
+    def _build_parallel(self, file_paths: List[str], path: str):
+        """按块并行解析并构建局部倒排表，再按块顺序合并
+
+        每个分块的文档 ID 区间在分发前确定，合并时各词条的倒排表直接首尾相接即保持有序。
+        进程由 forkserver（不支持时为 spawn）启动：调用方可能已运行文件监控、缓存清理等线程，
+        直接 fork 会把这些线程持有的锁带入子进程。
+        """
+        chunk_size = max(1, self._build_chunk_size)
+        chunks = [file_paths[i:i + chunk_size] for i in range(0, len(file_paths), chunk_size)]
+        workers = min(self._build_workers, len(chunks))
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_build_context()) as executor:
+                partials = executor.map(_build_chunk, chunks, [path] * len(chunks),
+                                        range(0, len(file_paths), chunk_size))
+                built = self._merge_partials(partials)
+        except Exception as e:
+            logging.warning(f"并行构建搜索索引失败，改为串行构建: {e}")
+            return self._build_index(self._iter_documents(file_paths, path))
+        logging.info(f"搜索索引并行构建：{workers} 个进程，{len(chunks)} 个分块")
+        return built
+
+    @staticmethod
+    def _merge_partials(partials: Iterable[tuple]):
+        """按文档 ID 顺序合并各分块的局部倒排表与文档表"""
+        index: Dict[str, array] = {}
+        positions: Dict[str, array] = {}
+        doc_table: List[Optional[Dict]] = []
+        doc_ids: Dict[str, int] = {}
+        doc_lengths = array('I')
+        total_length = 0
+
+        for part_index, part_positions, part_table, part_ids, part_lengths, part_total in partials:
+            doc_table.extend(part_table)
+            doc_ids.update(part_ids)
+            doc_lengths.extend(part_lengths)
+            total_length += part_total
+            for word, postings in part_index.items():
+                merged = index.get(word)
+                if merged is None:
+                    index[word] = postings
+                    positions[word] = part_positions[word]
+                else:
+                    merged.extend(postings)
+                    positions[word].extend(part_positions[word])
+
+        # 去掉 extend 过程中的预留容量
+        for word, postings in index.items():
+            index[word] = array('I', postings)
+            positions[word] = array('I', positions[word])
+
+        return index, positions, doc_table, doc_ids, doc_lengths, total_length
+
+    def _writable_postings(self, word: str) -> Tuple[array, array]:
+        """取可修改的倒排表及位置表：快照中的只读 memoryview 在首次修改时复制为 array"""
+        postings, positions = self._index[word], self._positions[word]
+        if not isinstance(postings, array):
+            postings = self._index[word] = array('I', postings)
+            positions = self._positions[word] = array('I', positions)
+        return postings, positions
+
+    def _remove_locked(self, url: str) -> bool:
+        """从索引中移除文档（调用方需持有锁）
+
+        文档表中对应位置置为 None，ID 不复用，以保证新文档追加后倒排表仍然有序。
+        """
+        doc_id = self._doc_ids.pop(url, None)
+        if doc_id is None:
+            return False
+        doc = self._get_doc(doc_id)
+        self._doc_table[doc_id] = None
+        self._total_length -= self._doc_lengths[doc_id]
+        key = doc_id << self.TF_BITS
+        for word in self._doc_words(doc):
+            if word not in self._index:
+                continue
+            postings, positions = self._writable_postings(word)
+            i = bisect.bisect_left(postings, key)
+            if i < len(postings) and postings[i] >> self.TF_BITS == doc_id:
+                del postings[i]
+                del positions[i]
+            if not postings:
+                del self._index[word]
+                del self._positions[word]
+                i = bisect.bisect_left(self._terms, word)
+                if i < len(self._terms) and self._terms[i] == word:
+                    del self._terms[i]
+        return True
+
+    def _should_compact(self, doc_table: List, live: int) -> bool:
+        """文档表中的墓碑是否需要清理"""
+        size = len(doc_table)
+        return size > live and ((size - live) > size * self._compact_ratio or size >= self.MAX_DOCS - 1)
+
+    @classmethod
+    def _compact(cls, index: Dict, doc_table: List, doc_ids: Dict[str, int], doc_lengths):
+        """去掉已删除文档并按原顺序连续重新编号，返回 (index, doc_table, doc_ids, doc_lengths, 旧 ID 表)
+
+        编号保持原有顺序，倒排表重新打包后仍然有序；位置表与倒排表逐项对齐，不需要改变。
+        旧 ID 表的第 i 项为新文档 i 原来的 ID。不修改传入的结构。
+        """
+        id_map = array('I', bytes(4 * len(doc_table)))
+        old_ids = array('I')
+        new_table = []
+        new_lengths = array('I')
+        for old_id, doc in enumerate(doc_table):
+            if doc is None:
+                continue
+            id_map[old_id] = len(new_table)
+            old_ids.append(old_id)
+            new_table.append(doc)
+            new_lengths.append(doc_lengths[old_id])
+
+        shift, tf_mask = cls.TF_BITS, cls.TF_MASK
+        new_index = {word: array('I', [(id_map[v >> shift] << shift) | (v & tf_mask) for v in postings])
+                     for word, postings in index.items()}
+        new_ids = {url: id_map[old_id] for url, old_id in doc_ids.items()}
+        return new_index, new_table, new_ids, new_lengths, old_ids
+
+    def _compact_locked(self) -> None:
+        """在内存中压缩文档表（未使用快照时，调用方需持有锁）"""
+        removed = len(self._doc_table) - len(self._doc_ids)
+        self._index, self._doc_table, self._doc_ids, self._doc_lengths, _ = self._compact(
+            self._index, self._doc_table, self._doc_ids, self._doc_lengths)
+        logging.info(f"搜索索引已压缩，清理 {removed} 个已删除文档")
+
+    def _add_locked(self, doc: Dict, freqs: Counter, offsets: Dict[str, int]) -> None:
+        """将文档加入索引（调用方需持有锁）"""
+        if len(self._doc_table) >= self.MAX_DOCS:
+            raise OverflowError(f"搜索索引文档数超过上限 {self.MAX_DOCS}")
+        doc_id = len(self._doc_table)
+        self._doc_table.append(doc)
+        self._doc_ids[doc['url']] = doc_id
+        self._doc_lengths.append(doc['length'])
+        self._total_length += doc['length']
+        for word, tf in freqs.items():
+            if word in self._index:
+                postings, positions = self._writable_postings(word)
+            else:
+                postings = self._index[word] = array('I')
+                positions = self._positions[word] = array('I')
+                bisect.insort(self._terms, word)
+            postings.append(self._pack(doc_id, tf))
+            positions.append(offsets.get(word, self.NO_OFFSET))
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """返回以 prefix 开头的所有词条，O(log V + 匹配数)"""
+        terms = self._terms
+        lo = bisect.bisect_left(terms, prefix)
+        # prefix 的"后继"：末字符加一，所有以 prefix 开头的词都小于它
+        hi = bisect.bisect_left(terms, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+        return terms[lo:hi]
+
+    def add_document(self, file_path: str, path: str = 'static') -> Optional[str]:
+        """将单个笔记加入索引（已存在则替换），返回文档 URL
+
+        本进程和快照中都还没有索引时不做任何事，首次搜索会完整构建索引。
+        """
+        try:
+            doc, freqs, offsets = self._parse_document(file_path, path)
+        except Exception as e:
+            logging.warning(f"搜索索引更新时跳过 {file_path}: {e}")
+            return None
+
+        def apply():
+            with self._lock:
+                self._remove_locked(doc['url'])
+                self._add_locked(doc, freqs, offsets)
+                self._generation += 1
+            return doc['url']
 
+        url = self._mutate(path, apply)
+        if url:
+            logging.debug(f"搜索索引已更新: {url}")
+        return url
+
+    def update_document(self, file_path: str, path: str = 'static') -> Optional[str]:
+        """按文件当前状态更新索引：文件存在则重新索引，不存在则移除"""
+        if os.path.exists(file_path):
+            return self.add_document(file_path, path)
+        url = self.url_for(file_path, path)
+        self.remove_document(url, path)
+        return url
+
+    def remove_document(self, url: str, path: str = 'static') -> bool:
+        """从索引中移除指定 URL 的文档"""
+        def apply():
+            with self._lock:
+                removed = self._remove_locked(url)
+                if removed:
+                    self._generation += 1
+                return removed
+
+        removed = bool(self._mutate(path, apply))
+        if removed:
+            logging.debug(f"搜索索引已移除: {url}")
+        return removed
+
+    def sync_document(self, file_path: str, path: str = 'static') -> None:
+        """同步其他进程对单篇文档的修改
+
+        启用快照时修改方已写回快照，重新映射即可；否则在本进程内重新索引该文档。
+        """
+        if self._snapshot_enabled:
+            self._sync_snapshot(path)
+        else:
+            self.update_document(file_path, path)
+
+    def invalidate(self) -> None:
+        """丢弃本进程的索引，下次搜索时重新加载快照或重建"""
+        with self._lock:
+            self._indexed = False
+            self._snapshot = None
+            self._generation += 1
+
+    def _mutate(self, path: str, apply):
+        """对索引做一次增量修改；启用快照时在文件锁内同步最新快照、修改并写回
+
+        启用快照时所有原地修改都在文件锁内进行，写快照期间倒排表不会变化。
+        """
+        if self._snapshot_enabled:
+            with self._snapshot_lock(path):
+                persist = os.path.exists(self._snapshot_file(path))
+                if persist:
+                    self._ensure_index(path)
+                elif not (self._indexed and self._indexed_path == path):
+                    return None
+                result = apply()
+                if result and persist:
+                    self._persist_snapshot(path)
+                return result
+        if not (self._indexed and self._indexed_path == path):
+            return None
+        result = apply()
+        with self._lock:
+            if self._should_compact(self._doc_table, len(self._doc_ids)):
+                self._compact_locked()
+                self._generation += 1
+        return result
+
+    # ---- 索引快照 ----
+
+    def _snapshot_file(self, path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self._snapshot_dir, f'index-{digest}.bin')
+
+    @contextmanager
+    def _snapshot_lock(self, path: str):
+        """跨进程互斥（fcntl.flock），同一进程内可重入"""
+        with self._flock_mutex:
+            if self._flock_depth == 0:
+                os.makedirs(self._snapshot_dir, exist_ok=True)
+                self._flock_file = open(self._snapshot_file(path) + '.lock', 'a')
+                fcntl.flock(self._flock_file, fcntl.LOCK_EX)
+            self._flock_depth += 1
+            try:
+                yield
+            finally:
+                self._flock_depth -= 1
+                if self._flock_depth == 0:
+                    fcntl.flock(self._flock_file, fcntl.LOCK_UN)
+                    self._flock_file.close()
+                    self._flock_file = None
+
+    @staticmethod
+    def _source_fingerprint(path: str) -> Tuple[int, int]:
+        """源目录的 (HTML 文件数, 最大 mtime_ns)"""
+        count, latest = 0, 0
         for root, _, files in os.walk(path):
             for file in files:
-                if not file.endswith('.html'):
-                    continue
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
+                if file.endswith('.html'):
+                    count += 1
+                    try:
+                        latest = max(latest, os.stat(os.path.join(root, file)).st_mtime_ns)
+                    except OSError:
+                        pass
+        return count, latest
+
+    def _persist_snapshot(self, path: str) -> None:
+        """将当前索引写入快照并重新映射（调用方需持有文件锁）
+
+        内存索引锁只在取得各结构的引用时持有，写文件与 fsync 期间搜索不受阻塞；
+        原地修改都在文件锁内进行，写入期间索引内容不变。
+        """
+        try:
+            with self._lock:
+                state = (dict(self._index), dict(self._positions), list(self._terms), list(self._doc_table),
+                         dict(self._doc_ids), self._doc_lengths, self._total_length, self._snapshot)
+            index, positions, terms, doc_table, doc_ids, doc_lengths, total_length, base = state
+            base_ids = None
+            if self._should_compact(doc_table, len(doc_ids)):
+                # 重写快照时顺带清理墓碑，写入后重新映射即切换到新的编号
+                removed = len(doc_table) - len(doc_ids)
+                index, doc_table, _, doc_lengths, base_ids = self._compact(index, doc_table, doc_ids, doc_lengths)
+                logging.info(f"搜索索引快照已压缩，清理 {removed} 个已删除文档")
+            write_snapshot(self._snapshot_file(path), index, positions, terms, doc_table,
+                           doc_lengths, total_length, self._source_fingerprint(path), base, base_ids)
+            self._load_snapshot(path)
+        except Exception as e:
+            logging.error(f"写入搜索索引快照失败: {e}")
 
-                    soup = BeautifulSoup(content, 'html.parser')
-                    title = soup.title.string.strip() if soup.title and soup.title.string else ''
-                    article = soup.find('article')
-                    text = article.get_text() if article else soup.get_text()
+    def _load_snapshot(self, path: str) -> bool:
+        """映射快照文件并替换当前索引，返回是否成功"""
+        file_path = self._snapshot_file(path)
+        try:
+            snapshot = IndexSnapshot(file_path)
+            index, positions, terms, doc_table, doc_ids, doc_lengths = snapshot.load()
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.warning(f"搜索索引快照不可用 {file_path}: {e}")
+            return False
 
-                    url = '/' + os.path.splitext(os.path.relpath(file_path, path))[0].replace('\\', '/')
+        with self._lock:
+            self._index = index
+            self._positions = positions
+            self._terms = terms
+            self._doc_table = doc_table
+            self._doc_ids = doc_ids
+            self._doc_lengths = doc_lengths
+            self._total_length = snapshot.total_length
+            self._snapshot = snapshot
+            self._indexed = True
+            self._indexed_path = path
+            self._generation += 1
+        logging.debug(f"已加载搜索索引快照: {file_path}")
+        return True
 
-                    doc = {'title': title, 'url': url, 'text': text}
+    def _sync_snapshot(self, path: str) -> None:
+        """快照文件被其他进程更新后重新映射（每次搜索一次 stat）"""
+        if self._snapshot is None or self._indexed_path != path:
+            return
+        try:
+            stat = os.stat(self._snapshot_file(path))
+        except FileNotFoundError:
+            return
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._snapshot.stamp:
+            self._load_snapshot(path)
 
-                    # 对标题和正文分词，全部小写
-                    words = set(re.findall(r'\w+', (title + ' ' + text).lower()))
-                    for word in words:
-                        if len(word) < 2:
-                            continue
-                        index.setdefault(word, []).append(doc)
+    def warm_up(self, path: str = 'static') -> None:
+        """启动时加载索引快照；快照缺失或与源目录不一致时重建
 
-                except Exception as e:
-                    logging.warning(f"搜索索引构建时跳过 {file_path}: {e}")
+        在 gunicorn 主进程中调用（preload_app），工作进程 fork 后直接共享映射。
+        """
+        if not self._snapshot_enabled:
+            return
+        with self._snapshot_lock(path):
+            if self._load_snapshot(path) and self._snapshot_is_fresh(path):
+                logging.info(f"已加载搜索索引快照，共 {len(self._doc_ids)} 篇文档")
+                return
+            self.rebuild_index(path)
 
-        self._index = index
-        self._indexed = True
-        logging.info(f"搜索索引构建完成，共 {len(index)} 个词条")
+    def _snapshot_is_fresh(self, path: str) -> bool:
+        """快照写入后源目录中没有新增、删除或修改过的 HTML 文件"""
+        count, latest = self._source_fingerprint(path)
+        return count == self._snapshot.source_count and latest <= self._snapshot.source_mtime_ns
 
     def _ensure_index(self, path: str = 'static') -> None:
-        if not self._indexed:
+        if self._snapshot_enabled:
+            self._sync_snapshot(path)
+        if self._indexed and self._indexed_path == path:
+            return
+        if self._snapshot_enabled:
+            with self._snapshot_lock(path):
+                # 等待锁期间其他进程可能已写好快照
+                if self._load_snapshot(path):
+                    return
+                self.rebuild_index(path)
+        else:
             self.rebuild_index(path)
 
-    def search_notes(self, query: str, path: str = 'static') -> List[Dict]:
-        """搜索笔记内容（基于倒排索引）"""
-        self._ensure_index(path)
+    def _word_doc_keys(self, word: str) -> Tuple[List[str], array]:
+        """查询词（含前缀扩展）命中的词条，及其文档的有序集合（调用方需持有锁）
 
-        query_lower = query.lower()
-        query_words = [w for w in re.findall(r'\w+', query_lower) if len(w) >= 2]
+        单个词条时直接返回其倒排表；多个词条时返回词频位清零的文档键并集。
+        """
+        terms = self._expand_prefix(word)
+        if len(terms) == 1:
+            return terms, self._index[terms[0]]
+        key_mask = self.KEY_MASK
+        merged = set()
+        for term in terms:
+            merged.update(v & key_mask for v in self._index[term])
+        return terms, array('I', sorted(merged))
 
-        if not query_words:
-            return []
+    @classmethod
+    def _intersect(cls, small: array, large: array) -> array:
+        """按文档 ID 对两个有序表求交：遍历较短表，在较长表中倍增（galloping）查找
+
+        返回词频位清零的文档键。
+        """
+        if len(small) > len(large):
+            small, large = large, small
+        key_mask, shift = cls.KEY_MASK, cls.TF_BITS
+        result = array('I')
+        n = len(large)
+        lo = 0
+        for value in small:
+            if lo >= n:
+                break
+            key = value & key_mask
+            # 倍增确定上界 large[lo + bound] >= key，再在区间内二分
+            bound = 1
+            while lo + bound < n and large[lo + bound] < key:
+                bound <<= 1
+            lo = bisect.bisect_left(large, key, lo, min(lo + bound + 1, n))
+            if lo < n and large[lo] >> shift == key >> shift:
+                result.append(key)
+                lo += 1
+        return result
+
+    def _score_candidates(self, terms: List[str], candidates: array) -> Dict[int, float]:
+        """计算候选文档对单个查询词的 BM25 得分（调用方需持有锁）
+
+        同一查询词扩展出的多个词条取最高分，避免词形变体多的文档被重复计分。
+        """
+        n_docs = len(self._doc_ids)
+        avgdl = (self._total_length / n_docs) if n_docs else 1.0
+        k1, b = self.BM25_K1, self.BM25_B
+        shift, tf_mask, key_mask = self.TF_BITS, self.TF_MASK, self.KEY_MASK
+        doc_lengths = self._doc_lengths
+
+        scores: Dict[int, float] = {}
+        candidate_set = None
+        for term in terms:
+            postings = self._index[term]
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            if candidates is postings:
+                matched = postings
+            elif len(candidates) >= df:
+                # 候选集不小于倒排表时遍历倒排表并过滤
+                if candidate_set is None:
+                    candidate_set = {key & key_mask for key in candidates}
+                matched = [v for v in postings if v & key_mask in candidate_set]
+            else:
+                # 候选集较小时在倒排表中二分查找
+                matched = []
+                for key in candidates:
+                    i = bisect.bisect_left(postings, key & key_mask)
+                    if i < df and postings[i] >> shift == key >> shift:
+                        matched.append(postings[i])
+            for value in matched:
+                doc_id, tf = value >> shift, value & tf_mask
+                dl = doc_lengths[doc_id]
+                score = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+        return scores
 
-        # 取各词对应文档集合的交集（AND 语义）
-        candidate_sets = []
-        for word in query_words:
-            matched = {doc['url']: doc for doc in self._index.get(word, [])}
-            # 也支持包含该词的超集（前缀匹配）
-            for indexed_word, docs in self._index.items():
-                if indexed_word.startswith(word) and indexed_word != word:
-                    for doc in docs:
-                        matched[doc['url']] = doc
-            candidate_sets.append(matched)
-
-        if not candidate_sets:
+    def search_notes(self, query: str, path: str = 'static', limit: int = 20, offset: int = 0) -> List[Dict]:
+        """搜索笔记内容（基于倒排索引，按 BM25 相关度排序）
+
+        Args:
+            query: 查询字符串，多个词之间为 AND 语义
+            path: 笔记目录
+            limit: 返回结果数上限
+            offset: 跳过的结果数（分页）
+        """
+        self._ensure_index(path)
+
+        query_lower = ' '.join(query.lower().split())
+        query_words = self._tokenize(query_lower)
+
+        if not query_words or limit <= 0:
             return []
 
-        # 交集
-        common_urls = set(candidate_sets[0].keys())
-        for cs in candidate_sets[1:]:
-            common_urls &= set(cs.keys())
+        cache_key = (query_lower, path, limit, offset)
+        with self._lock:
+            cached = self._query_cache.get(cache_key)
+            if cached is not None and cached[0] == self._generation:
+                self._query_cache.move_to_end(cache_key)
+                self._cache_hits += 1
+                return cached[1]
+            self._cache_misses += 1
+            generation = self._generation
+            hits = self._rank_locked(query_words, limit, offset)
 
         results = []
-        for url in common_urls:
-            doc = candidate_sets[0][url]
-            preview = self._generate_preview(doc['text'], query_lower)
+        for doc, score, anchor in hits:
+            preview, highlight = self._generate_preview(doc['text'], query_words, anchor)
             results.append({
                 'title': doc['title'],
-                'url': url,
+                'url': doc['url'],
                 'preview': preview,
+                'highlight': highlight,
+                'score': round(score, 4),
             })
 
-        return sorted(results, key=lambda x: x['title'].lower())
+        with self._lock:
+            self._query_cache[cache_key] = (generation, results)
+            self._query_cache.move_to_end(cache_key)
+            while len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return results
 
-    def _generate_preview(self, content: str, query: str, context_length: int = 100) -> str:
-        """生成搜索结果预览"""
-        query_pos = content.lower().find(query.lower())
-        if query_pos == -1:
-            return content[:context_length] + '...'
+    def _rank_locked(self, query_words: List[str], limit: int, offset: int) -> List[Tuple[Dict, float, Optional[int]]]:
+        """求交集并按 BM25 取第 offset 起的 limit 个文档（调用方需持有锁）
 
-        start = max(0, query_pos - context_length // 2)
-        end = min(len(content), query_pos + len(query) + context_length // 2)
+        返回 (文档, 得分, 预览锚点)，锚点为任一查询词在正文中最早出现的字符偏移。
+        """
+        # 先按文档 ID 求交集（AND 语义），从最短的表开始
+        expanded = [self._word_doc_keys(word) for word in dict.fromkeys(query_words)]
+        expanded.sort(key=lambda item: len(item[1]))
+        candidates = expanded[0][1]
+        for _, keys in expanded[1:]:
+            if not candidates:
+                break
+            candidates = self._intersect(candidates, keys)
+        if not candidates:
+            return []
 
-        if start > 0:
-            ws = content.find(' ', start)
-            start = ws if ws != -1 else start
+        # 再对候选文档按各查询词累加 BM25 得分
+        totals: Dict[int, float] = {}
+        for terms, _ in expanded:
+            for doc_id, score in self._score_candidates(terms, candidates).items():
+                totals[doc_id] = totals.get(doc_id, 0.0) + score
 
-        if end < len(content):
-            ws = content.rfind(' ', 0, end)
-            end = ws if ws != -1 else end
+        # 只对需要返回的 top-k 结果生成预览
+        top = heapq.nlargest(offset + limit, totals.items(), key=lambda item: item[1])[offset:]
+        matched_terms = [term for terms, _ in expanded for term in terms]
+        return [(self._get_doc(doc_id), score, self._first_offset(doc_id, matched_terms))
+                for doc_id, score in top]
+
+    def _first_offset(self, doc_id: int, terms: List[str]) -> Optional[int]:
+        """词条在文档正文中最早出现的字符偏移，均未出现在正文中时为 None（调用方需持有锁）"""
+        key = doc_id << self.TF_BITS
+        first = self.NO_OFFSET
+        for term in terms:
+            postings = self._index[term]
+            i = bisect.bisect_left(postings, key)
+            if i < len(postings) and postings[i] >> self.TF_BITS == doc_id:
+                first = min(first, self._positions[term][i])
+        return None if first == self.NO_OFFSET else first
+
+    def cache_stats(self) -> Dict:
+        """查询缓存统计"""
+        with self._lock:
+            lookups = self._cache_hits + self._cache_misses
+            return {
+                'entries': len(self._query_cache),
+                'capacity': self._query_cache_size,
+                'hits': self._cache_hits,
+                'misses': self._cache_misses,
+                'hit_rate': round(self._cache_hits / lookups, 4) if lookups else 0.0,
+                'generation': self._generation,
+            }
+
+    @staticmethod
+    def _generate_preview(content: str, query_words: List[str], anchor: Optional[int] = None,
+                          context_length: int = 100) -> Tuple[str, List[Dict[str, int]]]:
+        """以索引记录的偏移为锚点截取预览，并返回预览内查询词的高亮区间
+
+        只对预览窗口内的词做小写比较；高亮区间为 {start, length}，按字符计、相对于预览文本。
+        """
+        if anchor is None:
+            start, end = 0, min(len(content), context_length)
+        else:
+            match = _WORD.match(content, anchor)
+            anchor_end = match.end() if match else anchor
+            start = max(0, anchor - context_length // 2)
+            end = min(len(content), anchor_end + context_length // 2)
 
-        preview = content[start:end].strip()
-        if start > 0:
-            preview = '...' + preview
+            # 在空白处截断，且不截断锚点词
+            if start > 0:
+                ws = content.find(' ', start, anchor)
+                start = ws if ws != -1 else start
+            if end < len(content):
+                ws = content.rfind(' ', anchor_end, end)
+                end = ws if ws != -1 else end
+
+        window = content[start:end]
+        stripped = window.strip()
+        prefix = '...' if start > 0 else ''
+        base = start + len(window) - len(window.lstrip()) - len(prefix)
+
+        prefixes = tuple(query_words)
+        highlight = []
+        for match in _WORD.finditer(content, start, end):
+            word = match.group().lower()
+            if len(word) >= 2 and word.startswith(prefixes):
+                highlight.append({'start': match.start() - base, 'length': len(match.group())})
+
+        preview = prefix + stripped
         if end < len(content):
-            preview = preview + '...'
+            preview += '...'
+        return preview, highlight
 
-        return preview
+def _build_context():
+    """并行建索引使用的进程启动方式：不继承父进程线程状态的 forkserver，不支持时为 spawn"""
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+def _build_chunk(file_paths: List[str], path: str, base: int):
+    """进程池任务：解析一个分块的文件，构建文档 ID 从 base 开始的局部索引"""
+    return SearchService._build_index(SearchService._iter_documents(file_paths, path), base)
 
 
 search_service = SearchService()
+
+# 应用其他工作进程发布的索引失效事件
+invalidation_bus.subscribe('note', search_service.sync_document)
+invalidation_bus.on_resync(search_service.invalidate)
@@ -0,0 +1,192 @@
+"""
+搜索索引快照：将倒排索引序列化为带版本号的二进制文件，并以 mmap 只读映射加载
+
+文件布局（各段按 8 字节对齐）::
+
+    header      魔数、版本、字节序标记、文档/词条数量、各段偏移
+    term_offs   array('Q')，第 i 个词条的倒排表在 postings 中的起止位置
+    terms       UTF-8 编码、以 '\\n' 分隔的有序词典
+    postings    array('I')，各词条的打包倒排表依次拼接
+    positions   array('I')，与 postings 逐项对齐的词条首次出现偏移
+    strings     各文档的 url/title/text 原始字节
+    docs        每个文档一条定长记录（字符串偏移与长度、文档长度、删除标记）
+
+倒排表以 memoryview 直接指向映射区域，正文仅在生成预览时按需解码，
+多个 gunicorn 工作进程共享同一份页缓存。
+"""
+import os
+import sys
+import mmap
+import struct
+import logging
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+MAGIC = b'SNSIDX\x00\x00'
+VERSION = 2
+# 倒排表按本机字节序写入，加载时需一致
+BYTE_ORDER = 0 if sys.byteorder == 'little' else 1
+
+# magic, version, byte_order, doc_count, term_count, source_count, (保留),
+# total_length, source_mtime_ns, term_offs, terms, terms_size, postings, positions, strings, docs
+_HEADER = struct.Struct('<8sIIIIIIQQQQQQQQQ')
+# strings 段内偏移, url/title/text 字节数, 文档长度, 标记
+_DOC = struct.Struct('<QIIIII')
+_DELETED = 1
+
+# 快照中的文档：文档表中以该哨兵占位，需要时再从映射区解码
+IN_SNAPSHOT = object()
+
+
+def _align(f) -> int:
+    """将写入位置补齐到 8 字节边界，返回对齐后的位置"""
+    pos = f.tell()
+    pad = -pos % 8
+    if pad:
+        f.write(b'\x00' * pad)
+    return pos + pad
+
+
+class IndexSnapshot:
+    """只读映射的索引快照"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._view = memoryview(self._mm)
+
+        (magic, version, byte_order, self.doc_count, self.term_count, self.source_count, _,
+         self.total_length, self.source_mtime_ns, self._term_offs, self._terms, self._terms_size,
+         self._postings, self._positions, self._strings, self._docs) = _HEADER.unpack_from(self._mm, 0)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不支持的索引快照版本: {magic!r} v{version}")
+        if byte_order != BYTE_ORDER or array('I').itemsize != 4:
+            raise ValueError("索引快照字节序或整数宽度与当前平台不一致")
+
+    def load(self) -> Tuple[Dict[str, memoryview], Dict[str, memoryview], List[str], List, Dict[str, int], array]:
+        """解码词典与文档表，返回 (index, positions, terms, doc_table, doc_ids, doc_lengths)
+
+        倒排表与位置表为指向映射区的 memoryview，不复制数据。
+        """
+        view = self._view
+        term_offs = view[self._term_offs:self._term_offs + 8 * (self.term_count + 1)].cast('Q')
+        if self.term_count:
+            terms = bytes(view[self._terms:self._terms + self._terms_size]).decode('utf-8').split('\n')
+            postings = view[self._postings:self._postings + 4 * term_offs[-1]].cast('I')
+            offsets = view[self._positions:self._positions + 4 * term_offs[-1]].cast('I')
+        else:
+            terms = []
+        index = {term: postings[term_offs[i]:term_offs[i + 1]] for i, term in enumerate(terms)}
+        positions = {term: offsets[term_offs[i]:term_offs[i + 1]] for i, term in enumerate(terms)}
+
+        doc_table: List = []
+        doc_ids: Dict[str, int] = {}
+        doc_lengths = array('I')
+        strings = self._strings
+        for doc_id, (offset, url_len, _, _, length, flags) in enumerate(
+                _DOC.iter_unpack(view[self._docs:self._docs + _DOC.size * self.doc_count])):
+            doc_lengths.append(length)
+            if flags & _DELETED:
+                doc_table.append(None)
+                continue
+            url = bytes(view[strings + offset:strings + offset + url_len]).decode('utf-8')
+            doc_table.append(IN_SNAPSHOT)
+            doc_ids[url] = doc_id
+
+        return index, positions, terms, doc_table, doc_ids, doc_lengths
+
+    def _record(self, doc_id: int):
+        return _DOC.unpack_from(self._mm, self._docs + _DOC.size * doc_id)
+
+    def raw_doc(self, doc_id: int) -> memoryview:
+        """文档 url/title/text 的原始字节（用于重写快照时直接拷贝）"""
+        offset, url_len, title_len, text_len, _, _ = self._record(doc_id)
+        start = self._strings + offset
+        return self._view[start:start + url_len + title_len + text_len]
+
+    def read_doc(self, doc_id: int) -> Dict:
+        """按需解码单个文档"""
+        offset, url_len, title_len, text_len, length, _ = self._record(doc_id)
+        start = self._strings + offset
+        raw = self._mm[start:start + url_len + title_len + text_len]
+        return {
+            'url': raw[:url_len].decode('utf-8'),
+            'title': raw[url_len:url_len + title_len].decode('utf-8'),
+            'text': raw[url_len + title_len:].decode('utf-8'),
+            'length': length,
+        }
+
+
+def write_snapshot(file_path: str, index: Dict, positions: Dict, terms: List[str], doc_table: List,
+                   doc_lengths: array, total_length: int, source: Tuple[int, int],
+                   base: Optional[IndexSnapshot] = None, base_ids: Optional[Sequence[int]] = None) -> None:
+    """将索引写入快照文件（先写临时文件再原子替换）
+
+    source 为写入时源目录的 (HTML 文件数, 最大 mtime_ns)，用于启动时判断快照是否过期。
+
+    doc_table 中的 IN_SNAPSHOT 文档从 base 快照中直接拷贝原始字节；文档表压缩后编号改变时，
+    base_ids[新 ID] 为该文档在 base 中的 ID。
+    已删除文档保留为带删除标记的记录，文档 ID 保持不变。
+    """
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    tmp_path = f'{file_path}.{os.getpid()}.tmp'
+
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\x00' * _HEADER.size)
+
+        # 词条倒排表偏移
+        term_offs = array('Q', [0])
+        for term in terms:
+            term_offs.append(term_offs[-1] + len(index[term]))
+        term_offs_pos = _align(f)
+        f.write(term_offs)
+
+        terms_pos = _align(f)
+        terms_blob = '\n'.join(terms).encode('utf-8')
+        f.write(terms_blob)
+
+        postings_pos = _align(f)
+        for term in terms:
+            f.write(index[term])
+
+        positions_pos = _align(f)
+        for term in terms:
+            f.write(positions[term])
+
+        # 文档字符串
+        strings_pos = _align(f)
+        records = []
+        for doc_id, doc in enumerate(doc_table):
+            offset = f.tell() - strings_pos
+            if doc is None:
+                records.append((offset, 0, 0, 0, doc_lengths[doc_id], _DELETED))
+                continue
+            if doc is IN_SNAPSHOT:
+                base_id = doc_id if base_ids is None else base_ids[doc_id]
+                _, url_len, title_len, text_len, _, _ = base._record(base_id)
+                f.write(base.raw_doc(base_id))
+            else:
+                url, title, text = (doc[k].encode('utf-8') for k in ('url', 'title', 'text'))
+                url_len, title_len, text_len = len(url), len(title), len(text)
+                f.write(url)
+                f.write(title)
+                f.write(text)
+            records.append((offset, url_len, title_len, text_len, doc_lengths[doc_id], 0))
+
+        docs_pos = _align(f)
+        for record in records:
+            f.write(_DOC.pack(*record))
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, BYTE_ORDER, len(doc_table), len(terms), source[0], 0,
+                             total_length, source[1], term_offs_pos, terms_pos,
+                             len(terms_blob), postings_pos, positions_pos, strings_pos, docs_pos))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, file_path)
+    logging.info(f"搜索索引快照已写入: {file_path}（{len(doc_table)} 篇文档、{len(terms)} 个词条）")
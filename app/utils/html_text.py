@@ -0,0 +1,107 @@
+from html.parser import HTMLParser
+from typing import List, Tuple
+
+# 文本不计入正文的元素（与 BeautifulSoup.get_text 的行为一致）
+_SKIP_TAGS = frozenset(('script', 'style'))
+# 保留空白的元素，其余元素之间的纯空白文本折叠为单个换行或空格
+_PRESERVE_WHITESPACE_TAGS = frozenset(('pre', 'textarea'))
+CHUNK_SIZE = 64 * 1024
+
+
+class NoteTextParser(HTMLParser):
+    """流式提取笔记标题与 <article> 正文，不构建 DOM 树
+
+    - 标题取文档中第一个 <title> 的文本
+    - 正文取第一个 <article>（含嵌套元素）的文本；没有 <article> 时取整个文档的文本
+    - 第一个 <article> 结束后即视为完成，调用方可停止继续喂入数据
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._title: List[str] = []
+        self._article: List[str] = []
+        self._document: List[str] = []
+        self._in_title = False
+        self._title_done = False
+        self._skip_depth = 0
+        self._preserve_depth = 0
+        self._article_depth = 0
+        self._article_found = False
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+        elif tag == 'title' and not self._title_done:
+            self._in_title = True
+        elif tag == 'article' and not self.done:
+            if not self._article_found:
+                # 找到正文后不再需要整个文档的文本
+                self._article_found = True
+                self._document = []
+            self._article_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        # 自闭合标签不包含文本，无需进入/退出状态
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+        elif tag in _PRESERVE_WHITESPACE_TAGS:
+            if self._preserve_depth:
+                self._preserve_depth -= 1
+        elif tag == 'title' and self._in_title:
+            self._in_title = False
+            self._title_done = True
+        elif tag == 'article' and self._article_depth:
+            self._article_depth -= 1
+            if self._article_depth == 0:
+                self.done = True
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if not self._preserve_depth and data.isspace():
+            data = '\n' if '\n' in data else ' '
+        if self._in_title:
+            self._title.append(data)
+        if self._article_depth:
+            self._article.append(data)
+        elif not self._article_found:
+            self._document.append(data)
+
+    def result(self) -> Tuple[str, str]:
+        """返回 (标题, 正文)"""
+        text = ''.join(self._article) if self._article_found else ''.join(self._document)
+        return ''.join(self._title).strip(), text
+
+
+def extract_note_text(html: str) -> Tuple[str, str]:
+    """从 HTML 字符串中提取 (标题, 正文)"""
+    parser = NoteTextParser()
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start:start + CHUNK_SIZE])
+        if parser.done:
+            break
+    else:
+        parser.close()
+    return parser.result()
+
+
+def extract_note_file(file_path: str) -> Tuple[str, str]:
+    """分块读取 HTML 文件并提取 (标题, 正文)，正文结束后不再读取剩余内容"""
+    parser = NoteTextParser()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                parser.close()
+                break
+            parser.feed(chunk)
+            if parser.done:
+                break
+    return parser.result()
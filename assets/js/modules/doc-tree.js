@@ -75,14 +75,77 @@ function createTreeNode(item) {
     return li;
 }
 
+const DOC_TREE_STORAGE_KEY = 'docTree';
+
+// 按标题中的 "/" 组织文件夹结构（与服务端 organize_notes_by_folder 一致）
+function organizeNotes(notes) {
+    const tree = [];
+    const folders = {};
+    [...notes]
+        .sort((a, b) => (a.title < b.title ? -1 : a.title > b.title ? 1 : 0))
+        .forEach(note => {
+            const parts = note.title.split('/');
+            let level = tree;
+            for (let i = 0; i < parts.length - 1; i++) {
+                const folderPath = parts.slice(0, i + 1).join('/');
+                if (!folders[folderPath]) {
+                    folders[folderPath] = { title: parts[i], isFolder: true, children: [] };
+                    level.push(folders[folderPath]);
+                }
+                level = folders[folderPath].children;
+            }
+            level.push({ title: parts[parts.length - 1], url: `/${note.slug}`, isFolder: false });
+        });
+    return tree;
+}
+
+function loadStoredNotes() {
+    try {
+        const stored = JSON.parse(localStorage.getItem(DOC_TREE_STORAGE_KEY));
+        if (stored && stored.version && Array.isArray(stored.notes)) return stored;
+    } catch (error) {
+        console.error('Error reading stored doc tree:', error);
+    }
+    return null;
+}
+
+function storeNotes(version, notes) {
+    try {
+        localStorage.setItem(DOC_TREE_STORAGE_KEY, JSON.stringify({ version, notes }));
+    } catch (error) {
+        // 存储空间不足等情况下只影响下次加载速度
+        console.error('Error storing doc tree:', error);
+    }
+}
+
+// 在本地缓存的笔记列表上应用增量变更
+function applyDelta(notes, delta) {
+    if (delta.reset) return delta.notes;
+    const bySlug = new Map(notes.map(note => [note.slug, note]));
+    delta.removed.forEach(slug => bySlug.delete(slug));
+    delta.added.forEach(note => bySlug.set(note.slug, note));
+    return [...bySlug.values()];
+}
+
 async function fetchDocTree() {
     try {
-        const response = await fetch('/api/doc-tree');
+        const stored = loadStoredNotes();
+        const since = stored ? stored.version : '';
+        const response = await fetch(`/api/doc-tree?since=${encodeURIComponent(since)}`);
         if (!response.ok) throw new Error('Failed to fetch doc tree');
-        return await response.json();
+        const delta = await response.json();
+        if (delta.lazy) {
+            // 笔记过多，改为按文件夹逐层加载
+            localStorage.removeItem(DOC_TREE_STORAGE_KEY);
+            return null;
+        }
+        const notes = applyDelta(stored ? stored.notes : [], delta);
+        if (delta.version !== since) storeNotes(delta.version, notes);
+        return organizeNotes(notes);
     } catch (error) {
         console.error('Error fetching doc tree:', error);
-        return [];
+        const stored = loadStoredNotes();
+        return stored ? organizeNotes(stored.notes) : [];
     }
 }
 
@@ -91,7 +154,12 @@ export async function initDocTree() {
     if (!container) return;
     
     const data = await fetchDocTree();
-    if (!data || !data.length) {
+    if (data === null) {
+        const { initDocTree: initLazyTree } = await import('./tree.js');
+        await initLazyTree(container);
+        return;
+    }
+    if (!data.length) {
         container.innerHTML = '<div class="tree-empty">No documents found</div>';
         return;
     }
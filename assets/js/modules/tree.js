@@ -1,127 +1,127 @@
-export function initDocTree() {
-    // 初始化文档树
-    fetch('/api/doc-tree')
-        .then(response => response.json())
-        .then(data => {
-            renderTree(data);
-            initTreeInteractions();
-        })
-        .catch(error => console.error('Error loading doc tree:', error));
+// 逐层加载的文档树：每次只请求一个文件夹的一页子项，展开文件夹时再加载其内容
+const TREE_STATE_KEY = 'treeState';
+
+async function fetchFolder(path, cursor) {
+    const params = new URLSearchParams({ path });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`/api/doc-tree/folder?${params}`);
+    if (!response.ok) throw new Error(`Failed to fetch folder: ${path}`);
+    return await response.json();
+}
+
+function loadTreeState() {
+    try {
+        return JSON.parse(localStorage.getItem(TREE_STATE_KEY)) || {};
+    } catch (e) {
+        console.error('Error restoring tree state:', e);
+        return {};
+    }
 }
 
-function renderTree(nodes, parentEl = document.getElementById('doc-tree')) {
-    const ul = document.createElement('ul');
-    ul.className = 'tree-list';
-    
-    nodes.forEach(node => {
-        const li = document.createElement('li');
-        
-        if (node.isFolder) {
-            li.className = 'folder-item';
-            li.innerHTML = `
-                <span class="folder-icon">▶</span>
-                <span class="folder-name">${node.title}</span>
-                <div class="folder-children"></div>
-            `;
-            
-            if (node.children && node.children.length > 0) {
-                renderTree(node.children, li.querySelector('.folder-children'));
-            }
-        } else {
-            li.className = 'file-item';
-            li.innerHTML = `<a href="${node.url}">${node.title}</a>`;
+function saveFolderState(path, open) {
+    const state = loadTreeState();
+    if (open) {
+        state[path] = true;
+    } else {
+        delete state[path];
+    }
+    localStorage.setItem(TREE_STATE_KEY, JSON.stringify(state));
+}
+
+function createFileItem(node) {
+    const li = document.createElement('li');
+    li.className = 'file-item';
+    const link = document.createElement('a');
+    link.href = node.url;
+    link.textContent = node.title;
+    li.appendChild(link);
+    if (window.location.pathname === node.url) {
+        li.classList.add('active');
+    }
+    return li;
+}
+
+function createFolderItem(node, state) {
+    const li = document.createElement('li');
+    li.className = 'folder-item';
+    li.dataset.path = node.path;
+
+    const icon = document.createElement('span');
+    icon.className = 'folder-icon';
+    icon.textContent = '▶';
+    const name = document.createElement('span');
+    name.className = 'folder-name';
+    name.textContent = node.title;
+    const count = document.createElement('span');
+    count.className = 'folder-count';
+    count.textContent = ` (${node.count})`;
+    const children = document.createElement('div');
+    children.className = 'folder-children';
+    li.append(icon, name, count, children);
+
+    let loaded = false;
+    const toggle = async (open) => {
+        if (open && !loaded) {
+            loaded = true;
+            await renderFolder(node.path, children, state);
         }
-        
-        ul.appendChild(li);
+        li.classList.toggle('folder-open', open);
+        children.style.height = open ? 'auto' : '0';
+    };
+
+    li.addEventListener('click', (e) => {
+        // 只响应本文件夹标题的点击（不在本文件夹子项容器内），子文件夹的点击不冒泡到上层文件夹
+        if (children.contains(e.target)) return;
+        e.stopPropagation();
+        const open = !li.classList.contains('folder-open');
+        saveFolderState(node.path, open);
+        toggle(open).catch(error => console.error('Error loading folder:', error));
     });
-    
-    parentEl.appendChild(ul);
+
+    if (state[node.path]) {
+        toggle(true).catch(error => console.error('Error loading folder:', error));
+    }
+    return li;
 }
 
-function initTreeInteractions() {
-    // 文件夹展开/折叠功能
-    document.querySelectorAll('.folder-item').forEach(folder => {
-        folder.addEventListener('click', (e) => {
-            if (e.target.closest('.file-item')) return;
-            
-            e.stopPropagation();
-            folder.classList.toggle('folder-open');
-            
-            const children = folder.querySelector('.folder-children');
-            if (children) {
-                if (folder.classList.contains('folder-open')) {
-                    children.style.height = children.scrollHeight + 'px';
-                } else {
-                    children.style.height = '0';
-                }
-            }
-        });
+// 渲染文件夹的子项，next_cursor 不为空时在末尾提供"加载更多"
+async function renderFolder(path, parentEl, state, cursor = null, ul = null) {
+    const page = await fetchFolder(path, cursor);
+    if (!ul) {
+        ul = document.createElement('ul');
+        ul.className = 'tree-list';
+        parentEl.appendChild(ul);
+    }
+    page.items.forEach(node => {
+        ul.appendChild(node.isFolder ? createFolderItem(node, state) : createFileItem(node));
     });
-    
-    // 移动端导航切换
-    const mobileNavToggle = document.getElementById('mobileNavToggle');
-    const navSidebar = document.querySelector('.nav-sidebar');
-    
-    if (mobileNavToggle && navSidebar) {
-        mobileNavToggle.addEventListener('click', () => {
-            navSidebar.classList.toggle('show');
-        });
-        
-        // 点击内容区域关闭导航
-        document.querySelector('.content').addEventListener('click', () => {
-            if (window.innerWidth <= 768) {
-                navSidebar.classList.remove('show');
-            }
+
+    if (page.next_cursor) {
+        const more = document.createElement('li');
+        more.className = 'tree-load-more';
+        const button = document.createElement('button');
+        button.type = 'button';
+        button.textContent = `加载更多（${page.total - ul.querySelectorAll(':scope > li:not(.tree-load-more)').length}）`;
+        button.addEventListener('click', async (e) => {
+            e.stopPropagation();
+            more.remove();
+            await renderFolder(path, parentEl, state, page.next_cursor, ul);
         });
+        more.appendChild(button);
+        ul.appendChild(more);
     }
-    
-    // 记住文件夹展开状态
-    const saveTreeState = () => {
-        const state = {};
-        document.querySelectorAll('.folder-item').forEach(folder => {
-            const path = getFolderPath(folder);
-            state[path] = folder.classList.contains('folder-open');
-        });
-        localStorage.setItem('treeState', JSON.stringify(state));
-    };
-    
-    // 恢复文件夹展开状态
-    const restoreTreeState = () => {
-        try {
-            const state = JSON.parse(localStorage.getItem('treeState')) || {};
-            document.querySelectorAll('.folder-item').forEach(folder => {
-                const path = getFolderPath(folder);
-                if (state[path]) {
-                    folder.classList.add('folder-open');
-                    const children = folder.querySelector('.folder-children');
-                    if (children) {
-                        children.style.height = children.scrollHeight + 'px';
-                    }
-                }
-            });
-        } catch (e) {
-            console.error('Error restoring tree state:', e);
-        }
-    };
-    
-    // 获取文件夹路径
-    function getFolderPath(folder) {
-        const path = [];
-        let current = folder;
-        while (current && !current.matches('#doc-tree')) {
-            if (current.classList.contains('folder-item')) {
-                path.unshift(current.querySelector('.folder-name').textContent);
-            }
-            current = current.parentElement.closest('.folder-item');
+    return page;
+}
+
+export async function initDocTree(container = document.getElementById('doc-tree')) {
+    if (!container) return;
+    container.innerHTML = '';
+    try {
+        const page = await renderFolder('', container, loadTreeState());
+        if (!page.total) {
+            container.innerHTML = '<div class="tree-empty">No documents found</div>';
         }
-        return path.join('/');
+    } catch (error) {
+        console.error('Error loading doc tree:', error);
     }
-    
-    // 监听文件夹状态变化
-    document.querySelectorAll('.folder-item').forEach(folder => {
-        folder.addEventListener('click', saveTreeState);
-    });
-    
-    // 初始化时恢复状态
-    restoreTreeState();
-}
\ No newline at end of file
+}
@@ -0,0 +1,87 @@
+"""
+缓存淘汰基准测试：旧版按过期时间排序淘汰 vs OrderedDict LRU
+
+多个线程并发对两种实现做读多写少的混合操作（键空间为容量的两倍，持续触发淘汰），
+在不同容量下比较总吞吐量与未命中率。旧实现每次淘汰都要排序全部条目，容量越大越慢。
+
+用法: python benchmarks/bench_cache_lru.py [线程数] [每线程操作数]
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache_service import CacheService
+
+
+class LegacyCache:
+    """旧实现：dict 存储，条目满时按 expires_at 全量排序后删除最早的 10 个（原上限 100）"""
+
+    def __init__(self, max_entries: int = 100):
+        self.MAX_ENTRIES = max_entries
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._cache:
+                item = self._cache[key]
+                if item['expires_at'] > time.time():
+                    return item['value']
+                del self._cache[key]
+            return None
+
+    def set(self, key, value, ttl=300):
+        with self._lock:
+            if len(self._cache) >= self.MAX_ENTRIES:
+                oldest = sorted(self._cache.items(), key=lambda kv: kv[1]['expires_at'])[:10]
+                for k, _ in oldest:
+                    del self._cache[k]
+            self._cache[key] = {'value': value, 'expires_at': time.time() + ttl}
+
+
+def run(cache, n_threads: int, ops: int, capacity: int, seed: int = 7):
+    """返回 (每秒操作数, 未命中率)；未命中时回填，模拟装饰器行为"""
+    body = (b'<html>' + b'x' * 4096, 200, {'Content-Type': 'text/html'})
+    keys = [f'get_note:note-{i}' for i in range(capacity * 2)]
+    misses = [0] * n_threads
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        for _ in range(ops):
+            # 访问集中在少数热点键上
+            key = keys[int(len(keys) * rng.random() ** 3)]
+            if cache.get(key) is None:
+                misses[n] += 1
+                cache.set(key, body)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return n_threads * ops / (time.perf_counter() - start), sum(misses) / (n_threads * ops)
+
+
+def main():
+    n_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+
+    lru = CacheService()
+    lru.namespace_limits = {}
+    print(f"threads={n_threads}  ops/thread={ops}")
+    for capacity in (100, 1_000, 5_000):
+        legacy = LegacyCache(capacity)
+        lru.clear()
+        lru.max_entries = capacity
+        for name, cache in (('legacy sort-on-evict', legacy), ('ordereddict lru', lru)):
+            throughput, miss_rate = run(cache, n_threads, ops, capacity)
+            print(f"capacity={capacity:5d}  {name:20s}: {throughput:10.0f} ops/s  miss={miss_rate:.1%}")
+
+
+if __name__ == '__main__':
+    main()
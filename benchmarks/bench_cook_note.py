@@ -0,0 +1,86 @@
+"""
+笔记模板渲染基准测试：逐个 str.replace vs 预解析模板一次拼接
+
+用法: python benchmarks/bench_cook_note.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.config_manager import config
+from app.services.note_service import cook_note, NOTE_BODY_CLASS, NOTE_PREVIEW_CLASS, NOTE_PUSHER_CLASS, NOTE_WIDTH_STYLE
+
+WORDS = 'note share obsidian markdown python search index vault theme folder link image'.split()
+
+
+def make_content(size: int, seed: int = 0) -> str:
+    """生成约 size 字节的笔记正文"""
+    rng = random.Random(seed)
+    blocks = []
+    total = 0
+    while total < size:
+        block = f'<div class="el-p"><p dir="auto">{" ".join(rng.choices(WORDS, k=40))}</p></div>'
+        blocks.append(block)
+        total += len(block)
+    return '\n'.join(blocks)
+
+
+def cook_legacy(data):
+    """原实现：每次读取模板，对整页依次执行十余次 replace"""
+    template = data['template']
+    with open(config.get('templates.note_template', 'template/note-template.html'), 'r', encoding='utf-8') as f:
+        html = f.read()
+    server_name = config.get('server.server_name', 'Share Note')
+    page_title = template['title'] if template['title'] else "Untitled"
+    html = html.replace('TEMPLATE_TITLE', page_title)
+    html = html.replace('TEMPLATE_OG_TITLE', f'<meta property="og:title" content="{page_title}">')
+    html = html.replace('TEMPLATE_META_DESCRIPTION',
+                        f'<meta name="description" content="{template.get("description", "")}" property="og:description">')
+    html = html.replace('TEMPLATE_WIDTH', NOTE_WIDTH_STYLE)
+    theme_css_path = '/static/theme.css' if os.path.isfile('static/theme.css') else '/assets/css/theme.css'
+    html = html.replace('TEMPLATE_CSS', theme_css_path)
+    html = html.replace('TEMPLATE_ASSETS_WEBROOT', config.get('server.server_url'))
+    html = html.replace('TEMPLATE_SERVER_NAME', server_name)
+    html = html.replace('TEMPLATE_NOTE_CONTENT', template['content'])
+    html = html.replace('TEMPLATE_BODY', NOTE_BODY_CLASS)
+    html = html.replace('TEMPLATE_PREVIEW', NOTE_PREVIEW_CLASS)
+    html = html.replace('TEMPLATE_PUSHER', NOTE_PUSHER_CLASS)
+    html = html.replace('Share Note', server_name)
+    html = html.replace('TEMPLATE_TITLE</span>', page_title + '</span>')
+    html = html.replace('TEMPLATE_SCRIPTS', '')
+    html = html.replace('TEMPLATE_ENCRYPTED_DATA', '')
+    return html
+
+
+def bench(fn, data, rounds: int):
+    tracemalloc.start()
+    fn(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best, peak
+
+
+def main():
+    for size, rounds in ((100_000, 20), (1_000_000, 5), (5_000_000, 3), (20_000_000, 1)):
+        data = {'template': {'title': 'Benchmark', 'content': make_content(size)}}
+        assert cook_legacy(data) == cook_note(data)[0]
+        mb = size / 1024 / 1024
+        legacy_time, legacy_peak = bench(cook_legacy, data, rounds)
+        compiled_time, compiled_peak = bench(cook_note, data, rounds)
+        print(f"{mb:6.2f} MiB  replace={legacy_time * 1000:8.2f} ms (peak {legacy_peak / 1024 / 1024:6.1f} MiB)  "
+              f"compiled={compiled_time * 1000:8.2f} ms (peak {compiled_peak / 1024 / 1024:6.1f} MiB)  "
+              f"speedup={legacy_time / compiled_time:4.1f}x")
+
+
+if __name__ == '__main__':
+    main()
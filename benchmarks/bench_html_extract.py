@@ -0,0 +1,77 @@
+"""
+笔记正文提取基准测试：BeautifulSoup vs 流式 HTMLParser
+
+用法: python benchmarks/bench_html_extract.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from app.utils.html_text import extract_note_text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = 'note share obsidian markdown python search index vault theme folder link image'.split()
+
+
+def make_note(size: int, seed: int = 0) -> str:
+    """用笔记模板生成约 size 字节、包含常见 Obsidian 渲染结构的 HTML"""
+    rng = random.Random(seed)
+    with open(os.path.join(ROOT, 'template', 'note-template.html'), encoding='utf-8') as f:
+        template = f.read()
+    blocks = []
+    total = 0
+    while total < size:
+        words = ' '.join(rng.choices(WORDS, k=40))
+        block = rng.choice((
+            f'<div class="el-p"><p dir="auto">{words} <strong>{words[:20]}</strong> <a href="/x">{words[:10]}</a></p></div>',
+            f'<div class="el-pre"><pre><code class="language-python">{words}\n{words}</code></pre></div>',
+            f'<div class="el-ul"><ul><li data-line="0">{words}</li><li data-line="1">{words}</li></ul></div>',
+            f'<div class="el-table"><table><tr><td>{words[:30]}</td><td>{words[30:60]}</td></tr></table></div>',
+            f'<div class="el-p"><p><img src="/notes/x/assets/abc.png" alt="img"> {words}</p></div>',
+        ))
+        blocks.append(block)
+        total += len(block)
+    return template.replace('TEMPLATE_TITLE', 'Benchmark').replace('TEMPLATE_NOTE_CONTENT', '\n'.join(blocks))
+
+
+def extract_bs4(html: str):
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.title.string.strip() if soup.title and soup.title.string else ''
+    article = soup.find('article')
+    return title, article.get_text() if article else soup.get_text()
+
+
+def bench(fn, html: str, rounds: int):
+    tracemalloc.start()
+    fn(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(html)
+        best = min(best, time.perf_counter() - start)
+    return best, peak
+
+
+def main():
+    for size, rounds in ((100_000, 10), (1_000_000, 3), (5_000_000, 1)):
+        html = make_note(size)
+        assert extract_bs4(html) == extract_note_text(html)
+        mb = len(html.encode('utf-8')) / 1024 / 1024
+        bs4_time, bs4_peak = bench(extract_bs4, html, rounds)
+        stream_time, stream_peak = bench(extract_note_text, html, rounds)
+        print(f"{mb:6.2f} MiB  bs4={mb / bs4_time:6.2f} MiB/s (peak {bs4_peak / 1024 / 1024:6.1f} MiB)  "
+              f"stream={mb / stream_time:6.2f} MiB/s (peak {stream_peak / 1024 / 1024:6.1f} MiB)  "
+              f"speedup={bs4_time / stream_time:4.1f}x")
+
+
+if __name__ == '__main__':
+    main()
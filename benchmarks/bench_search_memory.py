@@ -0,0 +1,126 @@
+"""
+搜索索引内存基准测试：旧版 dict 倒排表 vs 整数文档 ID + 打包 array('I') 倒排表
+
+在合成的 10k 篇笔记语料上分别构建两种结构，用 tracemalloc 统计索引本身的
+内存占用（不含两者共享的正文文本），并比较多词 AND 查询延迟。
+
+用法: python benchmarks/bench_search_memory.py [笔记数]
+"""
+import itertools
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.search_service import SearchService
+
+
+def make_corpus(n_notes: int, vocab_size: int = 50_000, words_per_note: int = 400, seed: int = 1):
+    """生成 Zipf 分布的合成语料，返回与 _parse_document 相同形状的 (doc, freqs, offsets)"""
+    rng = random.Random(seed)
+    vocab = [f"w{i:05d}" for i in range(vocab_size)]
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(vocab_size)))
+    parsed = []
+    for n in range(n_notes):
+        title_words = rng.choices(vocab, cum_weights=cum_weights, k=4)
+        body_words = rng.choices(vocab, cum_weights=cum_weights, k=words_per_note)
+        freqs = Counter(body_words)
+        offsets = {}
+        pos = 0
+        for w in body_words:
+            offsets.setdefault(w, pos)
+            pos += len(w) + 1
+        for w in title_words:
+            freqs[w] += SearchService.TITLE_BOOST
+        doc = {
+            'title': ' '.join(title_words),
+            'url': f'/note-{n}',
+            'text': ' '.join(body_words),
+            'length': len(body_words) + SearchService.TITLE_BOOST * len(title_words),
+            'words': tuple(freqs),
+        }
+        parsed.append((doc, freqs, offsets))
+    return parsed
+
+
+def build_legacy(parsed):
+    """旧版结构：word -> {url: tf}，url -> doc"""
+    index, docs = {}, {}
+    for doc, freqs, _ in parsed:
+        docs[doc['url']] = doc
+        for word, tf in freqs.items():
+            index.setdefault(word, {})[doc['url']] = tf
+    return index, docs
+
+
+def legacy_and_query(index, docs, words):
+    """旧版 AND 查询：每个词构造 url 集合再求交"""
+    n = len(docs)
+    totals = None
+    for word in words:
+        postings = index.get(word, {})
+        df = len(postings)
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        scores = {url: idf * tf for url, tf in postings.items()}
+        totals = scores if totals is None else {u: s + scores[u] for u, s in totals.items() if u in scores}
+    return totals
+
+
+def measure(fn):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return result, size
+
+
+def main():
+    n_notes = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    parsed = make_corpus(n_notes)
+
+    (legacy_index, legacy_docs), legacy_bytes = measure(lambda: build_legacy(parsed))
+    built, compact_bytes = measure(lambda: SearchService._build_index(parsed))
+    index, positions, doc_table, doc_ids, doc_lengths, total_length = built
+
+    print(f"notes={n_notes}  terms={len(index)}")
+    print(f"legacy  dict postings           : {legacy_bytes / 1024 / 1024:8.1f} MiB")
+    print(f"compact array postings+positions: {compact_bytes / 1024 / 1024:8.1f} MiB  "
+          f"({legacy_bytes / compact_bytes:.1f}x smaller)")
+
+    # 组装一个只含索引状态的对象，复用 SearchService 的查询路径
+    svc = SimpleNamespace(_index=index, _terms=sorted(index), _doc_table=doc_table,
+                          _doc_ids=doc_ids, _doc_lengths=doc_lengths,
+                          _total_length=total_length,
+                          **{name: getattr(SearchService, name) for name in
+                             ('BM25_K1', 'BM25_B', 'TF_BITS', 'TF_MASK', 'KEY_MASK')})
+    rng = random.Random(3)
+    common = [f"w{i:05d}" for i in range(50)]
+    rare = [f"w{i:05d}" for i in range(1000, 5000)]
+    queries = [[rng.choice(common), rng.choice(rare)] for _ in range(200)]
+
+    def compact_and_query(words):
+        lists = sorted((index[w] for w in words if w in index), key=len)
+        candidates = lists[0]
+        for postings in lists[1:]:
+            candidates = SearchService._intersect(candidates, postings)
+        for w in words:
+            SearchService._score_candidates(svc, [w], candidates)
+
+    for name, fn in (('legacy ', lambda q: legacy_and_query(legacy_index, legacy_docs, q)),
+                     ('compact', compact_and_query)):
+        start = time.perf_counter()
+        for q in queries:
+            fn(q)
+        print(f"{name} AND query (common+rare): {(time.perf_counter() - start) / len(queries) * 1e3:7.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+搜索前缀扩展基准测试：线性扫描 vs 有序词典二分查找
+
+用法: python benchmarks/bench_search_prefix.py
+"""
+import os
+import random
+import string
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.search_service import SearchService
+
+
+def make_vocabulary(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    vocab = set()
+    while len(vocab) < size:
+        vocab.add(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12))))
+    return {word: [] for word in vocab}
+
+
+def linear_expand(index, prefix):
+    """旧实现：遍历全部词条做 startswith"""
+    return [w for w in index if w.startswith(prefix)]
+
+
+def bench(fn, queries, rounds: int = 5) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for q in queries:
+            fn(q)
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1e6
+
+
+def main():
+    rng = random.Random(7)
+    for size in (10_000, 100_000):
+        index = make_vocabulary(size)
+        fake = SimpleNamespace(_terms=sorted(index))
+        queries = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 4))) for _ in range(200)]
+
+        for q in queries:
+            assert sorted(linear_expand(index, q)) == SearchService._expand_prefix(fake, q)
+
+        linear_us = bench(lambda q: linear_expand(index, q), queries)
+        bisect_us = bench(lambda q: SearchService._expand_prefix(fake, q), queries)
+        print(f"vocab={size:>7}  linear={linear_us:9.1f} µs/query  "
+              f"bisect={bisect_us:7.1f} µs/query  speedup={linear_us / bisect_us:6.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ set -e
 # 创建必要的目录（如果还不存在）
 mkdir -p /sharenote-server/logs
 mkdir -p /sharenote-server/static
+mkdir -p /sharenote-server/data
 
 # 检查是否有必要的配置文件
 if [ ! -f "/sharenote-server/config/settings.toml" ]; then
@@ -7,6 +7,13 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from app.routes import register_routes
 from app.services.file_watcher import file_watcher
+from app.services.search_service import search_service
+from app.services.invalidation_bus import invalidation_bus
+from app.services.cache_service import cache_service
+from app.services.compression_service import compression_service
+from app.services.file_manifest import file_manifest
+from app.services.note_manifest import note_manifest
+from app.services.asset_store import asset_store
 
 # 配置日志,简化配置减少内存
 DEBUG = config.get('server.debug', False)
@@ -39,8 +46,9 @@ if not config.SERVER_URL:
     logging.error('server.server_url not set in settings.toml')
     sys.exit(1)
 
-# 初始化应用
-flask_app = Flask(__name__)
+# 初始化应用（不使用 Flask 内置的 /static 路由，static 目录由 views.serve_static 按文件清单提供，
+# 包括访问校验与预压缩版本）
+flask_app = Flask(__name__, static_folder=None)
 
 # 配置 CORS
 allowed_origins = config.get('security.allowed_origins', ['*'])
@@ -92,9 +100,38 @@ def internal_error(e):
     logging.error(f"Internal server error: {e}")
     return jsonify({'error': 'Internal Server Error', 'message': 'An unexpected error occurred'}), 500
 
+# 每个请求前应用其他工作进程发布的缓存/索引失效事件
+@flask_app.before_request
+def sync_invalidations():
+    invalidation_bus.poll()
+
 # 注册路由
 register_routes(flask_app, limiter)
 
+# 预加载搜索索引快照（preload_app 时在主进程执行，工作进程 fork 后共享映射）
+search_service.warm_up('static')
+
+# 映射失效通知总线（工作进程 fork 后继承读取位置）
+invalidation_bus.open()
+
+# 定期清理过期缓存（工作进程 fork 后各自重新启动清理线程）
+cache_service.start_sweeper()
+
+# 加载资源存储（首次运行时把笔记目录中的资源并入存储），并定期处理到期的延迟删除
+asset_store.load()
+asset_store.start_purger()
+
+# 建立可访问文件清单与笔记清单（preload 时在主进程执行，工作进程 fork 后继承）
+file_manifest.build()
+note_manifest.load('static')
+
+# 后台补齐缺失或过期的预压缩文件，完成后刷新各进程的文件清单
+def refresh_manifest(file_path):
+    file_manifest.refresh(file_path, broadcast=True)
+
+compression_service.precompress_tree('assets', refresh_manifest)
+compression_service.precompress_tree('static', refresh_manifest)
+
 # 启动文件监控(可选)
 if not config.get('server.disable_file_watch', False):
     file_watcher.start('static')
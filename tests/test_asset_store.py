@@ -0,0 +1,143 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+from app.services.asset_store import AssetStore
+from app.services.invalidation_bus import invalidation_bus
+
+HASH_A = 'aa' + '1' * 38
+HASH_B = 'bb' + '2' * 38
+
+class TestAssetStore(unittest.TestCase):
+    def setUp(self):
+        """每个测试前的设置：存储目录、引用索引与笔记目录都位于临时目录"""
+        self.store = AssetStore()
+        self.saved = dict(self.store.__dict__)
+        self.test_dir = tempfile.mkdtemp()
+        self.notes_dir = os.path.join(self.test_dir, 'static', 'notes')
+        self.store.root = os.path.join(self.test_dir, 'static', 'objects')
+        self.store._file_path = os.path.join(self.test_dir, 'data', 'assets.json')
+        self.store._loaded = False
+        # 删除资源时广播文件清单变更，失效通知总线同样指向临时目录
+        patcher = patch.dict(invalidation_bus.__dict__, {
+            '_file_path': os.path.join(self.test_dir, 'data', 'invalidation.bus'), '_mm': None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """每个测试后的清理"""
+        self.store.__dict__.update(self.saved)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _note_asset(self, slug, name):
+        return os.path.join(self.notes_dir, slug, 'assets', name)
+
+    def test_put_and_link(self):
+        """测试相同内容只保存一份，笔记资源为指向对象的硬链接"""
+        self.store.load(self.notes_dir)
+        path = self.store.put(HASH_A, b'image')
+        self.assertEqual(path, os.path.join(self.store.root, 'aa', HASH_A))
+        self.assertEqual(self.store.put(HASH_A, b'image'), path)
+
+        first, second = self._note_asset('n1', HASH_A + '.png'), self._note_asset('n2', HASH_A + '.png')
+        self.assertTrue(self.store.link(HASH_A, first))
+        self.assertTrue(self.store.link(HASH_A, second))
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertTrue(os.path.samefile(first, path))
+
+        self.assertIsNone(self.store.lookup(HASH_B))
+        self.assertFalse(self.store.link(HASH_B, self._note_asset('n1', HASH_B + '.png')))
+        self.assertIsNone(self.store.lookup('../etc'))
+        with self.assertRaises(ValueError):
+            self.store.object_path('../etc')
+
+    def test_note_assets(self):
+        """测试资源清单求差集，移除的资源延迟删除，对象在最后一篇引用它的笔记释放后删除"""
+        self.store.load(self.notes_dir)
+        self.store.delete_delay = 60
+        path = self.store.put(HASH_A, b'image')
+        self.store.put(HASH_B, b'other')
+        name_a, name_b = HASH_A + '.png', HASH_B + '.png'
+        for slug, name in (('n1', name_a), ('n1', name_b), ('n2', name_a)):
+            self.store.link(self.store.asset_hash(name), self._note_asset(slug, name))
+
+        self.assertEqual(self.store.set_note_assets('n1', [name_a, name_b]), ({name_a, name_b}, set()))
+        self.store.acquire('n2', [name_a])
+        self.assertEqual(self.store.note_assets('n2'), {name_a})
+        self.assertEqual(self.store.stats()['references'], 3)
+
+        # 再次发布：只有差集中的资源进入删除队列，到期前不删除
+        self.assertEqual(self.store.set_note_assets('n1', [name_b]), (set(), {name_a}))
+        self.assertEqual(self.store.purge(), set())
+        self.assertTrue(os.path.exists(self._note_asset('n1', name_a)))
+        # 到期后删除链接，对象仍被 n2 引用
+        self.assertEqual(self.store.purge(now=time.time() + 120), set())
+        self.assertFalse(os.path.exists(self._note_asset('n1', name_a)))
+        self.assertTrue(os.path.exists(path))
+
+        # 到期前重新引用的资源保留
+        self.assertEqual(self.store.release('n1'), {name_b})
+        self.store.acquire('n1', [name_b])
+        self.store.purge(now=time.time() + 120)
+        self.assertTrue(os.path.exists(self._note_asset('n1', name_b)))
+
+        # 最后一篇引用的笔记删除后，对象在到期时删除
+        self.assertEqual(self.store.release('n2'), {name_a})
+        self.assertEqual(self.store.purge(now=time.time() + 120), {HASH_A})
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(self.store.lookup(HASH_A))
+
+        with open(self.store._file_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {'notes': {'n1': [name_b]}, 'pending': []})
+
+    def test_migrate(self):
+        """测试首次加载时把笔记目录中的资源并入存储，重复内容合并为同一对象"""
+        for slug in ('n1', 'n2'):
+            file_path = self._note_asset(slug, HASH_A + '.png')
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as f:
+                f.write(b'image')
+        with open(self._note_asset('n1', 'readme.txt'), 'w') as f:
+            f.write('not an asset')
+
+        self.store.load(self.notes_dir)
+        path = self.store.lookup(HASH_A)
+        self.assertIsNotNone(path)
+        self.assertTrue(os.path.samefile(path, self._note_asset('n1', HASH_A + '.png')))
+        self.assertTrue(os.path.samefile(path, self._note_asset('n2', HASH_A + '.png')))
+        self.assertEqual(self.store.note_assets('n1'), {HASH_A + '.png'})
+        self.assertEqual(self.store.note_assets('n2'), {HASH_A + '.png'})
+
+    def test_purger(self):
+        """测试后台清理线程按间隔处理到期的延迟删除"""
+        self.store.load(self.notes_dir)
+        self.store.delete_delay = 0
+        self.store.purge_interval = 0.05
+        self.store._purger = None
+        path = self.store.put(HASH_A, b'image')
+        name = HASH_A + '.png'
+        self.store.link(HASH_A, self._note_asset('n1', name))
+        self.store.acquire('n1', [name])
+        # 直接写入到期的队列项，模拟其他工作进程发布后留下的删除
+        with self.store._file_lock():
+            data = self.store._current_data()
+            data['notes'].pop('n1')
+            data['pending'].append([time.time(), 'n1', name])
+            self.store._write_file(data)
+
+        self.store.start_purger()
+        try:
+            deadline = time.time() + 2
+            while os.path.exists(path) and time.time() < deadline:
+                time.sleep(0.02)
+        finally:
+            self.store.stop_purger()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(self._note_asset('n1', name)))
+        self.assertEqual(self.store.stats()['pending_deletes'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
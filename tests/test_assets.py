@@ -0,0 +1,68 @@
+import unittest
+import os
+import hashlib
+import shutil
+import tempfile
+from unittest.mock import patch
+from flask import Flask
+from app.config.config_manager import config
+from app.routes.api import assets
+from app.services.asset_store import AssetStore
+
+HASH = 'cc' + '3' * 38
+
+class TestAssets(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__, static_folder=None)
+        cls.app.register_blueprint(assets.init_routes())
+
+    def setUp(self):
+        """每个测试前的设置：上传写入临时目录，资源存储也位于临时目录"""
+        self.store = AssetStore()
+        self.saved = dict(self.store.__dict__)
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        self.store.root = os.path.join(self.test_dir, 'static', 'objects')
+        self.store._file_path = os.path.join(self.test_dir, 'data', 'assets.json')
+        self.store._loaded = False
+        self.store.load(os.path.join(self.test_dir, 'static', 'notes'))
+        self.client = self.app.test_client()
+        nonce = 'nonce'
+        self.headers = {
+            'x-sharenote-nonce': nonce,
+            'x-sharenote-key': hashlib.sha256((nonce + config.get('security.secret_api_key')).encode()).hexdigest(),
+            'x-sharenote-filetype': 'png',
+        }
+
+    def tearDown(self):
+        """每个测试后的清理"""
+        os.chdir(self.cwd)
+        self.store.__dict__.update(self.saved)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    @patch('app.routes.api.assets.publish_file')
+    def test_upload_validation(self, mock_publish):
+        """测试非法哈希与 note_id 在写入前返回 400"""
+        for name, note_id in (('abc', None), ('zz', None), (HASH, '../..'), (HASH, 'Note')):
+            headers = dict(self.headers, **{'x-sharenote-hash': name})
+            if note_id:
+                headers['x-sharenote-note-id'] = note_id
+            self.assertEqual(self.client.post('/v1/file/upload', data=b'img', headers=headers).status_code, 400)
+        self.assertIsNone(self.store.lookup(HASH))
+        mock_publish.assert_not_called()
+
+    @patch('app.routes.api.assets.publish_file')
+    def test_upload_to_note(self, mock_publish):
+        """测试带 note_id 的上传链接到笔记目录并记入该笔记的资源清单"""
+        headers = dict(self.headers, **{'x-sharenote-hash': HASH, 'x-sharenote-note-id': 'n1'})
+        response = self.client.post('/v1/file/upload', data=b'img', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        file_path = os.path.join('static', 'notes', 'n1', 'assets', HASH + '.png')
+        self.assertTrue(os.path.samefile(file_path, self.store.lookup(HASH)))
+        self.assertEqual(self.store.note_assets('n1'), {HASH + '.png'})
+        mock_publish.assert_called_once_with(file_path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+import os
+import threading
 import time
-from app.services.cache_service import CacheService, cache
+from app.services.cache_service import CacheService, cache, cache_key
 
 class TestCacheService(unittest.TestCase):
     def setUp(self):
@@ -81,5 +83,202 @@ class TestCacheService(unittest.TestCase):
         self.assertEqual(result3, 'test_result')
         self.assertEqual(call_count, 2)  # 计数器应该增加
 
+    def test_lru_eviction(self):
+        """测试超出条目数上限时淘汰最久未使用的条目"""
+        saved = self.cache_service.max_entries
+        self.cache_service.max_entries = 3
+        try:
+            for key in ('a', 'b', 'c'):
+                self.cache_service.set(key, key)
+            self.cache_service.get('a')      # a 变为最近使用
+            self.cache_service.set('d', 'd')  # 淘汰 b
+            self.assertIsNone(self.cache_service.get('b'))
+            self.assertEqual([self.cache_service.get(k) for k in ('a', 'c', 'd')], ['a', 'c', 'd'])
+        finally:
+            self.cache_service.max_entries = saved
+
+    def test_byte_budget(self):
+        """测试按字节预算淘汰，且超过预算的单个值不缓存"""
+        saved = self.cache_service.max_bytes
+        self.cache_service.max_bytes = 3000
+        try:
+            self.cache_service.set('page:1', (b'x' * 1000, 200, {}))
+            self.cache_service.set('page:2', (b'x' * 1000, 200, {}))
+            self.cache_service.set('page:3', (b'x' * 1000, 200, {}))
+            self.assertIsNone(self.cache_service.get('page:1'))
+            self.assertIsNotNone(self.cache_service.get('page:3'))
+            self.assertLessEqual(self.cache_service._bytes, 3000)
+
+            self.cache_service.set('page:big', b'x' * 5000)
+            self.assertIsNone(self.cache_service.get('page:big'))
+            self.assertIsNotNone(self.cache_service.get('page:3'))
+        finally:
+            self.cache_service.max_bytes = saved
+
+    def test_namespace_limit(self):
+        """测试命名空间条目数上限只淘汰该命名空间内的条目"""
+        saved = self.cache_service.namespace_limits
+        self.cache_service.namespace_limits = {'get_note': 2}
+        try:
+            self.cache_service.set('index', 'home')
+            for i in range(3):
+                self.cache_service.set(f'get_note:{i}', i)
+            self.assertIsNone(self.cache_service.get('get_note:0'))
+            self.assertEqual(self.cache_service.get('get_note:2'), 2)
+            self.assertEqual(self.cache_service.get('index'), 'home')
+        finally:
+            self.cache_service.namespace_limits = saved
+
+    def test_invalidate_tag(self):
+        """测试按标签失效只删除带该标签的条目，且装饰器与手动失效使用同一键"""
+        call_count = 0
+
+        @cache(ttl=60, tags=lambda nid: [f'note:{nid}'])
+        def get_page(nid):
+            nonlocal call_count
+            call_count += 1
+            return f'page {nid}'
+
+        get_page(nid='foo')
+        get_page(nid='bar')
+        self.assertEqual(self.cache_service.get(cache_key('get_page', nid='foo')), 'page foo')
+
+        self.assertEqual(self.cache_service.invalidate_tag('note:foo'), 1)
+        self.assertIsNone(self.cache_service.get(cache_key('get_page', nid='foo')))
+        self.assertEqual(self.cache_service.get(cache_key('get_page', nid='bar')), 'page bar')
+
+        get_page(nid='foo')
+        get_page(nid='bar')
+        self.assertEqual(call_count, 3)
+        self.assertEqual(self.cache_service.invalidate_tag('unknown'), 0)
+
+    def test_single_flight(self):
+        """测试 single_flight 模式下并发未命中只计算一次，其余线程得到同一结果"""
+        call_count = 0
+        started = threading.Event()
+
+        @cache(ttl=60, single_flight=True)
+        def slow_stats():
+            nonlocal call_count
+            call_count += 1
+            started.set()
+            time.sleep(0.2)
+            return {'total': 42}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(slow_stats()))
+        leader.start()
+        started.wait(1)
+        waiters = [threading.Thread(target=lambda: results.append(slow_stats())) for _ in range(8)]
+        for t in waiters:
+            t.start()
+        for t in [leader] + waiters:
+            t.join()
+
+        self.assertEqual(call_count, 1)
+        self.assertEqual(results, [{'total': 42}] * 9)
+        self.assertEqual(self.cache_service._flights, {})
+
+    def test_single_flight_timeout(self):
+        """测试等待超时后自行计算"""
+        calls = []
+        started = threading.Event()
+
+        @cache(ttl=60, single_flight=True, wait_timeout=0.05)
+        def slow_value():
+            calls.append(1)
+            started.set()
+            time.sleep(0.3)
+            return 'done'
+
+        leader = threading.Thread(target=slow_value)
+        leader.start()
+        started.wait(1)
+        self.assertEqual(slow_value(), 'done')
+        leader.join()
+        self.assertEqual(len(calls), 2)
+
+    def test_stale_while_revalidate(self):
+        """测试过期后在 stale_ttl 内先返回旧值，并只触发一次后台刷新"""
+        calls = []
+
+        @cache(ttl=1, stale_ttl=30)
+        def versioned():
+            calls.append(1)
+            time.sleep(0.1)
+            return len(calls)
+
+        self.assertEqual(versioned(), 1)
+        time.sleep(1.1)
+        before = self.cache_service.stats()
+        self.assertIsNone(self.cache_service.get(cache_key('versioned')))
+        # 未返回旧值的读取计为未命中
+        after = self.cache_service.stats()
+        self.assertEqual(after['stale_hits'], before['stale_hits'])
+        self.assertEqual(after['misses'], before['misses'] + 1)
+        self.assertEqual(versioned(), 1)
+        self.assertEqual(self.cache_service.stats()['stale_hits'], before['stale_hits'] + 1)
+        self.assertEqual(versioned(), 1)
+
+        deadline = time.time() + 2
+        while self.cache_service.get(cache_key('versioned')) is None and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(versioned(), 2)
+        self.assertEqual(len(calls), 2)
+
+    def test_stats_and_sweeper(self):
+        """测试统计计数与后台清理线程删除未被读取的过期条目"""
+        before = self.cache_service.stats()
+        self.cache_service.set('get_note:a', 'x' * 100, ttl=0.1)
+        self.cache_service.set('index', 'home')
+        self.cache_service.get('index')
+        self.cache_service.get('missing')
+
+        stats = self.cache_service.stats()
+        self.assertEqual(stats['hits'] - before['hits'], 1)
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['namespaces'], {'get_note': 1, 'index': 1})
+        self.assertGreater(stats['bytes'], 100)
+
+        saved = self.cache_service.sweep_interval
+        self.cache_service.sweep_interval = 0.05
+        try:
+            self.cache_service.start_sweeper()
+            time.sleep(0.3)
+        finally:
+            self.cache_service.stop_sweeper()
+            self.cache_service.sweep_interval = saved
+
+        stats = self.cache_service.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['namespaces'], {'index': 1})
+        self.assertEqual(stats['expirations'] - before['expirations'], 1)
+
+    def test_lock_reset_after_fork(self):
+        """测试 fork 时其他线程持有的缓存锁在子进程中重新创建"""
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.cache_service._lock:
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                # 子进程中读写缓存不应阻塞
+                done = threading.Event()
+                worker = threading.Thread(target=lambda: (self.cache_service.set('k', 'v'), done.set()), daemon=True)
+                worker.start()
+                os._exit(0 if done.wait(2) else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        finally:
+            release.set()
+            thread.join()
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
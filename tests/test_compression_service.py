@@ -0,0 +1,57 @@
+import unittest
+import os
+import gzip
+import shutil
+import tempfile
+from app.services.compression_service import CompressionService
+
+class TestCompressionService(unittest.TestCase):
+    def setUp(self):
+        """每个测试前的设置"""
+        self.service = CompressionService()
+        self.test_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.test_dir, 'style.css')
+        with open(self.file_path, 'w') as f:
+            f.write('body { color: red; }\n' * 200)
+
+    def tearDown(self):
+        """每个测试后的清理"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_precompress_and_negotiate(self):
+        """测试生成 gzip 版本，且只在与源文件一致时视为有效"""
+        self.assertIn('gzip', self.service.precompress(self.file_path))
+        with gzip.open(self.file_path + '.gz', 'rb') as f, open(self.file_path, 'rb') as src:
+            self.assertEqual(f.read(), src.read())
+        # 已是最新时不重复压缩
+        self.assertEqual(self.service.precompress(self.file_path), [])
+
+        mtime_ns = os.stat(self.file_path).st_mtime_ns
+        self.assertEqual(self.service.fresh_variants(self.file_path, mtime_ns)['gzip'], self.file_path + '.gz')
+
+    def test_stale_variant_ignored(self):
+        """测试源文件更新后旧的压缩版本不再使用"""
+        self.service.precompress(self.file_path)
+        with open(self.file_path, 'a') as f:
+            f.write('a { color: blue; }\n')
+        os.utime(self.file_path, ns=(0, os.stat(self.file_path).st_mtime_ns + 1))
+
+        mtime_ns = os.stat(self.file_path).st_mtime_ns
+        self.assertEqual(self.service.fresh_variants(self.file_path, mtime_ns), {})
+        self.assertEqual(self.service.read_variants(self.file_path, mtime_ns), {})
+
+    def test_skips_small_and_binary_files(self):
+        """测试小文件与非文本类型不压缩"""
+        small = os.path.join(self.test_dir, 'small.css')
+        with open(small, 'w') as f:
+            f.write('a{}')
+        image = os.path.join(self.test_dir, 'image.png')
+        with open(image, 'wb') as f:
+            f.write(b'\0' * 4096)
+        self.assertEqual(self.service.precompress(small), [])
+        self.assertEqual(self.service.precompress(image), [])
+        self.assertFalse(os.path.exists(small + '.gz'))
+        self.assertFalse(os.path.exists(image + '.gz'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from app.services.file_manifest import FileManifest
+
+class TestFileManifest(unittest.TestCase):
+    def setUp(self):
+        """每个测试前的设置：在临时目录中建立清单"""
+        self.manifest = FileManifest()
+        self.saved = (dict(self.manifest._entries), self.manifest._built)
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs('static/notes/foo/assets')
+        for path, content in (('static/foo.html', '<p>foo</p>'),
+                              ('static/notes/foo/assets/a.png', 'png'),
+                              ('static/script.exe', 'exe')):
+            with open(path, 'w') as f:
+                f.write(content)
+        self.manifest.build(['static'])
+
+    def tearDown(self):
+        """每个测试后的清理"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+        self.manifest._entries, self.manifest._built = self.saved
+
+    def test_lookup(self):
+        """测试只有允许的文件类型可访问，并预先计算 MIME 类型与 ETag"""
+        entry = self.manifest.lookup('static/notes/foo/assets/a.png')
+        self.assertEqual(entry['mimetype'], 'image/png')
+        self.assertEqual(entry['size'], 3)
+        self.assertTrue(entry['etag'])
+        self.assertIsNotNone(self.manifest.lookup('static/./foo.html'))
+        self.assertIsNone(self.manifest.lookup('static/script.exe'))
+        self.assertIsNone(self.manifest.lookup('static/notes'))
+        self.assertIsNone(self.manifest.lookup('static/../static/foo.html'))
+
+    def test_refresh(self):
+        """测试刷新单个文件与整个目录"""
+        with open('static/bar.html', 'w') as f:
+            f.write('<p>bar</p>')
+        self.assertIsNone(self.manifest.lookup('static/bar.html'))
+        self.manifest.refresh('static/bar.html')
+        self.assertIsNotNone(self.manifest.lookup('static/bar.html'))
+
+        old_etag = self.manifest.lookup('static/foo.html')['etag']
+        with open('static/foo.html', 'w') as f:
+            f.write('<p>foo v2</p>')
+        self.manifest.refresh('static/foo.html')
+        self.assertNotEqual(self.manifest.lookup('static/foo.html')['etag'], old_etag)
+
+        shutil.rmtree('static/notes/foo')
+        os.remove('static/bar.html')
+        self.manifest.refresh('static/notes/foo')
+        self.manifest.refresh('static/bar.html')
+        self.assertIsNone(self.manifest.lookup('static/notes/foo/assets/a.png'))
+        self.assertIsNone(self.manifest.lookup('static/bar.html'))
+        self.assertIsNotNone(self.manifest.lookup('static/foo.html'))
+
+    def test_lock_reset_after_fork(self):
+        """测试 fork 时其他线程持有的文件清单锁在子进程中重新创建"""
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.manifest._lock:
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if self.manifest._lock.acquire(timeout=2) else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        finally:
+            release.set()
+            thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,31 @@
 import unittest
 import os
 import shutil
+import tempfile
 import time
 from unittest.mock import patch, MagicMock
 from app.services.file_watcher import FileWatcher, NoteChangeHandler
+from app.services.invalidation_bus import invalidation_bus
+from app.services.note_manifest import note_manifest
+from app.services.search_service import search_service
+
+def use_temp_data_dir(test):
+    """变更处理会写入笔记清单、索引快照锁与失效通知总线：指向临时数据目录，测试结束后恢复"""
+    data_dir = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, data_dir, True)
+    for obj, values in ((note_manifest, {'_file_path': os.path.join(data_dir, 'notes.json')}),
+                        (search_service, {'_snapshot_dir': os.path.join(data_dir, 'search')}),
+                        (invalidation_bus, {'_file_path': os.path.join(data_dir, 'invalidation.bus'), '_mm': None})):
+        patcher = patch.dict(obj.__dict__, values)
+        patcher.start()
+        test.addCleanup(patcher.stop)
 
 class TestFileWatcher(unittest.TestCase):
     def setUp(self):
         """每个测试前的设置"""
         self.test_dir = 'test_static'
         os.makedirs(self.test_dir, exist_ok=True)
+        use_temp_data_dir(self)
         self.file_watcher = FileWatcher()
         
     def tearDown(self):
@@ -91,9 +107,12 @@ class TestNoteChangeHandler(unittest.TestCase):
         self.handler = NoteChangeHandler()
         self.test_dir = 'test_static'
         os.makedirs(self.test_dir, exist_ok=True)
+        use_temp_data_dir(self)
         
     def tearDown(self):
         """每个测试后的清理"""
+        # 处理尚在静默窗口内的变更，避免计时器在测试结束后触发
+        self.handler.flush()
         if os.path.exists(self.test_dir):
             shutil.rmtree(self.test_dir)
     
@@ -139,5 +158,44 @@ class TestNoteChangeHandler(unittest.TestCase):
         # 验证没有处理目录变更
         mock_logging.assert_not_called()
 
+    @patch('app.services.note_manifest.note_manifest.reload')
+    @patch('app.services.note_manifest.note_manifest.is_current', return_value=False)
+    @patch('app.services.note_service.invalidate_note')
+    def test_debounce_coalesces_events(self, mock_invalidate, mock_current, mock_reload):
+        """测试静默窗口内的事件按路径去重并合并为一次处理"""
+        handler = NoteChangeHandler(watch_path=self.test_dir, quiet_window=0.05)
+        note_a = os.path.join(self.test_dir, 'a.html')
+        note_b = os.path.join(self.test_dir, 'b.html')
+
+        for path in (note_a, note_b, note_a, note_a):
+            event = MagicMock(is_directory=False, src_path=path)
+            handler.on_modified(event)
+        handler.on_moved(MagicMock(is_directory=False, src_path=note_b + '.tmp', dest_path=note_b))
+        mock_invalidate.assert_not_called()
+
+        time.sleep(0.3)
+        self.assertEqual(sorted(call.args[0] for call in mock_invalidate.call_args_list), [note_a, note_b])
+
+        # 窗口结束后的新事件开启新的变更集
+        handler.on_deleted(MagicMock(is_directory=False, src_path=note_a))
+        handler.flush()
+        self.assertEqual(mock_invalidate.call_count, 3)
+        mock_invalidate.assert_called_with(note_a, self.test_dir)
+
+    @patch('app.services.note_manifest.note_manifest.reload')
+    @patch('app.services.note_service.invalidate_note')
+    def test_skip_changes_already_applied(self, mock_invalidate, mock_reload):
+        """测试文件状态与笔记清单一致的变更（接口发布时已处理）被跳过"""
+        handler = NoteChangeHandler(watch_path=self.test_dir, quiet_window=0.05)
+        published = os.path.join(self.test_dir, 'published.html')
+        edited = os.path.join(self.test_dir, 'edited.html')
+        with patch('app.services.note_manifest.note_manifest.is_current',
+                   side_effect=lambda file_path, path: file_path == published):
+            handler.on_modified(MagicMock(is_directory=False, src_path=published))
+            handler.on_modified(MagicMock(is_directory=False, src_path=edited))
+            handler.flush()
+        mock_reload.assert_called_once()
+        mock_invalidate.assert_called_once_with(edited, self.test_dir)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
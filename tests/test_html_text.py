@@ -0,0 +1,53 @@
+import unittest
+import os
+import shutil
+from app.utils.html_text import extract_note_text, extract_note_file
+
+class TestHtmlText(unittest.TestCase):
+    def test_title_and_article(self):
+        """测试提取标题与 article 正文"""
+        html = """
+        <html>
+            <head><title> 测试 &amp; 标题 </title><style>.a { color: red; }</style></head>
+            <body><nav>导航</nav><article>正文<script>var x = 1;</script> &lt;内容&gt;<!-- 注释 --></article></body>
+        </html>
+        """
+        title, text = extract_note_text(html)
+        self.assertEqual(title, '测试 & 标题')
+        self.assertEqual(text, '正文 <内容>')
+
+    def test_without_article(self):
+        """测试没有 article 时取整个文档文本"""
+        title, text = extract_note_text('<html><head><title>T</title></head><body><p>hello <b>world</b></p></body></html>')
+        self.assertEqual(title, 'T')
+        self.assertIn('hello world', text)
+        self.assertIn('T', text)
+
+    def test_nested_article_and_whitespace(self):
+        """测试嵌套 article、只取第一个 article，以及空白折叠"""
+        html = '<article>a\n   <pre>  keep  </pre>\n   <article>b</article></article><article>c</article>'
+        title, text = extract_note_text(html)
+        self.assertEqual(title, '')
+        self.assertEqual(text, 'a\n     keep  \nb')
+
+    def test_svg_title_ignored(self):
+        """测试只取第一个 title 元素"""
+        html = '<title>Page</title><article><svg><title>icon</title></svg>body</article>'
+        self.assertEqual(extract_note_text(html), ('Page', 'iconbody'))
+
+    def test_extract_file_in_chunks(self):
+        """测试分块读取文件"""
+        test_dir = 'test_static'
+        os.makedirs(test_dir, exist_ok=True)
+        try:
+            path = os.path.join(test_dir, 'big.html')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('<title>Big</title><article>' + '<p>word</p>' * 20000 + '</article><footer>x</footer>')
+            title, text = extract_note_file(path)
+            self.assertEqual(title, 'Big')
+            self.assertEqual(text, 'word' * 20000)
+        finally:
+            shutil.rmtree(test_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import shutil
+import tempfile
+import multiprocessing
+from unittest.mock import patch, MagicMock
+from app.services.invalidation_bus import InvalidationBus
+
+class TestInvalidationBus(unittest.TestCase):
+    def setUp(self):
+        """每个测试前的设置：总线映射到临时目录中的新文件"""
+        self.bus = InvalidationBus()
+        self.data_dir = tempfile.mkdtemp()
+        self.saved = (self.bus._file_path, self.bus._capacity, self.bus._mm, self.bus._seen,
+                      self.bus._enabled, dict(self.bus._handlers), list(self.bus._resync_handlers))
+        self.bus._file_path = os.path.join(self.data_dir, 'invalidation.bus')
+        self.bus._capacity = 8
+        self.bus._mm = None
+        self.bus._enabled = True
+        self.bus._resync_handlers = []
+        self.handler = MagicMock()
+        self.bus.subscribe('test', self.handler)
+        self.bus.open()
+
+    def tearDown(self):
+        """每个测试后的清理"""
+        self.bus._mm.close()
+        (self.bus._file_path, self.bus._capacity, self.bus._mm, self.bus._seen,
+         self.bus._enabled, self.bus._handlers, self.bus._resync_handlers) = self.saved
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def publish_from_other_process(self, *fields):
+        with patch('os.getpid', return_value=os.getpid() + 1):
+            self.bus.publish('test', *fields)
+
+    def test_poll_dispatches_events_from_other_processes(self):
+        """测试只处理其他进程发布的事件"""
+        self.assertEqual(self.bus.poll(), 0)
+
+        self.publish_from_other_process('static/a.html', 'static')
+        self.bus.publish('test', 'own event')
+        self.assertEqual(self.bus.poll(), 2)
+        self.handler.assert_called_once_with('static/a.html', 'static')
+
+        # 已处理的事件不会重复处理
+        self.assertEqual(self.bus.poll(), 0)
+        self.handler.assert_called_once()
+
+    def test_overrun_triggers_resync(self):
+        """测试落后超过环形槽数时执行全量失效"""
+        resync = MagicMock()
+        self.bus.on_resync(resync)
+        for i in range(self.bus._capacity + 1):
+            self.publish_from_other_process(f'key{i}')
+
+        self.bus.poll()
+        resync.assert_called_once()
+        self.handler.assert_not_called()
+
+    def test_events_cross_fork(self):
+        """测试 fork 出的子进程发布的事件对父进程可见"""
+        ctx = multiprocessing.get_context('fork')
+        child = ctx.Process(target=self.bus.publish, args=('test', 'get_note:foo'))
+        child.start()
+        child.join()
+
+        self.assertEqual(self.bus.poll(), 1)
+        self.handler.assert_called_once_with('get_note:foo')
+
+if __name__ == '__main__':
+    unittest.main()
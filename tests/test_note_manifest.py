@@ -0,0 +1,163 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+from app.services.note_manifest import NoteManifest
+
+class TestNoteManifest(unittest.TestCase):
+    def setUp(self):
+        """每个测试前的设置：清单与笔记目录都位于临时目录"""
+        self.manifest = NoteManifest()
+        self.saved = dict(self.manifest.__dict__)
+        self.test_dir = tempfile.mkdtemp()
+        self.notes_dir = os.path.join(self.test_dir, 'static')
+        os.makedirs(self.notes_dir)
+        self.manifest._file_path = os.path.join(self.test_dir, 'data', 'notes.json')
+        self.manifest._path = None
+        self.manifest._tree_json = None
+        self._write('a1', '<title>Folder/Alpha</title>')
+        self._write('b2', '<title>Beta</title>')
+
+    def tearDown(self):
+        """每个测试后的清理"""
+        self.manifest.__dict__.update(self.saved)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _write(self, slug, content):
+        file_path = os.path.join(self.notes_dir, slug + '.html')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return file_path
+
+    def test_load_and_tree(self):
+        """测试加载后持久化元数据，文档树由清单生成"""
+        self.manifest.load(self.notes_dir)
+        with open(self.manifest._file_path, encoding='utf-8') as f:
+            persisted = json.load(f)
+        self.assertEqual(persisted['notes']['a1']['folder'], 'Folder')
+        self.assertEqual(persisted['notes']['b2']['title'], 'Beta')
+
+        token, body = self.manifest.tree_json(self.notes_dir)
+        self.assertEqual(token, self.manifest.token)
+        tree = json.loads(body)
+        self.assertEqual(tree[0], {'title': 'Beta', 'url': '/b2', 'isFolder': False})
+        self.assertEqual(tree[1]['title'], 'Folder')
+        self.assertEqual(tree[1]['children'][0], {'title': 'Alpha', 'url': '/a1', 'isFolder': False})
+
+        # 清单未变化时不读取任何笔记文件
+        with patch.object(NoteManifest, '_read_entry') as read_entry:
+            self.manifest.load(self.notes_dir)
+            self.assertIs(self.manifest.tree_json(self.notes_dir), self.manifest.tree_json(self.notes_dir))
+            read_entry.assert_not_called()
+
+    def test_update(self):
+        """测试发布与删除笔记时更新清单和版本号"""
+        self.manifest.load(self.notes_dir)
+        version = self.manifest.version
+
+        with patch('app.services.note_manifest.invalidation_bus') as bus:
+            self.manifest.update(self._write('c3', '<title>Gamma</title>'), self.notes_dir)
+            bus.publish.assert_called_once_with('note_manifest')
+        self.assertEqual(self.manifest.version, version + 1)
+        self.assertIn('"/c3"', self.manifest.tree_json(self.notes_dir)[1].decode())
+
+        os.remove(os.path.join(self.notes_dir, 'a1.html'))
+        with patch('app.services.note_manifest.invalidation_bus'):
+            self.manifest.update(os.path.join(self.notes_dir, 'a1.html'), self.notes_dir)
+        self.assertNotIn('a1', [note['slug'] for note in self.manifest.notes(self.notes_dir)])
+
+        # 已处理的发布与删除与文件状态一致，外部修改则不一致
+        self.assertTrue(self.manifest.is_current(os.path.join(self.notes_dir, 'c3.html'), self.notes_dir))
+        self.assertTrue(self.manifest.is_current(os.path.join(self.notes_dir, 'a1.html'), self.notes_dir))
+        self.assertFalse(self.manifest.is_current(self._write('c3', '<title>Gamma 2</title>'), self.notes_dir))
+        self.assertFalse(self.manifest.is_current(self._write('d4', '<title>Delta</title>'), self.notes_dir))
+
+        # 其他进程启动时从持久化文件加载
+        other = object.__new__(NoteManifest)
+        other.__dict__.update(self.manifest.__dict__)
+        other._notes, other._version = {}, 0
+        other.reload()
+        self.assertEqual(sorted(other._notes), ['b2', 'c3'])
+
+    def test_delta(self):
+        """测试增量变更合并同一笔记的多次修改，标题变化列在新增中，过期或无效的版本返回全量"""
+        self.manifest.load(self.notes_dir)
+        since = self.manifest.token
+        with patch('app.services.note_manifest.invalidation_bus'):
+            self.manifest.update(self._write('c3', '<title>Gamma</title>'), self.notes_dir)
+            self.manifest.update(self._write('c3', '<title>Folder/Gamma</title>'), self.notes_dir)
+            self.manifest.update(self._write('b2', '<title>Beta 2</title>'), self.notes_dir)
+            self.manifest.update(self._write('b2', '<title>Beta 2</title><p>body</p>'), self.notes_dir)
+            os.remove(os.path.join(self.notes_dir, 'a1.html'))
+            self.manifest.update(os.path.join(self.notes_dir, 'a1.html'), self.notes_dir)
+
+        delta = self.manifest.delta(since, self.notes_dir)
+        self.assertEqual(delta['version'], self.manifest.token)
+        self.assertEqual(delta['added'], [{'slug': 'c3', 'title': 'Folder/Gamma'}, {'slug': 'b2', 'title': 'Beta 2'}])
+        self.assertNotIn('renamed', delta)
+        self.assertEqual(delta['removed'], ['a1'])
+
+        current = self.manifest.delta(self.manifest.token, self.notes_dir)
+        self.assertEqual((current['added'], current['removed']), ([], []))
+
+        for invalid in ('', 'other-1', self.manifest.token + '0'):
+            reset = self.manifest.delta(invalid, self.notes_dir)
+            self.assertTrue(reset['reset'])
+            self.assertEqual(sorted(note['slug'] for note in reset['notes']), ['b2', 'c3'])
+
+    def test_folder_page(self):
+        """测试逐层分页：先文件夹后笔记，游标翻页覆盖全部子项"""
+        for i in range(5):
+            self._write(f'n{i}', f'<title>Folder/Sub/Note {i}</title>')
+        self.manifest.load(self.notes_dir)
+
+        root = self.manifest.folder_page('', path=self.notes_dir)
+        self.assertEqual(root['total'], 2)
+        self.assertEqual(root['items'][0], {'title': 'Folder', 'isFolder': True, 'path': 'Folder', 'count': 2})
+        self.assertEqual(root['items'][1]['url'], '/b2')
+        self.assertIsNone(root['next_cursor'])
+
+        folder = self.manifest.folder_page('Folder', path=self.notes_dir)
+        self.assertEqual([item['title'] for item in folder['items']], ['Sub', 'Alpha'])
+        self.assertEqual(folder['items'][0]['count'], 5)
+
+        titles, cursor = [], None
+        while True:
+            page = self.manifest.folder_page('Folder/Sub', cursor, limit=2, path=self.notes_dir)
+            titles += [item['title'] for item in page['items']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(titles, [f'Note {i}' for i in range(5)])
+
+        self.assertIsNone(self.manifest.folder_page('Missing', path=self.notes_dir))
+        with self.assertRaises(ValueError):
+            self.manifest.folder_page('Folder', cursor='not-a-cursor', path=self.notes_dir)
+
+    def test_lock_reset_after_fork(self):
+        """测试 fork 时其他线程持有的笔记清单锁在子进程中重新创建"""
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.manifest._lock:
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if self.manifest._lock.acquire(timeout=2) else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        finally:
+            release.set()
+            thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
 import unittest
 import os
 import shutil
-from app.services.note_service import gen_short_code, slugify, organize_notes_by_folder, convert_obsidian_images
+import tempfile
+from unittest import mock
+from app.services import note_service
+from app.services.note_service import gen_short_code, slugify, organize_notes_by_folder, convert_obsidian_images, cook_note
 
 class TestNoteService(unittest.TestCase):
     def test_gen_short_code(self):
@@ -55,6 +58,11 @@ class TestNoteService(unittest.TestCase):
 
     def test_convert_obsidian_images(self):
         """测试Obsidian格式图片链接转换功能"""
+        # 转换时会创建 static/notes/<note_id>/assets，在临时目录中运行
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir, True)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(test_dir)
         note_id = "test123"
         
         # 测试基本格式转换
@@ -72,11 +80,56 @@ class TestNoteService(unittest.TestCase):
         第二张图 <img src="/static/notes/test123/assets/2.jpg" alt="图片">
         """
         self.assertEqual(convert_obsidian_images(content, note_id), expected)
-        
-        # 清理测试创建的资源目录
-        test_assets_path = 'static/notes/test123'
-        if os.path.exists(test_assets_path):
-            shutil.rmtree(test_assets_path)
+
+    def test_cook_note(self):
+        """测试模板只替换占位符，正文中的占位符与站点名称文本保持原样"""
+        content = '<p>Share Note 文档提到 TEMPLATE_BODY 与 TEMPLATE_TITLE</p>'
+        html, filename = cook_note({'template': {'title': 'Share Note 指南', 'content': content}})
+        self.assertIn(content, html)
+        self.assertIn('<title>Share Note 指南</title>', html)
+        self.assertIn('<span class="current">Share Note 指南</span>', html)
+        self.assertNotIn('TEMPLATE_NOTE_CONTENT', html)
+        self.assertEqual(filename, slugify('Share Note 指南'))
+
+    def test_cook_note_template_reload(self):
+        """测试模板文件修改后重新解析"""
+        with tempfile.TemporaryDirectory() as tmp:
+            template_path = os.path.join(tmp, 'note.html')
+            with open(template_path, 'w', encoding='utf-8') as f:
+                f.write('<h1>Share Note</h1>TEMPLATE_NOTE_CONTENT')
+            overrides = {'templates.note_template': template_path, 'server.server_name': '我的笔记'}
+            real_get = note_service.config.get
+            with mock.patch.object(note_service.config, 'get',
+                                   side_effect=lambda key, default=None: overrides.get(key, real_get(key, default))):
+                html, _ = cook_note({'template': {'title': '', 'content': 'Share Note'}})
+                self.assertEqual(html, '<h1>我的笔记</h1>Share Note')
+
+                with open(template_path, 'w', encoding='utf-8') as f:
+                    f.write('<h2>TEMPLATE_TITLE</h2>TEMPLATE_NOTE_CONTENT TEMPLATE_UNKNOWN')
+                st = os.stat(template_path)
+                os.utime(template_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+                html, _ = cook_note({'template': {'title': '', 'content': 'x'}})
+                self.assertEqual(html, '<h2>Untitled</h2>x TEMPLATE_UNKNOWN')
+
+    def test_handle_note_assets_records_linked_only(self):
+        """测试资源清单只记录实际链接到笔记目录的资源"""
+        cwd = os.getcwd()
+        hash_a, hash_b = 'aa' + '1' * 38, 'bb' + '2' * 38
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(note_service, 'asset_store') as store:
+            os.chdir(tmp)
+            try:
+                store.is_hash.return_value = True
+                store.lookup.return_value = None
+                store.note_assets.return_value = set()
+                store.set_note_assets.return_value = (set(), set())
+                # 只有 hash_a 在资源存储中
+                store.link.side_effect = lambda file_hash, target_path: file_hash == hash_a
+                data = {'template': {'content': ''},
+                        'files': [{'hash': hash_a, 'filetype': 'png'}, {'hash': hash_b, 'filetype': 'png'}]}
+                note_service.handle_note_assets(data, 'n1')
+            finally:
+                os.chdir(cwd)
+        store.set_note_assets.assert_called_once_with('n1', {hash_a + '.png'})
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from app.services.page_cache import PageCache
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        """每个测试前的设置"""
+        self.page_cache = PageCache()
+        self.page_cache.clear()
+        self.saved_max_bytes = self.page_cache.max_bytes
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """每个测试后的清理"""
+        self.page_cache.clear()
+        self.page_cache.max_bytes = self.saved_max_bytes
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _write(self, slug, content):
+        file_path = os.path.join(self.test_dir, slug + '.html')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return file_path
+
+    def test_load_and_get(self):
+        """测试页面读取后从内存返回，ETag 由内容决定"""
+        file_path = self._write('note', '<p>v1</p>')
+        self.assertIsNone(self.page_cache.get('note'))
+        body, etag, _ = self.page_cache.load('note', file_path)
+        self.assertEqual(body, b'<p>v1</p>')
+
+        os.remove(file_path)
+        self.assertEqual(self.page_cache.get('note')[:2], (body, etag))
+
+        self._write('note', '<p>v1</p>')
+        self.page_cache.invalidate('note')
+        self.assertIsNone(self.page_cache.get('note'))
+        self.assertEqual(self.page_cache.load('note', file_path)[1], etag)
+
+        self._write('note', '<p>v2</p>')
+        self.page_cache.invalidate('note')
+        self.assertNotEqual(self.page_cache.load('note', file_path)[1], etag)
+
+    def test_evicts_least_frequently_used(self):
+        """测试超出预算时淘汰访问次数最少的页面"""
+        size = PageCache.ENTRY_OVERHEAD + 4 + 1000
+        self.page_cache.max_bytes = size * 2
+        for slug in ('hot1', 'cold', 'hot2'):
+            file_path = self._write(slug, 'x' * 1000)
+            self.page_cache.load(slug, file_path)
+            if slug != 'cold':
+                for _ in range(5):
+                    self.page_cache.get(slug)
+
+        self.assertIsNone(self.page_cache.get('cold'))
+        self.assertIsNotNone(self.page_cache.get('hot1'))
+        self.assertIsNotNone(self.page_cache.get('hot2'))
+        self.assertLessEqual(self.page_cache.stats()['bytes'], self.page_cache.max_bytes)
+
+    def test_missing_file(self):
+        """测试文件不存在时抛出 FileNotFoundError 且不缓存"""
+        with self.assertRaises(FileNotFoundError):
+            self.page_cache.load('missing', os.path.join(self.test_dir, 'missing.html'))
+        self.assertIsNone(self.page_cache.get('missing'))
+
+    def test_lock_reset_after_fork(self):
+        """测试 fork 时其他线程持有的页面缓存锁在子进程中重新创建"""
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with self.page_cache._lock:
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if self.page_cache._lock.acquire(timeout=2) else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        finally:
+            release.set()
+            thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
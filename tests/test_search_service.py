@@ -1,6 +1,8 @@
 import unittest
 import os
 import shutil
+import tempfile
+import threading
 from app.services.search_service import SearchService
 from bs4 import BeautifulSoup
 
@@ -8,6 +10,9 @@ class TestSearchService(unittest.TestCase):
     def setUp(self):
         """每个测试前的设置"""
         self.search_service = SearchService()
+        self.search_service._indexed = False  # 单例跨用例共享，强制下次搜索重建索引
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.search_service._snapshot_dir = self.snapshot_dir
         self.test_dir = 'test_static'
         os.makedirs(self.test_dir, exist_ok=True)
         
@@ -15,6 +20,7 @@ class TestSearchService(unittest.TestCase):
         """每个测试后的清理"""
         if os.path.exists(self.test_dir):
             shutil.rmtree(self.test_dir)
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
             
     def create_test_note(self, filename, title, content):
         """创建测试笔记文件"""
@@ -89,6 +95,221 @@ class TestSearchService(unittest.TestCase):
         
         results = self.search_service.search_notes('a', self.test_dir)
         self.assertEqual(len(results), 0)
-        
+
+    def test_incremental_update(self):
+        """测试单篇文档的增量新增、更新与删除"""
+        self.create_test_note('note1.html', 'Alpha', 'apple banana')
+        self.search_service.rebuild_index(self.test_dir)
+
+        # 新增
+        self.create_test_note('note2.html', 'Beta', 'banana cherry')
+        url = self.search_service.update_document(os.path.join(self.test_dir, 'note2.html'), self.test_dir)
+        self.assertEqual(url, '/note2')
+        self.assertEqual(len(self.search_service.search_notes('banana', self.test_dir)), 2)
+
+        # 更新：旧词条应被移除
+        self.create_test_note('note2.html', 'Beta', 'durian')
+        self.search_service.update_document(os.path.join(self.test_dir, 'note2.html'), self.test_dir)
+        self.assertEqual(len(self.search_service.search_notes('cherry', self.test_dir)), 0)
+        self.assertEqual(len(self.search_service.search_notes('durian', self.test_dir)), 1)
+
+        # 删除
+        self.assertTrue(self.search_service.remove_document('/note2', self.test_dir))
+        self.assertEqual(len(self.search_service.search_notes('durian', self.test_dir)), 0)
+        self.assertEqual(len(self.search_service.search_notes('banana', self.test_dir)), 1)
+
+    def test_prefix_expansion(self):
+        """测试有序词典的前缀扩展"""
+        self.create_test_note('note1.html', 'Prefix', 'search searching seasons sea')
+        self.search_service.rebuild_index(self.test_dir)
+
+        self.assertEqual(self.search_service._expand_prefix('sea'), ['sea', 'search', 'searching', 'seasons'])
+        self.assertEqual(self.search_service._expand_prefix('searc'), ['search', 'searching'])
+        self.assertEqual(self.search_service._expand_prefix('zz'), [])
+
+    def test_bm25_ranking_and_pagination(self):
+        """测试 BM25 排序、标题加权与分页"""
+        self.create_test_note('a.html', 'Other', 'python appears once here among many other words')
+        self.create_test_note('b.html', 'Python Guide', 'an introduction to the language')
+        self.create_test_note('c.html', 'Misc', 'python and more python')
+        self.search_service.rebuild_index(self.test_dir)
+
+        results = self.search_service.search_notes('python', self.test_dir)
+        self.assertEqual([r['url'] for r in results], ['/b', '/c', '/a'])
+        self.assertTrue(results[0]['score'] >= results[1]['score'] >= results[2]['score'])
+
+        page = self.search_service.search_notes('python', self.test_dir, limit=1, offset=1)
+        self.assertEqual(len(page), 1)
+        self.assertEqual(page[0]['url'], results[1]['url'])
+
+    def test_intersect_posting_lists(self):
+        """测试打包倒排表的 galloping 求交"""
+        from array import array
+        pack = SearchService._pack
+        small = array('I', [pack(3, 1), pack(50, 2), pack(999, 1)])
+        large = array('I', [pack(i, 5) for i in range(0, 1000, 1)])
+        result = SearchService._intersect(small, large)
+        self.assertEqual([k >> SearchService.TF_BITS for k in result], [3, 50, 999])
+        self.assertEqual(len(SearchService._intersect(array('I', [pack(7, 1)]), array('I'))), 0)
+
+    def test_and_query(self):
+        """测试多词 AND 查询及删除后的一致性"""
+        self.create_test_note('a.html', 'One', 'red green blue')
+        self.create_test_note('b.html', 'Two', 'red yellow')
+        self.create_test_note('c.html', 'Three', 'green blue red')
+        self.search_service.rebuild_index(self.test_dir)
+
+        urls = {r['url'] for r in self.search_service.search_notes('red blue', self.test_dir)}
+        self.assertEqual(urls, {'/a', '/c'})
+
+        self.search_service.remove_document('/a', self.test_dir)
+        urls = {r['url'] for r in self.search_service.search_notes('red blue', self.test_dir)}
+        self.assertEqual(urls, {'/c'})
+
+    def test_snapshot_shared_between_workers(self):
+        """测试索引快照的写入、mmap 加载与增量修补"""
+        self.create_test_note('a.html', 'Alpha', 'shared snapshot content')
+        self.create_test_note('b.html', 'Beta', 'another snapshot')
+        self.search_service.rebuild_index(self.test_dir)
+        expected = self.search_service.search_notes('snapshot', self.test_dir)
+
+        # 模拟新工作进程：丢弃内存索引后从快照加载
+        self.search_service._indexed = False
+        self.search_service._snapshot = None
+        self.assertEqual(self.search_service.search_notes('snapshot', self.test_dir), expected)
+        self.assertIsInstance(self.search_service._index['snapshot'], memoryview)
+
+        # 修改写回快照，另一进程重新映射后能看到
+        self.create_test_note('c.html', 'Gamma', 'snapshot patched')
+        self.search_service.update_document(os.path.join(self.test_dir, 'c.html'), self.test_dir)
+        self.search_service._indexed = False
+        self.search_service._snapshot = None
+        urls = {r['url'] for r in self.search_service.search_notes('snapshot', self.test_dir)}
+        self.assertEqual(urls, {'/a', '/b', '/c'})
+
+    def test_snapshot_stale_on_warm_up(self):
+        """测试启动时检测到源目录变化后重建快照"""
+        self.create_test_note('a.html', 'Alpha', 'original words')
+        self.search_service.rebuild_index(self.test_dir)
+
+        self.create_test_note('b.html', 'Beta', 'offline addition')
+        self.search_service._indexed = False
+        self.search_service.warm_up(self.test_dir)
+        self.assertEqual(len(self.search_service.search_notes('offline', self.test_dir)), 1)
+
+    def test_query_cache_generation(self):
+        """测试查询缓存命中及索引变更后失效"""
+        self.create_test_note('a.html', 'Alpha', 'cached query words')
+        self.search_service.rebuild_index(self.test_dir)
+
+        hits = self.search_service.cache_stats()['hits']
+        first = self.search_service.search_notes('Cached  Query', self.test_dir)
+        second = self.search_service.search_notes('cached query', self.test_dir)
+        self.assertEqual(first, second)
+        self.assertEqual(self.search_service.cache_stats()['hits'], hits + 1)
+
+        # 索引变更后不应命中旧结果
+        self.create_test_note('b.html', 'Beta', 'cached query again')
+        self.search_service.update_document(os.path.join(self.test_dir, 'b.html'), self.test_dir)
+        self.assertEqual(len(self.search_service.search_notes('cached query', self.test_dir)), 2)
+        self.assertEqual(self.search_service.cache_stats()['hits'], hits + 1)
+
+    def test_locks_reset_after_fork(self):
+        """测试 fork 时其他线程持有的索引锁在子进程中重新创建"""
+        service = self.search_service
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with service._lock, service._flock_mutex:
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                ok = service._lock.acquire(timeout=2) and service._flock_mutex.acquire(timeout=2)
+                os._exit(0 if ok else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        finally:
+            release.set()
+            thread.join()
+
+    def test_compaction(self):
+        """测试反复更新文档时压缩墓碑，文档表不随更新次数增长"""
+        service = self.search_service
+        for i in range(4):
+            self.create_test_note(f'note{i}.html', f'Title {i}', f'stable words note{i}')
+        for snapshot in (True, False):
+            saved = service._snapshot_enabled
+            service._snapshot_enabled = snapshot
+            try:
+                service.rebuild_index(self.test_dir)
+                for round_ in range(20):
+                    self.create_test_note('note0.html', 'Title 0', f'stable words revision{round_}')
+                    service.update_document(os.path.join(self.test_dir, 'note0.html'), self.test_dir)
+                self.assertLessEqual(len(service._doc_table), 5)
+                self.assertEqual(len(service.search_notes('stable', self.test_dir)), 4)
+                hits = service.search_notes('revision19', self.test_dir)
+                self.assertEqual([hit['url'] for hit in hits], ['/note0'])
+                self.assertEqual(service.search_notes('revision18', self.test_dir), [])
+                self.assertEqual(service.search_notes('note3', self.test_dir)[0]['title'], 'Title 3')
+            finally:
+                service._snapshot_enabled = saved
+
+    def test_parallel_build_matches_serial(self):
+        """测试并行构建与串行构建得到相同的索引"""
+        for i in range(7):
+            self.create_test_note(f'note{i}.html', f'Title {i}', f'common words note{i} ' + 'extra ' * i)
+
+        self.search_service.rebuild_index(self.test_dir)
+        serial = (dict(self.search_service._index), self.search_service._doc_ids.copy(),
+                  list(self.search_service._doc_lengths), self.search_service._total_length)
+
+        service = self.search_service
+        saved = service._build_workers, service._build_chunk_size, service._parallel_threshold
+        service._build_workers, service._build_chunk_size, service._parallel_threshold = 2, 2, 1
+        try:
+            self.assertTrue(service._use_parallel_build(7))
+            service.rebuild_index(self.test_dir)
+        finally:
+            service._build_workers, service._build_chunk_size, service._parallel_threshold = saved
+
+        self.assertEqual(dict(service._index), serial[0])
+        self.assertEqual(service._doc_ids, serial[1])
+        self.assertEqual(list(service._doc_lengths), serial[2])
+        self.assertEqual(service._total_length, serial[3])
+        self.assertEqual(len(service.search_notes('common', self.test_dir)), 7)
+
+    def test_preview_highlight_offsets(self):
+        """测试按索引偏移截取预览并返回高亮区间"""
+        content = 'filler ' * 30 + 'The Target word and targeted text' + ' tail' * 30
+        self.create_test_note('note.html', 'Offsets', content)
+
+        def check(results):
+            self.assertEqual(len(results), 1)
+            preview, highlight = results[0]['preview'], results[0]['highlight']
+            self.assertTrue(preview.startswith('...') and preview.endswith('...'))
+            words = [preview[h['start']:h['start'] + h['length']] for h in highlight]
+            self.assertEqual(words, ['Target', 'targeted'])
+
+        self.search_service.rebuild_index(self.test_dir)
+        check(self.search_service.search_notes('target', self.test_dir))
+
+        # 从快照加载后位置表同样可用
+        self.search_service._indexed = False
+        self.search_service._snapshot = None
+        check(self.search_service.search_notes('TARGET', self.test_dir))
+
+        # 增量更新后偏移随正文变化
+        self.create_test_note('note.html', 'Offsets', 'target at start')
+        self.search_service.update_document(os.path.join(self.test_dir, 'note.html'), self.test_dir)
+        result = self.search_service.search_notes('target', self.test_dir)[0]
+        self.assertEqual(result['preview'], 'target at start')
+        self.assertEqual(result['highlight'], [{'start': 0, 'length': 6}])
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import os
+import shutil
+import tempfile
+from flask import Flask
+from app.routes.api import views
+from app.services.compression_service import compression_service
+from app.services.file_manifest import FileManifest
+
+class TestViews(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """与 main.py 相同：关闭 Flask 内置的 static 路由，由 views 蓝图提供 /static"""
+        cls.app = Flask(__name__, static_folder=None)
+        cls.app.register_blueprint(views.init_routes())
+
+    def setUp(self):
+        """每个测试前的设置：在临时目录中发布主题样式并建立文件清单"""
+        self.manifest = FileManifest()
+        self.saved = (dict(self.manifest._entries), self.manifest._built)
+        self.cwd = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        os.makedirs('static')
+        with open('static/theme.css', 'w') as f:
+            f.write('body { color: red; }\n' * 200)
+        compression_service.precompress('static/theme.css')
+        os.makedirs('static/objects/aa')
+        for path in ('static/objects/aa/' + 'a' * 40, 'static/script.exe'):
+            with open(path, 'w') as f:
+                f.write('data')
+        self.manifest.build(['static'])
+        # send_file 按应用根目录解析相对路径，与生产环境一样指向工作目录
+        self.app.root_path = self.test_dir
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        """每个测试后的清理"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+        self.manifest._entries, self.manifest._built = self.saved
+
+    def test_static_precompressed(self):
+        """测试 /static 下的主题样式按 Accept-Encoding 返回预压缩版本"""
+        response = self.client.get('/static/theme.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        with open('static/theme.css.gz', 'rb') as f:
+            self.assertEqual(response.data, f.read())
+
+        response = self.client.get('/static/theme.css', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+    def test_static_unlisted(self):
+        """测试清单之外的文件（存储对象、不允许的类型、不存在的文件）返回 404"""
+        for path in ('/static/objects/aa/' + 'a' * 40, '/static/script.exe', '/static/missing.css',
+                     '/static/theme.css.gz'):
+            self.assertEqual(self.client.get(path).status_code, 404, path)
+        self.assertEqual(self.client.get('/notes/Bad/assets/a.png').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()